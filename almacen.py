@@ -0,0 +1,533 @@
+"""
+Almacén de resultados de scraping
+Registra en SQLite cada consulta completada (clave, hash del contenido, carpeta
+de salida) para poder servir consultas repetidas sin volver a abrir el navegador
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple, Union
+
+import busqueda
+import cambios
+import suscripciones
+from campos import parsear_fecha
+from checkpoint import clave_licitacion
+from config import ALMACEN_DB, CACHE_TTL_SECONDS, CAMBIOS_RETENCION_DIAS, OUTPUT_DIR, INSTANTANEAS_ENABLED
+from logger import setup_logger
+
+logger = setup_logger(__name__)
+
+ARCHIVO_RESULTADOS = "licitaciones_extraidas.json"
+
+
+class ResultadoNoDisponible(Exception):
+    """El archivo de resultados de una consulta almacenada falta o no se puede leer"""
+
+
+_ESQUEMA = """
+CREATE TABLE IF NOT EXISTS consultas (
+    clave TEXT PRIMARY KEY,
+    cpv_codes TEXT,
+    fecha_desde TEXT NOT NULL,
+    fecha_hasta TEXT NOT NULL,
+    output_folder TEXT NOT NULL,
+    total INTEGER NOT NULL,
+    content_hash TEXT NOT NULL,
+    last_modified REAL NOT NULL,
+    creado REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS reanudables (
+    clave TEXT PRIMARY KEY,
+    output_folder TEXT NOT NULL,
+    paginas INTEGER NOT NULL,
+    actualizado REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS programadas (
+    clave TEXT PRIMARY KEY,
+    vigente_hasta REAL,
+    inicio REAL NOT NULL,
+    duracion REAL,
+    estado TEXT NOT NULL,
+    total INTEGER,
+    error TEXT
+);
+CREATE TABLE IF NOT EXISTS indices (
+    consulta TEXT NOT NULL,
+    clave TEXT NOT NULL,
+    hash TEXT NOT NULL,
+    valores TEXT NOT NULL,
+    PRIMARY KEY (consulta, clave)
+);
+CREATE TABLE IF NOT EXISTS cambios (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    consulta TEXT NOT NULL,
+    detectado REAL NOT NULL,
+    tipo TEXT NOT NULL,
+    datos TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS cambios_detectado ON cambios (detectado)
+"""
+
+
+@contextmanager
+def _conectar():
+    """Abre una conexión al almacén (una por operación, seguro entre hilos) y confirma al salir"""
+    os.makedirs(os.path.dirname(ALMACEN_DB) or ".", exist_ok=True)
+    conexion = sqlite3.connect(ALMACEN_DB, timeout=30)
+    conexion.row_factory = sqlite3.Row
+    try:
+        with conexion:
+            conexion.executescript(_ESQUEMA)
+            yield conexion
+    finally:
+        conexion.close()
+
+
+def resolver_fechas(fecha_desde: Optional[str], fecha_hasta: Optional[str]):
+    """Aplica el valor por defecto del scraper (ayer) a las fechas no especificadas"""
+    ayer = (datetime.now() - timedelta(days=1)).strftime("%d-%m-%Y")
+    return fecha_desde or ayer, fecha_hasta or ayer
+
+
+def normalizar_cpv(cpv_codes: Optional[List[str]]) -> Optional[List[str]]:
+    """Ordena y deduplica los códigos CPV (None si no hay filtro)"""
+    if not cpv_codes:
+        return None
+    return sorted(set(code.strip() for code in cpv_codes if code.strip())) or None
+
+
+def clave_consulta(cpv_codes: Optional[List[str]], fecha_desde: Optional[str], fecha_hasta: Optional[str]) -> str:
+    """Clave canónica de una consulta: mismo filtro y rango producen la misma clave"""
+    desde, hasta = resolver_fechas(fecha_desde, fecha_hasta)
+    cpv = normalizar_cpv(cpv_codes)
+    return f"{','.join(cpv) if cpv else '*'}|{desde}|{hasta}"
+
+
+def guardar_resultado(clave: str, resultado: Dict, creado: Optional[float] = None, notificar: bool = True) -> None:
+    """
+    Registra un resultado exitoso de ejecutar_scraping bajo la clave de la consulta
+
+    creado: momento de obtención de los datos (por defecto, ahora); lo indica
+    quien vuelve a guardar datos antiguos, p. ej. la re-extracción offline
+    notificar: False cuando las filas cambian sin que cambie el portal (p. ej.
+    la re-extracción con un parser corregido): se sustituye el índice base de
+    cambios, pero no se registran cambios ni se avisa a las suscripciones
+    """
+    cpv = normalizar_cpv(resultado.get("cpv_codes"))
+    last_modified = resultado["last_modified"]
+    with _conectar() as conexion:
+        # Si el contenido no ha cambiado se conserva la fecha de modificación anterior
+        anterior = conexion.execute(
+            "SELECT content_hash, last_modified FROM consultas WHERE clave = ?", (clave,)
+        ).fetchone()
+        contenido_nuevo = anterior is None or anterior["content_hash"] != resultado["content_hash"]
+        if not contenido_nuevo:
+            last_modified = anterior["last_modified"]
+            resultado["last_modified"] = last_modified
+        else:
+            # Contenido distinto (o primera ejecución): actualizar el índice y registrar el delta
+            _registrar_cambios(conexion, clave, resultado["licitaciones"], notificar)
+
+        conexion.execute(
+            """
+            INSERT OR REPLACE INTO consultas
+                (clave, cpv_codes, fecha_desde, fecha_hasta, output_folder, total, content_hash, last_modified, creado)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            (
+                clave,
+                json.dumps(cpv) if cpv else None,
+                resultado["fecha_desde"],
+                resultado["fecha_hasta"],
+                os.path.abspath(resultado["output_folder"]),
+                resultado["total_licitaciones"],
+                resultado["content_hash"],
+                last_modified,
+                creado or time.time(),
+            ),
+        )
+    logger.info(f"✓ Resultado almacenado: {clave} ({resultado['total_licitaciones']} licitaciones)")
+
+    if contenido_nuevo:
+        try:
+            busqueda.indexar(resultado["licitaciones"])
+        except sqlite3.Error as e:
+            logger.warning(f"⚠ No se pudo actualizar el índice de búsqueda: {e}")
+        if notificar:
+            try:
+                suscripciones.procesar_resultado(resultado["licitaciones"], cpv)
+            except sqlite3.Error as e:
+                logger.warning(f"⚠ No se pudieron comparar las suscripciones: {e}")
+
+    if INSTANTANEAS_ENABLED:
+        import instantaneas
+        try:
+            if contenido_nuevo or instantaneas.metadatos(instantaneas.ruta_instantanea(
+                    resultado["fecha_desde"], instantaneas.nombre_consulta(cpv))) is None:
+                instantaneas.materializar(resultado, cpv)
+        except (OSError, ValueError) as e:
+            logger.warning(f"⚠ No se pudo escribir la instantánea de {clave}: {e}")
+
+
+def _registrar_cambios(conexion: sqlite3.Connection, clave: str, licitaciones: List[Dict], notificar: bool = True) -> None:
+    """Compara las filas con el índice de la ejecución anterior de la consulta y lo sustituye"""
+    indice_anterior = {
+        fila["clave"]: (fila["hash"], *json.loads(fila["valores"]))
+        for fila in conexion.execute("SELECT clave, hash, valores FROM indices WHERE consulta = ?", (clave,))
+    }
+    indice = cambios.indexar(licitaciones)
+
+    if not notificar:
+        logger.info(f"Índice base de {clave} sustituido sin registrar cambios")
+    elif indice_anterior:
+        ahora = time.time()
+        delta = cambios.calcular_delta(indice_anterior, licitaciones)
+        filas = [
+            (clave, ahora, tipo, json.dumps(dato, ensure_ascii=False))
+            for tipo, datos in delta.items()
+            for dato in datos
+        ]
+        conexion.executemany("INSERT INTO cambios (consulta, detectado, tipo, datos) VALUES (?, ?, ?, ?)", filas)
+        conexion.execute("DELETE FROM cambios WHERE detectado < ?", (ahora - CAMBIOS_RETENCION_DIAS * 86400,))
+        logger.info(f"✓ Cambios en {clave}: {len(delta['nuevas'])} nuevas, "
+                    f"{len(delta['modificadas'])} modificadas, {len(delta['eliminadas'])} eliminadas")
+    else:
+        logger.info(f"Primera ejecución de {clave}: índice base sin cambios que notificar")
+
+    conexion.execute("DELETE FROM indices WHERE consulta = ?", (clave,))
+    conexion.executemany(
+        "INSERT INTO indices (consulta, clave, hash, valores) VALUES (?, ?, ?, ?)",
+        [(clave, k, v[0], json.dumps(v[1:], ensure_ascii=False)) for k, v in indice.items()],
+    )
+
+
+def obtener_cambios(desde: float, consulta: Optional[str] = None) -> Dict[str, List[Dict]]:
+    """
+    Cambios detectados desde un instante, agrupados por tipo
+
+    Args:
+        desde: Epoch a partir del cual devolver cambios
+        consulta: Clave de la consulta (ver clave_consulta); None para todas
+
+    Returns:
+        dict con 'nuevas', 'modificadas' y 'eliminadas'; cada entrada incluye la
+        consulta y el momento en que se detectó, en orden cronológico
+    """
+    sql = "SELECT consulta, detectado, tipo, datos FROM cambios WHERE detectado >= ?"
+    parametros = [desde]
+    if consulta is not None:
+        sql += " AND consulta = ?"
+        parametros.append(consulta)
+    with _conectar() as conexion:
+        filas = conexion.execute(sql + " ORDER BY id", parametros).fetchall()
+
+    resultado = {"nuevas": [], "modificadas": [], "eliminadas": []}
+    for fila in filas:
+        entrada = json.loads(fila["datos"])
+        entrada = {"consulta": fila["consulta"], "detectado": datetime.fromtimestamp(fila["detectado"]).isoformat(),
+                   **(entrada if fila["tipo"] != "nuevas" else {"licitacion": entrada})}
+        resultado[fila["tipo"]].append(entrada)
+    return resultado
+
+
+def obtener_resultado(clave: str, max_edad: Optional[float] = CACHE_TTL_SECONDS) -> Optional[Dict]:
+    """
+    Devuelve los metadatos del resultado almacenado para la clave
+
+    Los resultados precalculados por el programador siguen vigentes hasta la
+    siguiente ejecución programada aunque superen max_edad.
+
+    Args:
+        clave: Clave de la consulta (ver clave_consulta)
+        max_edad: Edad máxima en segundos; None para aceptar cualquier edad
+
+    Returns:
+        dict con los metadatos o None si no hay resultado vigente
+    """
+    with _conectar() as conexion:
+        fila = conexion.execute(
+            """
+            SELECT c.*, p.vigente_hasta FROM consultas c
+            LEFT JOIN programadas p ON p.clave = c.clave
+            WHERE c.clave = ?
+            """,
+            (clave,),
+        ).fetchone()
+
+    if fila is None:
+        return None
+    meta = _meta_vigente(fila, max_edad, time.time())
+    if meta is not None and not _archivo_disponible(meta):
+        return None
+    return meta
+
+
+def _meta_vigente(fila: sqlite3.Row, max_edad: Optional[float], ahora: float) -> Optional[Dict]:
+    """Metadatos de una fila de consultas (con vigente_hasta) o None si ha caducado"""
+    programada_vigente = fila["vigente_hasta"] is not None and fila["vigente_hasta"] > ahora
+    if max_edad is not None and ahora - fila["creado"] > max_edad and not programada_vigente:
+        return None
+
+    meta = dict(fila)
+    del meta["vigente_hasta"]
+    meta["cpv_codes"] = json.loads(meta["cpv_codes"]) if meta["cpv_codes"] else None
+    return meta
+
+
+def resultados_diarios(dias: List[str], max_edad: Optional[float] = CACHE_TTL_SECONDS) -> List[Dict]:
+    """
+    Resultados vigentes de consultas de un solo día (particiones de la cola,
+    backfill, consultas programadas...) para los días indicados (DD-MM-YYYY)
+    """
+    if not dias:
+        return []
+    with _conectar() as conexion:
+        filas = conexion.execute(
+            f"""
+            SELECT c.*, p.vigente_hasta FROM consultas c
+            LEFT JOIN programadas p ON p.clave = c.clave
+            WHERE c.fecha_desde = c.fecha_hasta AND c.fecha_desde IN ({','.join('?' * len(dias))})
+            """,
+            dias,
+        ).fetchall()
+    ahora = time.time()
+    metas = (_meta_vigente(fila, max_edad, ahora) for fila in filas)
+    return [meta for meta in metas if meta is not None and _archivo_disponible(meta)]
+
+
+def resultados_multidia(desde: str, hasta: str, max_edad: Optional[float] = CACHE_TTL_SECONDS) -> List[Dict]:
+    """
+    Resultados vigentes de consultas de varios días cuyo rango se solapa con
+    [desde, hasta] (DD-MM-YYYY); las filas de cada día se separan por su fecha
+    """
+    inicio, fin = _dia(desde), _dia(hasta)
+    with _conectar() as conexion:
+        filas = conexion.execute(
+            """
+            SELECT c.*, p.vigente_hasta FROM consultas c
+            LEFT JOIN programadas p ON p.clave = c.clave
+            WHERE c.fecha_desde != c.fecha_hasta
+            """
+        ).fetchall()
+    ahora = time.time()
+    # Las fechas se guardan como DD-MM-YYYY: el solapamiento se comprueba aquí y no en SQL
+    solapadas = (fila for fila in filas if _dia(fila["fecha_desde"]) <= fin and _dia(fila["fecha_hasta"]) >= inicio)
+    metas = (_meta_vigente(fila, max_edad, ahora) for fila in solapadas)
+    return [meta for meta in metas if meta is not None and _archivo_disponible(meta)]
+
+
+def _dia(fecha: str):
+    return datetime.strptime(fecha, "%d-%m-%Y").date()
+
+
+def _ruta_resultados(meta: Dict) -> str:
+    return os.path.join(meta["output_folder"], ARCHIVO_RESULTADOS)
+
+
+def _archivo_disponible(meta: Dict) -> bool:
+    """Comprueba que la carpeta del resultado conserva sus filas; si no, lo olvida (fallo de caché)"""
+    if os.path.exists(_ruta_resultados(meta)):
+        return True
+    olvidar_resultado(meta["clave"], f"falta {_ruta_resultados(meta)}")
+    return False
+
+
+def olvidar_resultado(clave: str, motivo: str) -> None:
+    """Elimina la entrada de una consulta para que la siguiente petición la vuelva a extraer"""
+    with _conectar() as conexion:
+        conexion.execute("DELETE FROM consultas WHERE clave = ?", (clave,))
+    logger.warning(f"⚠ Resultado almacenado de {clave} descartado: {motivo}")
+
+
+def consultas_almacenadas() -> List[Dict]:
+    """Metadatos de todos los resultados almacenados (sin aplicar TTL)"""
+    with _conectar() as conexion:
+        filas = conexion.execute("SELECT * FROM consultas ORDER BY creado").fetchall()
+    metas = []
+    for fila in filas:
+        meta = dict(fila)
+        meta["cpv_codes"] = json.loads(meta["cpv_codes"]) if meta["cpv_codes"] else None
+        metas.append(meta)
+    return metas
+
+
+def cargar_resultado(meta: Dict) -> Dict:
+    """
+    Reconstruye el diccionario de ejecutar_scraping a partir de un resultado almacenado
+
+    Raises:
+        ResultadoNoDisponible si el archivo de la carpeta falta o no se puede
+        leer; la entrada se elimina para que la consulta se vuelva a extraer
+    """
+    try:
+        with open(_ruta_resultados(meta), "r", encoding="utf-8") as f:
+            licitaciones = json.load(f)
+    except (OSError, ValueError) as e:
+        olvidar_resultado(meta["clave"], str(e))
+        raise ResultadoNoDisponible(meta["clave"]) from e
+
+    return {
+        "success": True,
+        "total_licitaciones": len(licitaciones),
+        "licitaciones": licitaciones,
+        "output_folder": meta["output_folder"],
+        "cpv_codes": meta["cpv_codes"],
+        "fecha_desde": meta["fecha_desde"],
+        "fecha_hasta": meta["fecha_hasta"],
+        "content_hash": meta["content_hash"],
+        "last_modified": meta["last_modified"],
+    }
+
+
+def hash_filas(licitaciones: List[Dict]) -> str:
+    """Hash del contenido calculado igual que el scraper (filas canónicas en orden)"""
+    hash_contenido = hashlib.sha256()
+    for licitacion in licitaciones:
+        fila = json.dumps(licitacion, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+        hash_contenido.update(fila.encode("utf-8"))
+        hash_contenido.update(b"\n")
+    return hash_contenido.hexdigest()
+
+
+def _carpeta_compuesta(clave: str) -> str:
+    """Carpeta fija del resultado compuesto de una consulta: cada recomposición la sobrescribe"""
+    return os.path.join(OUTPUT_DIR, f"compuesta_{hashlib.sha256(clave.encode('utf-8')).hexdigest()[:16]}")
+
+
+def fusionar_resultados(clave: str, partes: List[Union[str, Tuple[str, str]]], cpv_codes: Optional[List[str]],
+                        fecha_desde: str, fecha_hasta: str) -> Optional[Dict]:
+    """
+    Compone y almacena el resultado de una consulta a partir de sus partes (p. ej. un día cada una)
+
+    Args:
+        clave: Clave de la consulta completa
+        partes: Claves de las partes, en el orden en que se concatenan; una
+            tupla (clave, día DD-MM-YYYY) toma de un resultado de varios días
+            solo las filas con esa fecha
+        cpv_codes, fecha_desde, fecha_hasta: Parámetros de la consulta completa
+
+    Returns:
+        dict como el de ejecutar_scraping, o None si falta alguna parte
+    """
+    licitaciones = []
+    vistas = set()
+    last_modified = 0.0
+    cargadas: Dict[str, Tuple[Dict, List[Dict]]] = {}
+    for parte in partes:
+        clave_parte, dia = (parte, None) if isinstance(parte, str) else parte
+        if clave_parte not in cargadas:
+            meta = obtener_resultado(clave_parte, max_edad=None)
+            if meta is None:
+                logger.warning(f"⚠ Falta la parte {clave_parte} para componer {clave}")
+                return None
+            try:
+                cargadas[clave_parte] = (meta, cargar_resultado(meta)["licitaciones"])
+            except ResultadoNoDisponible:
+                return None
+        meta, filas = cargadas[clave_parte]
+        if dia is not None and meta["fecha_desde"] != meta["fecha_hasta"]:
+            filas = _filas_del_dia(filas, _dia(dia), clave_parte)
+        # Partes de distintos CPV pueden compartir licitaciones: se conserva la primera aparición
+        for licitacion in filas:
+            clave_fila = clave_licitacion(licitacion)
+            if clave_fila not in vistas:
+                vistas.add(clave_fila)
+                licitaciones.append(licitacion)
+        last_modified = max(last_modified, meta["last_modified"])
+
+    output_folder = _carpeta_compuesta(clave)
+    os.makedirs(output_folder, exist_ok=True)
+    ruta = os.path.join(output_folder, ARCHIVO_RESULTADOS)
+    with open(ruta + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(licitaciones, f, ensure_ascii=False, indent=2)
+    os.replace(ruta + ".tmp", ruta)
+
+    resultado = {
+        "success": True,
+        "total_licitaciones": len(licitaciones),
+        "licitaciones": licitaciones,
+        "output_folder": output_folder,
+        "cpv_codes": cpv_codes,
+        "fecha_desde": fecha_desde,
+        "fecha_hasta": fecha_hasta,
+        "content_hash": hash_filas(licitaciones),
+        "last_modified": last_modified,
+        "completo": True,
+    }
+    guardar_resultado(clave, resultado)
+    return resultado
+
+
+def _filas_del_dia(filas: List[Dict], dia, clave_parte: str) -> List[Dict]:
+    """Filas de un resultado de varios días publicadas en `dia`; las de fecha ilegible se conservan"""
+    seleccion, sin_fecha = [], 0
+    for licitacion in filas:
+        fecha = parsear_fecha(licitacion.get("fecha"))
+        if fecha is None:
+            sin_fecha += 1
+        if fecha is None or fecha == dia:
+            seleccion.append(licitacion)
+    if sin_fecha:
+        logger.warning(f"⚠ {sin_fecha} fila(s) de {clave_parte} sin fecha reconocible: se incluyen sin filtrar")
+    return seleccion
+
+
+def registrar_reanudable(clave: str, resultado: Dict) -> None:
+    """Registra una ejecución con la paginación interrumpida para continuarla en la siguiente consulta"""
+    with _conectar() as conexion:
+        conexion.execute(
+            "INSERT OR REPLACE INTO reanudables (clave, output_folder, paginas, actualizado) VALUES (?, ?, ?, ?)",
+            (clave, os.path.abspath(resultado["output_folder"]), resultado.get("paginas", 0), time.time()),
+        )
+    logger.warning(f"⚠ Ejecución incompleta registrada como reanudable: {clave} ({resultado['output_folder']})")
+
+
+def obtener_reanudable(clave: str) -> Optional[str]:
+    """Carpeta de la ejecución interrumpida de la consulta, si existe"""
+    with _conectar() as conexion:
+        fila = conexion.execute("SELECT output_folder FROM reanudables WHERE clave = ?", (clave,)).fetchone()
+    if fila is None or not os.path.isdir(fila["output_folder"]):
+        return None
+    return fila["output_folder"]
+
+
+def borrar_reanudable(clave: str) -> None:
+    with _conectar() as conexion:
+        conexion.execute("DELETE FROM reanudables WHERE clave = ?", (clave,))
+
+
+def registrar_programada(clave: str, inicio: float, estado: str, duracion: Optional[float] = None,
+                         total: Optional[int] = None, error: Optional[str] = None,
+                         vigente_hasta: Optional[float] = None) -> None:
+    """
+    Registra el estado de la última ejecución programada de una consulta
+
+    Si la ejecución falla se conserva el vigente_hasta anterior para seguir
+    sirviendo el último resultado bueno.
+    """
+    with _conectar() as conexion:
+        if vigente_hasta is None:
+            anterior = conexion.execute(
+                "SELECT vigente_hasta FROM programadas WHERE clave = ?", (clave,)
+            ).fetchone()
+            vigente_hasta = anterior["vigente_hasta"] if anterior else None
+        conexion.execute(
+            """
+            INSERT OR REPLACE INTO programadas (clave, vigente_hasta, inicio, duracion, estado, total, error)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            """,
+            (clave, vigente_hasta, inicio, duracion, estado, total, error),
+        )
+
+
+def ejecuciones_programadas(limite: int = 50) -> List[Dict]:
+    """Últimas ejecuciones programadas (una por consulta y día), de la más reciente a la más antigua"""
+    with _conectar() as conexion:
+        filas = conexion.execute("SELECT * FROM programadas ORDER BY inicio DESC LIMIT ?", (limite,)).fetchall()
+    return [dict(fila) for fila in filas]
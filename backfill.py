@@ -0,0 +1,189 @@
+"""
+Backfill histórico
+Divide un rango de fechas en particiones diarias, las extrae con un número
+acotado de navegadores en paralelo y escribe un dataset particionado por fecha:
+
+    <destino>/fecha=YYYY-MM-DD/licitaciones.json
+    <destino>/manifest.json   (consulta y particiones completadas)
+
+Volver a lanzar el mismo comando continúa desde el manifest: las particiones
+completadas se saltan y las interrumpidas se reanudan desde su checkpoint
+"""
+
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import almacen
+from cola import particiones_diarias
+from config import BACKFILL_DIR, BACKFILL_PARALELO, preparar_directorios
+from logger import setup_logger
+from navegador import preflight
+
+logger = setup_logger(__name__)
+
+ARCHIVO_MANIFEST = "manifest.json"
+ARCHIVO_PARTICION = "licitaciones.json"
+
+
+def directorio_particion(destino: str, fecha: str) -> str:
+    """Directorio de la partición de un día (fecha DD-MM-YYYY)"""
+    dia = datetime.strptime(fecha, "%d-%m-%Y")
+    return os.path.join(destino, f"fecha={dia.strftime('%Y-%m-%d')}")
+
+
+def _escribir_json(ruta: str, datos) -> None:
+    temporal = ruta + ".tmp"
+    with open(temporal, "w", encoding="utf-8") as f:
+        json.dump(datos, f, ensure_ascii=False, indent=2)
+    os.replace(temporal, ruta)
+
+
+class Manifest:
+    """Registro de particiones completadas y fallidas de un dataset (un único escritor: el proceso principal)"""
+
+    def __init__(self, destino: str, cpv_codes: Optional[List[str]]):
+        self.ruta = os.path.join(destino, ARCHIVO_MANIFEST)
+        self.datos = {"cpv_codes": cpv_codes, "completadas": {}, "fallidas": {}}
+        if os.path.exists(self.ruta):
+            with open(self.ruta, "r", encoding="utf-8") as f:
+                self.datos = json.load(f)
+            if self.datos.get("cpv_codes") != cpv_codes:
+                raise ValueError(
+                    f"El dataset {destino} es de los CPV {self.datos.get('cpv_codes') or 'sin filtro'}; "
+                    "usa otro destino para una consulta distinta"
+                )
+
+    def completada(self, fecha: str) -> bool:
+        return fecha in self.datos["completadas"]
+
+    def registrar(self, fecha: str, resumen: Dict) -> None:
+        if resumen["success"]:
+            self.datos["completadas"][fecha] = {
+                "total": resumen["total"],
+                "content_hash": resumen["content_hash"],
+                "duracion_s": round(resumen["duracion"], 1),
+                "completada": datetime.now().isoformat(),
+            }
+            self.datos["fallidas"].pop(fecha, None)
+        else:
+            self.datos["fallidas"][fecha] = {"error": resumen["error"], "intento": datetime.now().isoformat()}
+        self.datos["actualizado"] = datetime.now().isoformat()
+        _escribir_json(self.ruta, self.datos)
+
+
+def _inicializar_proceso() -> None:
+    preparar_directorios()
+    preflight()
+
+
+def extraer_particion(cpv_codes: Optional[List[str]], fecha: str, destino: str) -> Dict:
+    """Extrae un día y escribe su partición (se ejecuta en un proceso del pool)"""
+    from scraper_selenium import ejecutar_scraping
+
+    inicio = time.time()
+    clave = almacen.clave_consulta(cpv_codes, fecha, fecha)
+    resultado = ejecutar_scraping(
+        cpv_codes=cpv_codes,
+        fecha_desde=fecha,
+        fecha_hasta=fecha,
+        reanudar_desde=almacen.obtener_reanudable(clave)
+    )
+    resumen = {"fecha": fecha, "success": False, "duracion": time.time() - inicio}
+    if not resultado["success"]:
+        resumen["error"] = resultado.get("error", "Error en el scraping")
+        return resumen
+    if not resultado.get("completo", True):
+        almacen.registrar_reanudable(clave, resultado)
+        resumen["error"] = f"Paginación incompleta ({resultado.get('paginas')} páginas); se reanudará"
+        return resumen
+
+    # El día también queda en el almacén para que la API lo sirva
+    almacen.guardar_resultado(clave, resultado)
+    almacen.borrar_reanudable(clave)
+
+    directorio = directorio_particion(destino, fecha)
+    os.makedirs(directorio, exist_ok=True)
+    _escribir_json(os.path.join(directorio, ARCHIVO_PARTICION), resultado["licitaciones"])
+    resumen.update(success=True, total=resultado["total_licitaciones"], content_hash=resultado["content_hash"])
+    return resumen
+
+
+def backfill(fecha_desde: str, fecha_hasta: str, cpv_codes: Optional[List[str]], destino: str,
+             paralelo: int = BACKFILL_PARALELO) -> Dict:
+    """
+    Extrae todas las particiones diarias pendientes del rango
+
+    Returns:
+        dict con particiones completadas, fallidas y rendimiento (días/hora)
+    """
+    cpv_codes = almacen.normalizar_cpv(cpv_codes)
+    os.makedirs(destino, exist_ok=True)
+    manifest = Manifest(destino, cpv_codes)
+
+    dias = [desde for desde, _ in particiones_diarias(fecha_desde, fecha_hasta)]
+    pendientes = [dia for dia in dias if not manifest.completada(dia)]
+    logger.info(f"Backfill {fecha_desde} → {fecha_hasta}: {len(dias)} días, {len(pendientes)} pendientes, "
+                f"{paralelo} navegador(es) en paralelo")
+
+    inicio = time.time()
+    completadas, fallidas = 0, 0
+    with ProcessPoolExecutor(max_workers=paralelo, initializer=_inicializar_proceso) as pool:
+        futuros = {pool.submit(extraer_particion, cpv_codes, dia, destino): dia for dia in pendientes}
+        for futuro in as_completed(futuros):
+            dia = futuros[futuro]
+            try:
+                resumen = futuro.result()
+            except Exception as e:
+                resumen = {"fecha": dia, "success": False, "error": str(e), "duracion": 0}
+            manifest.registrar(dia, resumen)
+
+            if resumen["success"]:
+                completadas += 1
+            else:
+                fallidas += 1
+                logger.error(f"✗ {dia}: {resumen['error']}")
+
+            horas = (time.time() - inicio) / 3600
+            dias_hora = completadas / horas if horas else 0
+            restantes = len(pendientes) - completadas - fallidas
+            eta = f", ETA {restantes / dias_hora:.1f} h" if dias_hora and restantes else ""
+            logger.info(f"{'✓' if resumen['success'] else '✗'} {completadas + fallidas}/{len(pendientes)} particiones "
+                        f"({fallidas} fallidas) · {dias_hora:.1f} días/hora{eta}")
+
+    horas = (time.time() - inicio) / 3600
+    return {
+        "dias": len(dias),
+        "ya_completadas": len(dias) - len(pendientes),
+        "completadas": completadas,
+        "fallidas": fallidas,
+        "horas": round(horas, 2),
+        "dias_por_hora": round(completadas / horas, 1) if horas else None,
+        "destino": destino,
+    }
+
+
+def main():
+    """Backfill desde línea de comandos"""
+    import argparse
+    parser = argparse.ArgumentParser(description="Backfill histórico particionado por día")
+    parser.add_argument("--desde", required=True, help="Fecha inicial DD-MM-YYYY")
+    parser.add_argument("--hasta", required=True, help="Fecha final DD-MM-YYYY (incluida)")
+    parser.add_argument("--cpv", help="Códigos CPV separados por comas (por defecto sin filtro)")
+    parser.add_argument("--paralelo", type=int, default=BACKFILL_PARALELO, help="Navegadores simultáneos")
+    parser.add_argument("--destino", help="Directorio del dataset (por defecto BACKFILL_DIR/<cpv>)")
+    args = parser.parse_args()
+
+    preparar_directorios()
+    cpv_codes = almacen.normalizar_cpv(args.cpv.split(",")) if args.cpv else None
+    destino = args.destino or os.path.join(BACKFILL_DIR, "_".join(cpv_codes) if cpv_codes else "todos")
+
+    resumen = backfill(args.desde, args.hasta, cpv_codes, destino, args.paralelo)
+    logger.info(f"Backfill terminado: {json.dumps(resumen, ensure_ascii=False)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+Benchmark de arranque en frío de la API
+Mide con `python -X importtime` lo que cuesta importar main.py y comprueba que
+no supera el presupuesto ni carga dependencias pesadas que solo necesita el
+scraping (Selenium, pandas...). Termina con código 1 si se incumple, para
+usarlo como comprobación antes de desplegar
+"""
+
+import argparse
+import json
+import subprocess
+import sys
+
+# Solo se deben importar con el primer scraping, nunca al arrancar la API
+MODULOS_PROHIBIDOS = ["selenium", "webdriver_manager", "pandas", "numpy", "psutil", "playwright"]
+
+
+def medir_importacion(modulo):
+    """Devuelve (total_ms, {paquete: ms propios}, módulos cargados) de importar `modulo` en un proceso nuevo"""
+    codigo = f"import sys, json, {modulo}; print(json.dumps(sorted(sys.modules)))"
+    proceso = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", codigo],
+        capture_output=True, text=True, check=True
+    )
+
+    por_paquete = {}
+    total_ms = 0.0
+    for linea in proceso.stderr.splitlines():
+        if not linea.startswith("import time:") or "self [us]" in linea:
+            continue
+        propio, acumulado, nombre = (parte.strip() for parte in linea[len("import time:"):].split("|"))
+        paquete = nombre.split(".")[0]
+        por_paquete[paquete] = por_paquete.get(paquete, 0) + int(propio) / 1000
+        if nombre == modulo:
+            total_ms = int(acumulado) / 1000
+
+    return total_ms, por_paquete, json.loads(proceso.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de arranque en frío (import de main.py)")
+    parser.add_argument("--modulo", default="main")
+    parser.add_argument("--presupuesto-ms", type=float, default=800, help="Tiempo máximo de importación")
+    parser.add_argument("--repeticiones", type=int, default=3)
+    parser.add_argument("--top", type=int, default=10, help="Paquetes más costosos a mostrar")
+    args = parser.parse_args()
+
+    mediciones = [medir_importacion(args.modulo) for _ in range(args.repeticiones)]
+    # El mínimo es la medida menos afectada por el ruido del sistema
+    total_ms, por_paquete, modulos = min(mediciones, key=lambda medicion: medicion[0])
+
+    print(f"Importación de {args.modulo}: {total_ms:.0f} ms (mejor de {args.repeticiones}, "
+          f"presupuesto {args.presupuesto_ms:.0f} ms)")
+    print(f"\n{'Paquete':<30} {'ms':>10}")
+    print("-" * 41)
+    for paquete, ms in sorted(por_paquete.items(), key=lambda par: par[1], reverse=True)[:args.top]:
+        print(f"{paquete:<30} {ms:>10.1f}")
+
+    cargados = sorted({m.split(".")[0] for m in modulos} & set(MODULOS_PROHIBIDOS))
+    errores = []
+    if total_ms > args.presupuesto_ms:
+        errores.append(f"importar {args.modulo} tarda {total_ms:.0f} ms (presupuesto {args.presupuesto_ms:.0f} ms)")
+    if cargados:
+        errores.append(f"se cargan al arrancar dependencias del scraping: {', '.join(cargados)}")
+
+    if errores:
+        print("\n✗ " + "\n✗ ".join(errores))
+        sys.exit(1)
+    print("\n✓ Arranque dentro del presupuesto")
+
+
+if __name__ == "__main__":
+    main()
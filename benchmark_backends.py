@@ -0,0 +1,108 @@
+"""
+Benchmark de backends de navegador: Selenium frente a Playwright
+Lanza la misma tanda de extracciones concurrentes contra el portal con cada
+backend (un Chrome por extracción frente a un Chromium con un contexto por
+extracción) y compara duración, páginas por segundo y memoria pico de los
+navegadores (RSS de los procesos hijos).
+
+El gobernador de cortesía sigue aplicándose: para medir la concurrencia real
+conviene fijar CONCURRENCIA_INICIAL/CONCURRENCIA_MAX >= --concurrencia y un
+PORTAL_RPS acorde, por ejemplo:
+    CONCURRENCIA_INICIAL=4 CONCURRENCIA_MAX=4 PORTAL_RPS=2 python benchmark_backends.py --concurrencia 4
+"""
+
+import argparse
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from config import CONCURRENCIA_INICIAL, CONCURRENCIA_MAX, PORTAL_RPS, preparar_directorios
+from memoria import rss_descendientes
+
+INTERVALO_MUESTREO = 0.5  # Segundos entre muestras de memoria
+
+
+class MuestreoMemoria:
+    """Pico de RSS de los procesos hijos (navegadores) mientras dura el bloque"""
+
+    def __init__(self):
+        self.pico = 0
+        self._parar = threading.Event()
+        self._hilo = threading.Thread(target=self._muestrear, daemon=True)
+
+    def _muestrear(self):
+        while not self._parar.is_set():
+            self.pico = max(self.pico, rss_descendientes() or 0)
+            self._parar.wait(INTERVALO_MUESTREO)
+
+    def __enter__(self):
+        self._hilo.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._parar.set()
+        self._hilo.join()
+
+
+def consultas(args):
+    cpv = [code.strip() for code in args.cpv.split(",") if code.strip()] if args.cpv else None
+    return [dict(cpv_codes=cpv, fecha_desde=args.desde, fecha_hasta=args.hasta)] * args.concurrencia
+
+
+def ejecutar_selenium(lista):
+    from scraper_selenium import ejecutar_scraping
+    with ThreadPoolExecutor(max_workers=len(lista)) as pool:
+        return list(pool.map(lambda consulta: ejecutar_scraping(**consulta), lista))
+
+
+def ejecutar_playwright(lista):
+    from scraper_playwright import NavegadorCompartido, ejecutar_scraping_async
+
+    async def tanda():
+        navegador = NavegadorCompartido()
+        try:
+            return await asyncio.gather(*(ejecutar_scraping_async(navegador=navegador, **consulta) for consulta in lista))
+        finally:
+            await navegador.cerrar()
+
+    return asyncio.run(tanda())
+
+
+def medir(nombre, funcion, lista):
+    with MuestreoMemoria() as memoria:
+        inicio = time.perf_counter()
+        resultados = funcion(lista)
+        duracion = time.perf_counter() - inicio
+    correctas = [r for r in resultados if r["success"]]
+    paginas = sum(r.get("paginas", 0) for r in correctas)
+    filas = sum(r["total_licitaciones"] for r in correctas)
+    print(f"  {nombre:<12} {len(correctas):>3}/{len(resultados):<3} {duracion:>9.1f} s {paginas:>8} "
+          f"{paginas / duracion if duracion else 0:>9.2f} {filas:>8} {memoria.pico / (1024 * 1024):>10.0f} MB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de backends de navegador (Selenium y Playwright)")
+    parser.add_argument("--concurrencia", type=int, default=2, help="Extracciones simultáneas por backend")
+    parser.add_argument("--cpv", help="Códigos CPV separados por comas (opcional)")
+    parser.add_argument("--desde", help="Fecha desde DD-MM-YYYY (por defecto, ayer)")
+    parser.add_argument("--hasta", help="Fecha hasta DD-MM-YYYY (por defecto, ayer)")
+    parser.add_argument("--backends", default="selenium,playwright", help="Backends a comparar, separados por comas")
+    args = parser.parse_args()
+
+    preparar_directorios()
+    lista = consultas(args)
+    backends = {"selenium": ejecutar_selenium, "playwright": ejecutar_playwright}
+
+    print("=" * 80)
+    print(f"BENCHMARK DE BACKENDS ({args.concurrencia} extracciones simultáneas)")
+    print("=" * 80)
+    print(f"  Gobernador: {PORTAL_RPS} acciones/s, sesiones {CONCURRENCIA_INICIAL} (máx. {CONCURRENCIA_MAX})")
+    print(f"  {'Backend':<12} {'OK':>7} {'Duración':>11} {'Páginas':>8} {'Pág./s':>9} {'Filas':>8} {'RSS pico':>13}")
+    for nombre in [b.strip() for b in args.backends.split(",") if b.strip()]:
+        medir(nombre, backends[nombre], lista)
+    print("=" * 80)
+
+
+if __name__ == "__main__":
+    main()
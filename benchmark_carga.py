@@ -0,0 +1,437 @@
+"""
+Prueba de carga de la API
+Genera carga no interactiva contra /licitaciones, /health y los demás endpoints
+de consulta con una mezcla configurable, en modo cerrado (N clientes que
+repiten peticiones) o abierto (llegadas de Poisson a una tasa fija), e informa
+del throughput y de las latencias p50/p95/p99 por endpoint. El resultado se
+guarda en JSON (datos_licitaciones/carga/) para comparar versiones.
+
+Sin --url arranca un servidor local en un subproceso con bases de datos
+temporales y, con --extraccion-falsa, un extractor simulado en lugar del
+navegador (latencia por página configurable), de modo que se mide la API y
+no el portal:
+    python benchmark_carga.py --extraccion-falsa --concurrencia 20 --duracion 30
+    python benchmark_carga.py --extraccion-falsa --tasa 50 --duracion 30 --comparar datos_licitaciones/carga/anterior.json
+    python benchmark_carga.py --url http://localhost:8000 --api-key tu_clave --mezcla health=1
+
+En modo abierto la latencia se mide desde el instante de llegada previsto:
+si el límite de peticiones simultáneas retrasa el envío, la espera cuenta.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+import httpx
+
+from config import OUTPUT_DIR
+
+DIRECTORIO_RESULTADOS = os.path.join(OUTPUT_DIR, "carga")
+MEZCLA_POR_DEFECTO = "licitaciones=6,health=2,search=1,changes=1"
+ESPERA_ARRANQUE = 60  # Segundos máximos esperando a que el servidor local responda a /health
+PERCENTILES = (50, 95, 99)
+
+
+def _ayer() -> str:
+    return (datetime.now() - timedelta(days=1)).strftime("%d-%m-%Y")
+
+
+def _dia(desplazamiento: int) -> str:
+    return (datetime.now() - timedelta(days=1 + desplazamiento)).strftime("%d-%m-%Y")
+
+
+def _parametros_licitaciones(args) -> Dict:
+    # Rotar entre --dias fechas: la primera petición de cada una extrae, el resto sale del almacén
+    dia = _dia(random.randrange(args.dias))
+    parametros = {"fecha_desde": dia, "fecha_hasta": dia}
+    if args.cpv:
+        parametros["cpv_codes"] = args.cpv
+    return parametros
+
+
+# Peticiones de cada endpoint: (ruta, función que devuelve los parámetros)
+ENDPOINTS = {
+    "health": ("/health", lambda args: {}),
+    "raiz": ("/", lambda args: {}),
+    "licitaciones": ("/licitaciones", _parametros_licitaciones),
+    "search": ("/licitaciones/search", lambda args: {"q": random.choice(("mantenimiento", "servicio", "suministro"))}),
+    "changes": ("/licitaciones/changes", lambda args: {"since": _dia(args.dias)}),
+    "programador": ("/programador", lambda args: {}),
+    "workers": ("/workers", lambda args: {}),
+    "instantanea": ("/instantaneas/ayer/todos.json", lambda args: {}),
+}
+
+
+def parsear_mezcla(texto: str) -> Dict[str, float]:
+    """'licitaciones=6,health=2' -> pesos por endpoint"""
+    mezcla = {}
+    for parte in texto.split(","):
+        nombre, _, peso = parte.strip().partition("=")
+        if nombre not in ENDPOINTS:
+            raise ValueError(f"Endpoint desconocido en la mezcla: {nombre} (disponibles: {', '.join(ENDPOINTS)})")
+        mezcla[nombre] = float(peso or 1)
+    return mezcla
+
+
+def percentil(valores: List[float], p: float) -> Optional[float]:
+    """Percentil por rango más cercano sobre valores ya ordenados"""
+    if not valores:
+        return None
+    rango = max(1, -(-len(valores) * p // 100))
+    return valores[int(rango) - 1]
+
+
+# ---------------------------------------------------------------------------
+# Servidor local con extracción simulada
+# ---------------------------------------------------------------------------
+
+def extraccion_falsa(cpv_codes=None, fecha_desde=None, fecha_hasta=None, reanudar_desde=None, progreso=None):
+    """
+    Sustituto de scraper_selenium.ejecutar_scraping sin navegador
+
+    Simula CARGA_PAGINAS páginas de CARGA_FILAS filas con CARGA_LATENCIA
+    segundos por página, escribe los resultados en una carpeta de ejecución
+    como el scraper y respeta la cancelación cooperativa.
+    """
+    import almacen
+    from progreso import ExtraccionCancelada
+
+    paginas = int(os.getenv("CARGA_PAGINAS", "3"))
+    filas = int(os.getenv("CARGA_FILAS", "50"))
+    latencia = float(os.getenv("CARGA_LATENCIA", "0.2"))
+    carpeta = os.path.join(os.environ["CARGA_DATOS"], f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:8]}")
+    os.makedirs(carpeta)
+
+    fecha_desde = fecha_desde or _ayer()
+    fecha_hasta = fecha_hasta or _ayer()
+    licitaciones = []
+    try:
+        for pagina in range(1, paginas + 1):
+            if progreso is not None:
+                progreso.comprobar_cancelacion()
+            time.sleep(latencia)
+            licitaciones.extend({
+                "expediente": f"{fecha_desde}/{pagina:03d}/{fila:04d}",
+                "descripcion": "Contratación del servicio de mantenimiento y soporte de aplicaciones",
+                "tipo": "Servicios",
+                "subtipo": "Servicios informáticos",
+                "estado": "Publicada",
+                "importe": f"{(pagina * 1000 + fila) * 10:,}".replace(",", ".") + ",00 EUR",
+                "fecha": fecha_desde.replace("-", "/"),
+                "organismo": "Ayuntamiento de Madrid",
+                "enlace": f"https://contrataciondelestado.es/wps/poc?idEvl={pagina:05d}{fila:05d}",
+            } for fila in range(filas))
+            if progreso is not None:
+                progreso.pagina_procesada(pagina, len(licitaciones), paginas)
+    except ExtraccionCancelada as e:
+        return {"success": False, "cancelado": True, "motivo": e.motivo, "error": f"Extracción cancelada: {e.motivo}",
+                "output_folder": carpeta, "paginas": pagina - 1, "total_licitaciones": 0, "licitaciones": []}
+
+    with open(os.path.join(carpeta, "licitaciones_extraidas.json"), "w", encoding="utf-8") as f:
+        json.dump(licitaciones, f, ensure_ascii=False)
+    return {
+        "success": True,
+        "total_licitaciones": len(licitaciones),
+        "licitaciones": licitaciones,
+        "output_folder": carpeta,
+        "cpv_codes": cpv_codes,
+        "fecha_desde": fecha_desde,
+        "fecha_hasta": fecha_hasta,
+        "content_hash": almacen.hash_filas(licitaciones),
+        "last_modified": time.time(),
+        "completo": True,
+        "paginas": paginas,
+    }
+
+
+def servir(puerto: int, falsa: bool) -> None:
+    """Proceso del servidor local (invocado por iniciar_servidor)"""
+    import uvicorn
+    if falsa:
+        # Los llamadores importan ejecutar_scraping en cada extracción: basta con sustituirlo en el módulo
+        import scraper_selenium
+        scraper_selenium.ejecutar_scraping = extraccion_falsa
+    import main
+    uvicorn.run(main.app, host="127.0.0.1", port=puerto, log_level="warning")
+
+
+def _puerto_libre() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def iniciar_servidor(args, datos: str):
+    """Arranca la API en un subproceso con bases de datos temporales; devuelve (proceso, url)"""
+    puerto = _puerto_libre()
+    entorno = dict(
+        os.environ,
+        API_KEY=args.api_key,
+        SCHEDULER_ENABLED="false",
+        SCRAPING_MODO="inline",
+        SCRAPER_BACKEND="selenium",
+        CARGA_DATOS=datos,
+        CARGA_PAGINAS=str(args.paginas_falsas),
+        CARGA_FILAS=str(args.filas_falsas),
+        CARGA_LATENCIA=str(args.latencia_falsa),
+        **{variable: os.path.join(datos, f"{variable.lower()}.sqlite3")
+           for variable in ("ALMACEN_DB", "BUSQUEDA_DB", "SUSCRIPCIONES_DB", "COLA_DB", "CORTESIA_DB")},
+    )
+    comando = [sys.executable, os.path.abspath(__file__), "--servir", str(puerto)]
+    if args.extraccion_falsa:
+        comando.append("--extraccion-falsa")
+    proceso = subprocess.Popen(comando, env=entorno, cwd=os.path.dirname(os.path.abspath(__file__)))
+    url = f"http://127.0.0.1:{puerto}"
+
+    limite = time.monotonic() + ESPERA_ARRANQUE
+    while time.monotonic() < limite:
+        if proceso.poll() is not None:
+            raise RuntimeError(f"El servidor local terminó al arrancar (código {proceso.returncode})")
+        try:
+            if httpx.get(f"{url}/health", timeout=1).status_code == 200:
+                return proceso, url
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    proceso.terminate()
+    raise RuntimeError(f"El servidor local no respondió en {ESPERA_ARRANQUE} s")
+
+
+# ---------------------------------------------------------------------------
+# Generador de carga
+# ---------------------------------------------------------------------------
+
+class Registro:
+    """Latencias y códigos de estado por endpoint"""
+
+    def __init__(self):
+        self.latencias: Dict[str, List[float]] = {}
+        self.estados: Dict[str, Dict[str, int]] = {}
+
+    def anotar(self, endpoint: str, latencia: float, estado: str) -> None:
+        self.latencias.setdefault(endpoint, []).append(latencia)
+        estados = self.estados.setdefault(endpoint, {})
+        estados[estado] = estados.get(estado, 0) + 1
+
+    def resumen(self, duracion: float) -> Dict:
+        por_endpoint = {}
+        todas = []
+        for endpoint, latencias in self.latencias.items():
+            todas.extend(latencias)
+            por_endpoint[endpoint] = self._estadisticas(latencias, self.estados[endpoint], duracion)
+        estados_totales = {}
+        for estados in self.estados.values():
+            for estado, n in estados.items():
+                estados_totales[estado] = estados_totales.get(estado, 0) + n
+        return {"total": self._estadisticas(todas, estados_totales, duracion), "endpoints": por_endpoint}
+
+    @staticmethod
+    def _estadisticas(latencias: List[float], estados: Dict[str, int], duracion: float) -> Dict:
+        ordenadas = sorted(latencias)
+        errores = sum(n for estado, n in estados.items() if not estado.startswith(("2", "3")))
+        return {
+            "peticiones": len(ordenadas),
+            "errores": errores,
+            "estados": dict(sorted(estados.items())),
+            "throughput_rps": round(len(ordenadas) / duracion, 2) if duracion else None,
+            **{f"p{p}_ms": round(percentil(ordenadas, p) * 1000, 1) if ordenadas else None for p in PERCENTILES},
+            "media_ms": round(sum(ordenadas) / len(ordenadas) * 1000, 1) if ordenadas else None,
+            "max_ms": round(ordenadas[-1] * 1000, 1) if ordenadas else None,
+        }
+
+
+async def _peticion(cliente: httpx.AsyncClient, args, mezcla, registro: Registro, inicio: float) -> None:
+    endpoint = random.choices(list(mezcla), weights=list(mezcla.values()))[0]
+    ruta, parametros = ENDPOINTS[endpoint]
+    try:
+        respuesta = await cliente.get(ruta, params=parametros(args))
+        estado = str(respuesta.status_code)
+    except httpx.HTTPError as e:
+        estado = type(e).__name__
+    registro.anotar(endpoint, time.perf_counter() - inicio, estado)
+
+
+async def carga_cerrada(cliente, args, mezcla, registro: Registro, fin: float) -> None:
+    """N clientes que encadenan peticiones sin pausa"""
+    restantes = [args.peticiones] if args.peticiones else None
+
+    async def usuario():
+        while time.perf_counter() < fin:
+            if restantes is not None:
+                if restantes[0] <= 0:
+                    return
+                restantes[0] -= 1
+            await _peticion(cliente, args, mezcla, registro, time.perf_counter())
+
+    await asyncio.gather(*(usuario() for _ in range(args.concurrencia)))
+
+
+async def carga_abierta(cliente, args, mezcla, registro: Registro, fin: float) -> None:
+    """Llegadas de Poisson a args.tasa peticiones/s con como mucho args.concurrencia en vuelo"""
+    limite = asyncio.Semaphore(args.concurrencia)
+    tareas = []
+
+    async def llegada(prevista):
+        async with limite:
+            await _peticion(cliente, args, mezcla, registro, prevista)
+
+    prevista = time.perf_counter()
+    while prevista < fin and (not args.peticiones or len(tareas) < args.peticiones):
+        espera = prevista - time.perf_counter()
+        if espera > 0:
+            await asyncio.sleep(espera)
+        tareas.append(asyncio.create_task(llegada(prevista)))
+        prevista += random.expovariate(args.tasa)
+    await asyncio.gather(*tareas)
+
+
+async def generar_carga(url: str, args, mezcla: Dict[str, float]) -> Dict:
+    registro = Registro()
+    limites = httpx.Limits(max_connections=args.concurrencia, max_keepalive_connections=args.concurrencia)
+    async with httpx.AsyncClient(base_url=url, headers={"X-API-Key": args.api_key},
+                                 limits=limites, timeout=args.timeout) as cliente:
+        # Calentamiento: conexiones y primera extracción de cada día fuera de la medida
+        for _ in range(args.calentamiento):
+            await _peticion(cliente, args, mezcla, Registro(), time.perf_counter())
+        inicio = time.perf_counter()
+        fin = inicio + args.duracion
+        if args.tasa:
+            await carga_abierta(cliente, args, mezcla, registro, fin)
+        else:
+            await carga_cerrada(cliente, args, mezcla, registro, fin)
+        duracion = time.perf_counter() - inicio
+    return {"duracion_s": round(duracion, 2), **registro.resumen(duracion)}
+
+
+# ---------------------------------------------------------------------------
+# Informe
+# ---------------------------------------------------------------------------
+
+def _version() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def _ratio(actual, previo) -> str:
+    """Cociente frente a la ejecución anterior; '-' si alguno de los dos valores es 0 o falta"""
+    if not actual or not previo:
+        return f"{'-':>9}"
+    return f"{actual / previo:>8.2f}x"
+
+
+def imprimir(resultado: Dict, anterior: Optional[Dict] = None) -> None:
+    print(f"  {'Endpoint':<14} {'Peticiones':>10} {'Errores':>8} {'RPS':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    filas = [(nombre, datos) for nombre, datos in sorted(resultado["endpoints"].items())]
+    filas.append(("TOTAL", resultado["total"]))
+    for nombre, datos in filas:
+        print(f"  {nombre:<14} {datos['peticiones']:>10} {datos['errores']:>8} {datos['throughput_rps']:>9} "
+              f"{datos['p50_ms']:>9} {datos['p95_ms']:>9} {datos['p99_ms']:>9}")
+        previo = (anterior["total"] if nombre == "TOTAL" else anterior["endpoints"].get(nombre)) if anterior else None
+        if previo:
+            cocientes = " ".join(_ratio(datos.get(campo), previo.get(campo))
+                                 for campo in ("throughput_rps", "p50_ms", "p95_ms", "p99_ms"))
+            print(f"  {'  vs. anterior':<14} {'':>10} {'':>8} {cocientes}")
+
+
+def guardar(resultado: Dict, ruta: Optional[str]) -> str:
+    if not ruta:
+        os.makedirs(DIRECTORIO_RESULTADOS, exist_ok=True)
+        etiqueta = resultado["version"] or "sin_version"
+        ruta = os.path.join(DIRECTORIO_RESULTADOS, f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{etiqueta}.json")
+    with open(ruta, "w", encoding="utf-8") as f:
+        json.dump(resultado, f, ensure_ascii=False, indent=2)
+    return ruta
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prueba de carga de la API con percentiles de latencia")
+    parser.add_argument("--url", help="API ya arrancada (por defecto se arranca una local en un subproceso)")
+    parser.add_argument("--api-key", default=os.getenv("API_KEY", "carga"), help="API Key (X-API-Key)")
+    parser.add_argument("--extraccion-falsa", action="store_true",
+                        help="Servidor local con extractor simulado en lugar del navegador")
+    parser.add_argument("--paginas-falsas", type=int, default=3, help="Páginas por extracción simulada")
+    parser.add_argument("--filas-falsas", type=int, default=50, help="Filas por página simulada")
+    parser.add_argument("--latencia-falsa", type=float, default=0.2, help="Segundos por página simulada")
+    parser.add_argument("--mezcla", default=MEZCLA_POR_DEFECTO,
+                        help=f"Pesos por endpoint ({', '.join(ENDPOINTS)}); por defecto {MEZCLA_POR_DEFECTO}")
+    parser.add_argument("--concurrencia", type=int, default=10, help="Clientes (modo cerrado) o máximo en vuelo (abierto)")
+    parser.add_argument("--tasa", type=float, help="Peticiones/s con llegadas de Poisson (modo abierto)")
+    parser.add_argument("--duracion", type=float, default=30, help="Segundos de medida")
+    parser.add_argument("--peticiones", type=int, help="Detener tras este número de peticiones")
+    parser.add_argument("--calentamiento", type=int, default=10, help="Peticiones previas no medidas")
+    parser.add_argument("--dias", type=int, default=3, help="Fechas distintas que rota /licitaciones")
+    parser.add_argument("--cpv", help="cpv_codes de las peticiones a /licitaciones")
+    parser.add_argument("--timeout", type=float, default=120, help="Timeout por petición en segundos")
+    parser.add_argument("--salida", help="Archivo JSON del resultado (por defecto, datos_licitaciones/carga/)")
+    parser.add_argument("--comparar", help="Resultado JSON anterior con el que comparar")
+    parser.add_argument("--semilla", type=int, default=42)
+    parser.add_argument("--servir", type=int, metavar="PUERTO", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.servir:
+        servir(args.servir, args.extraccion_falsa)
+        return
+
+    random.seed(args.semilla)
+    mezcla = parsear_mezcla(args.mezcla)
+    anterior = None
+    if args.comparar:
+        with open(args.comparar, "r", encoding="utf-8") as f:
+            anterior = json.load(f)
+
+    proceso = datos = None
+    url = args.url
+    if not url:
+        datos = tempfile.mkdtemp(prefix="carga_")
+        proceso, url = iniciar_servidor(args, datos)
+    try:
+        medida = asyncio.run(generar_carga(url, args, mezcla))
+    finally:
+        if proceso is not None:
+            proceso.terminate()
+            proceso.wait()
+            shutil.rmtree(datos, ignore_errors=True)
+
+    resultado = {
+        "version": _version(),
+        "fecha": datetime.now().isoformat(),
+        "parametros": {
+            "url": args.url or "local",
+            "extraccion_falsa": args.extraccion_falsa and not args.url,
+            "modo": "abierto" if args.tasa else "cerrado",
+            "tasa": args.tasa,
+            "concurrencia": args.concurrencia,
+            "duracion": args.duracion,
+            "mezcla": mezcla,
+            "dias": args.dias,
+            **({"paginas_falsas": args.paginas_falsas, "filas_falsas": args.filas_falsas,
+                "latencia_falsa": args.latencia_falsa} if args.extraccion_falsa and not args.url else {}),
+        },
+        **medida,
+    }
+
+    print("=" * 80)
+    modo = f"abierto, {args.tasa} pet./s" if args.tasa else f"cerrado, {args.concurrencia} clientes"
+    print(f"PRUEBA DE CARGA ({modo}, {medida['duracion_s']} s, versión {resultado['version'] or '?'})")
+    print("=" * 80)
+    imprimir(resultado, anterior)
+    print("=" * 80)
+    print(f"  Resultado guardado en {guardar(resultado, args.salida)}")
+
+
+if __name__ == "__main__":
+    main()
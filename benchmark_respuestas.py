@@ -0,0 +1,93 @@
+"""
+Benchmark de serialización de respuestas
+Compara el JSONResponse estándar con orjson + compresión y los formatos compactos
+usando un conjunto sintético de licitaciones del tamaño de una semana sin filtro CPV
+"""
+
+import argparse
+import random
+import time
+
+from fastapi.responses import JSONResponse
+
+import respuestas
+
+
+def generar_licitaciones(n):
+    """Genera n licitaciones sintéticas con la misma forma que las del scraper"""
+    random.seed(42)
+    organismos = [
+        "Ayuntamiento de Madrid",
+        "Ministerio de Hacienda y Función Pública",
+        "Servicio Andaluz de Salud",
+        "Universidad de Salamanca",
+        "Consejería de Educación de la Comunidad de Madrid",
+    ]
+    tipos = [("Servicios", "Servicios informáticos"), ("Suministros", "Compra"), ("Obras", "Construcción")]
+    licitaciones = []
+    for i in range(n):
+        tipo, subtipo = random.choice(tipos)
+        licitaciones.append({
+            "expediente": f"{2026}/{i:06d}",
+            "descripcion": "Contratación del servicio de mantenimiento y soporte de aplicaciones " * random.randint(1, 3),
+            "tipo": tipo,
+            "subtipo": subtipo,
+            "estado": "Publicada",
+            "importe": f"{random.randint(1000, 5000000):,}".replace(",", ".") + ",00 EUR",
+            "fecha": f"{random.randint(1, 28):02d}/01/2026",
+            "organismo": random.choice(organismos),
+            "enlace": f"https://contrataciondelestado.es/wps/poc?uri=deeplink%3Adetalle_licitacion&idEvl={i:010d}%3D%3D",
+        })
+    return licitaciones
+
+
+def medir(nombre, funcion, repeticiones):
+    """Ejecuta la función varias veces y devuelve (mejor tiempo en ms, tamaño en bytes)"""
+    mejor = float("inf")
+    tamano = 0
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        cuerpo = funcion()
+        mejor = min(mejor, time.perf_counter() - inicio)
+        tamano = len(cuerpo)
+    print(f"  {nombre:<32} {mejor * 1000:>9.1f} ms {tamano / 1024:>11.1f} KiB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de serialización de respuestas")
+    parser.add_argument("--licitaciones", type=int, default=20000, help="Número de licitaciones sintéticas")
+    parser.add_argument("--repeticiones", type=int, default=5)
+    args = parser.parse_args()
+
+    content = {
+        "success": True,
+        "timestamp": "2026-01-16T10:30:00",
+        "total_licitaciones": args.licitaciones,
+        "filtro_cpv": "ninguno",
+        "licitaciones": generar_licitaciones(args.licitaciones),
+    }
+
+    print("=" * 80)
+    print(f"BENCHMARK DE RESPUESTAS ({args.licitaciones} licitaciones)")
+    print("=" * 80)
+    print(f"  orjson: {'sí' if respuestas.orjson else 'no'} | brotli: {'sí' if respuestas.brotli else 'no'} | "
+          f"msgpack: {'sí' if respuestas.msgpack else 'no'} | pyarrow: {'sí' if respuestas.pa else 'no'}")
+    print(f"  {'Camino':<32} {'Tiempo':>12} {'Tamaño':>15}")
+
+    medir("JSONResponse (actual)", lambda: JSONResponse(content=content).body, args.repeticiones)
+    medir("ORJSONResponse", lambda: respuestas.ORJSONResponse(content=content).body, args.repeticiones)
+    medir("orjson + gzip", lambda: respuestas.comprimir(respuestas.serializar_json(content), "gzip")[0], args.repeticiones)
+    if respuestas.brotli:
+        medir("orjson + brotli", lambda: respuestas.comprimir(respuestas.serializar_json(content), "br")[0], args.repeticiones)
+    if respuestas.msgpack:
+        medir("MessagePack", lambda: respuestas.serializar(content, respuestas.MEDIA_MSGPACK), args.repeticiones)
+        medir("MessagePack + gzip", lambda: respuestas.comprimir(
+            respuestas.serializar(content, respuestas.MEDIA_MSGPACK), "gzip")[0], args.repeticiones)
+    if respuestas.pa:
+        medir("Arrow IPC", lambda: respuestas.serializar(content, respuestas.MEDIA_ARROW), args.repeticiones)
+
+    print("=" * 80)
+
+
+if __name__ == "__main__":
+    main()
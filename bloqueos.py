@@ -0,0 +1,25 @@
+"""
+Bloqueos de archivo entre procesos
+Bloqueo exclusivo no bloqueante sobre un archivo abierto (fcntl en POSIX,
+msvcrt en Windows). Lo usan el programador y el entregador de suscripciones
+(un solo proceso activo por máquina), los perfiles de caché del navegador y
+las particiones del dataset Parquet. El bloqueo se libera al cerrar el archivo.
+"""
+
+
+def bloquear_archivo(archivo) -> bool:
+    """Intenta un bloqueo exclusivo no bloqueante sobre un archivo abierto"""
+    try:
+        import fcntl
+        try:
+            fcntl.flock(archivo.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return True
+        except OSError:
+            return False
+    except ImportError:
+        import msvcrt
+        try:
+            msvcrt.locking(archivo.fileno(), msvcrt.LK_NBLCK, 1)
+            return True
+        except OSError:
+            return False
@@ -0,0 +1,262 @@
+"""
+Búsqueda de texto completo
+Índice SQLite FTS5 sobre expediente, descripción y organismo de todas las
+licitaciones extraídas, mantenido de forma incremental cada vez que el almacén
+guarda un resultado. Las búsquedas se resuelven sin ir al portal.
+
+El tokenizador unicode61 con remove_diacritics pliega tildes y mayúsculas
+("adjudicación" = "ADJUDICACION"); los términos se buscan por prefijo para
+cubrir plurales y derivados ("licitacion" encuentra "licitaciones") y se
+descartan las palabras vacías del español.
+"""
+
+import json
+import os
+import re
+import sqlite3
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+from checkpoint import clave_licitacion
+from cambios import hash_licitacion
+from campos import parsear_fecha
+from config import BUSQUEDA_DB
+from logger import setup_logger
+
+logger = setup_logger(__name__)
+
+# Pesos BM25 por columna del índice: expediente, descripcion, organismo
+PESOS_COLUMNAS = (5.0, 1.0, 2.0)
+LONGITUD_MINIMA_PREFIJO = 3  # Términos más cortos se buscan como palabra completa
+TAMANO_LOTE = 500  # Claves por consulta al comprobar qué filas han cambiado
+
+PALABRAS_VACIAS = frozenset("""
+a al ante bajo con contra de del desde durante e el en entre hacia hasta la las le les lo los
+mediante o para por pero que se sin sobre su sus tras u un una unas unos y
+""".split())
+
+_ESQUEMA = """
+PRAGMA journal_mode = WAL;
+CREATE TABLE IF NOT EXISTS licitaciones (
+    id INTEGER PRIMARY KEY,
+    clave TEXT NOT NULL UNIQUE,
+    hash TEXT NOT NULL,
+    expediente TEXT,
+    descripcion TEXT,
+    tipo TEXT,
+    subtipo TEXT,
+    estado TEXT,
+    importe TEXT,
+    fecha TEXT,
+    fecha_iso TEXT,
+    organismo TEXT,
+    enlace TEXT,
+    indexado REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS licitaciones_fecha ON licitaciones (fecha_iso);
+CREATE VIRTUAL TABLE IF NOT EXISTS licitaciones_fts USING fts5(
+    expediente, descripcion, organismo,
+    content = 'licitaciones', content_rowid = 'id',
+    tokenize = 'unicode61 remove_diacritics 2',
+    prefix = '3 4 5'
+);
+CREATE TRIGGER IF NOT EXISTS licitaciones_ai AFTER INSERT ON licitaciones BEGIN
+    INSERT INTO licitaciones_fts (rowid, expediente, descripcion, organismo)
+    VALUES (new.id, new.expediente, new.descripcion, new.organismo);
+END;
+CREATE TRIGGER IF NOT EXISTS licitaciones_ad AFTER DELETE ON licitaciones BEGIN
+    INSERT INTO licitaciones_fts (licitaciones_fts, rowid, expediente, descripcion, organismo)
+    VALUES ('delete', old.id, old.expediente, old.descripcion, old.organismo);
+END;
+CREATE TRIGGER IF NOT EXISTS licitaciones_au AFTER UPDATE ON licitaciones BEGIN
+    INSERT INTO licitaciones_fts (licitaciones_fts, rowid, expediente, descripcion, organismo)
+    VALUES ('delete', old.id, old.expediente, old.descripcion, old.organismo);
+    INSERT INTO licitaciones_fts (rowid, expediente, descripcion, organismo)
+    VALUES (new.id, new.expediente, new.descripcion, new.organismo);
+END;
+"""
+
+
+@contextmanager
+def _conectar():
+    """Abre una conexión al índice (una por operación) y confirma al salir"""
+    os.makedirs(os.path.dirname(BUSQUEDA_DB) or ".", exist_ok=True)
+    conexion = sqlite3.connect(BUSQUEDA_DB, timeout=30)
+    conexion.row_factory = sqlite3.Row
+    try:
+        with conexion:
+            conexion.executescript(_ESQUEMA)
+            yield conexion
+    finally:
+        conexion.close()
+
+
+def _fecha_iso(fecha: Optional[str]) -> Optional[str]:
+    """'05/01/2026' o '05-01-2026' (con o sin hora) -> '2026-01-05'"""
+    dia = parsear_fecha(fecha)
+    return dia.isoformat() if dia else None
+
+
+def indexar(licitaciones: List[Dict]) -> int:
+    """
+    Añade o actualiza licitaciones en el índice (clave expediente + organismo)
+
+    Las filas cuyo contenido no ha cambiado no se reescriben.
+
+    Returns:
+        número de licitaciones nuevas o modificadas
+    """
+    ahora = time.time()
+    por_clave = {clave_licitacion(licitacion): licitacion for licitacion in licitaciones}
+    with _conectar() as conexion:
+        existentes = {}
+        claves = list(por_clave)
+        for inicio in range(0, len(claves), TAMANO_LOTE):
+            lote = claves[inicio:inicio + TAMANO_LOTE]
+            existentes.update(conexion.execute(
+                f"SELECT clave, hash FROM licitaciones WHERE clave IN ({','.join('?' * len(lote))})", lote
+            ).fetchall())
+
+        filas = []
+        for clave, licitacion in por_clave.items():
+            hash_fila = hash_licitacion(licitacion)
+            if existentes.get(clave) == hash_fila:
+                continue
+            filas.append((
+                clave, hash_fila,
+                licitacion.get("expediente"), licitacion.get("descripcion"), licitacion.get("tipo"),
+                licitacion.get("subtipo"), licitacion.get("estado"), licitacion.get("importe"),
+                licitacion.get("fecha"), _fecha_iso(licitacion.get("fecha")), licitacion.get("organismo"),
+                licitacion.get("enlace"), ahora,
+            ))
+        conexion.executemany(
+            """
+            INSERT INTO licitaciones
+                (clave, hash, expediente, descripcion, tipo, subtipo, estado, importe, fecha, fecha_iso,
+                 organismo, enlace, indexado)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT (clave) DO UPDATE SET
+                hash = excluded.hash, expediente = excluded.expediente, descripcion = excluded.descripcion,
+                tipo = excluded.tipo, subtipo = excluded.subtipo, estado = excluded.estado,
+                importe = excluded.importe, fecha = excluded.fecha, fecha_iso = excluded.fecha_iso,
+                organismo = excluded.organismo, enlace = excluded.enlace, indexado = excluded.indexado
+            """,
+            filas,
+        )
+    if filas:
+        logger.info(f"✓ Índice de búsqueda: {len(filas)} licitaciones nuevas o modificadas")
+    return len(filas)
+
+
+def construir_consulta(texto: str) -> Optional[str]:
+    """
+    Traduce el texto del usuario a una expresión FTS5
+
+    Las palabras se combinan con AND y se buscan por prefijo; el texto entre
+    comillas dobles se busca como frase exacta. None si no queda ningún término.
+    """
+    partes = []
+    for frase, palabra in re.findall(r'"([^"]+)"|(\w+)', texto.lower()):
+        if frase:
+            terminos = re.findall(r"\w+", frase)
+            if terminos:
+                partes.append('"' + " ".join(terminos) + '"')
+        elif palabra not in PALABRAS_VACIAS:
+            partes.append(f'"{palabra}"*' if len(palabra) >= LONGITUD_MINIMA_PREFIJO else f'"{palabra}"')
+    return " ".join(partes) or None
+
+
+def buscar(texto: str, fecha_desde: Optional[str] = None, fecha_hasta: Optional[str] = None,
+           limite: int = 50, desplazamiento: int = 0) -> Dict:
+    """
+    Busca licitaciones por texto ordenadas por relevancia (BM25)
+
+    Args:
+        texto: Palabras a buscar (entre comillas para frases exactas)
+        fecha_desde / fecha_hasta: Filtro por fecha de la licitación (DD-MM-YYYY)
+
+    Returns:
+        dict con total de coincidencias y la página de resultados, cada uno con
+        su puntuación y un fragmento de la descripción con los términos marcados
+    """
+    expresion = construir_consulta(texto)
+    if expresion is None:
+        raise ValueError("La búsqueda no contiene ningún término")
+
+    condiciones, parametros = ["licitaciones_fts MATCH ?"], [expresion]
+    for fecha, operador in ((fecha_desde, ">="), (fecha_hasta, "<=")):
+        if fecha:
+            iso = _fecha_iso(fecha)
+            if iso is None:
+                raise ValueError(f"Fecha inválida: {fecha}. Use DD-MM-YYYY")
+            condiciones.append(f"l.fecha_iso {operador} ?")
+            parametros.append(iso)
+    where = " AND ".join(condiciones)
+
+    with _conectar() as conexion:
+        total = conexion.execute(
+            f"SELECT COUNT(*) FROM licitaciones_fts JOIN licitaciones l ON l.id = licitaciones_fts.rowid WHERE {where}",
+            parametros,
+        ).fetchone()[0]
+        filas = conexion.execute(
+            f"""
+            SELECT l.expediente, l.descripcion, l.tipo, l.subtipo, l.estado, l.importe, l.fecha, l.organismo,
+                   l.enlace, bm25(licitaciones_fts, ?, ?, ?) AS puntuacion,
+                   snippet(licitaciones_fts, 1, '<b>', '</b>', '…', 16) AS fragmento
+            FROM licitaciones_fts JOIN licitaciones l ON l.id = licitaciones_fts.rowid
+            WHERE {where}
+            ORDER BY puntuacion
+            LIMIT ? OFFSET ?
+            """,
+            [*PESOS_COLUMNAS, *parametros, limite, desplazamiento],
+        ).fetchall()
+
+    resultados = []
+    for fila in filas:
+        resultado = dict(fila)
+        # bm25() devuelve valores negativos: más negativo = más relevante
+        resultado["puntuacion"] = round(-resultado["puntuacion"], 3)
+        resultados.append(resultado)
+    return {"consulta": expresion, "total": total, "resultados": resultados}
+
+
+def estadisticas() -> Dict:
+    with _conectar() as conexion:
+        fila = conexion.execute(
+            "SELECT COUNT(*) AS licitaciones, MIN(fecha_iso) AS desde, MAX(fecha_iso) AS hasta FROM licitaciones"
+        ).fetchone()
+    return dict(fila)
+
+
+def reindexar() -> int:
+    """Indexa todos los resultados registrados en el almacén (p. ej. tras crear el índice)"""
+    import almacen
+    total = 0
+    for meta in almacen.consultas_almacenadas():
+        try:
+            total += indexar(almacen.cargar_resultado(meta)["licitaciones"])
+        except almacen.ResultadoNoDisponible:
+            continue
+    return total
+
+
+def main():
+    """Reindexa el almacén o busca desde línea de comandos"""
+    import argparse
+    parser = argparse.ArgumentParser(description="Índice de búsqueda de licitaciones")
+    parser.add_argument("texto", nargs="?", help="Texto a buscar")
+    parser.add_argument("--reindexar", action="store_true", help="Indexa todos los resultados del almacén")
+    parser.add_argument("--limite", type=int, default=10)
+    args = parser.parse_args()
+
+    if args.reindexar:
+        logger.info(f"✓ Reindexado: {reindexar()} licitaciones nuevas o modificadas")
+    if args.texto:
+        print(json.dumps(buscar(args.texto, limite=args.limite), ensure_ascii=False, indent=2))
+    elif not args.reindexar:
+        print(json.dumps(estadisticas(), ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
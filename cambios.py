@@ -0,0 +1,64 @@
+"""
+Detección de cambios entre ejecuciones
+Cada licitación se resume en un hash estable indexado por expediente+organismo;
+comparando el índice de la ejecución anterior con las filas nuevas se obtienen
+en tiempo lineal las licitaciones nuevas, modificadas y eliminadas
+"""
+
+import hashlib
+import json
+from typing import Dict, List, Tuple
+
+from checkpoint import clave_licitacion
+
+# Campos cuyo valor anterior se guarda en el índice para detallar las modificaciones
+CAMPOS_SEGUIDOS = ("estado", "importe")
+
+
+def hash_licitacion(licitacion: Dict) -> str:
+    """Hash estable del contenido de una licitación (independiente del orden de las claves)"""
+    canonico = json.dumps(licitacion, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(canonico.encode("utf-8")).hexdigest()[:32]
+
+
+def indexar(licitaciones: List[Dict]) -> Dict[str, Tuple]:
+    """Índice compacto de una ejecución: clave -> (hash, estado, importe)"""
+    return {
+        clave_licitacion(licitacion): (hash_licitacion(licitacion),) + tuple(licitacion.get(c) for c in CAMPOS_SEGUIDOS)
+        for licitacion in licitaciones
+    }
+
+
+def calcular_delta(indice_anterior: Dict[str, Tuple], licitaciones: List[Dict]) -> Dict[str, List[Dict]]:
+    """
+    Compara las filas de una ejecución con el índice de la anterior
+
+    Returns:
+        dict con 'nuevas' y 'modificadas' (licitaciones completas; las modificadas
+        con el detalle de los campos seguidos que cambian) y 'eliminadas'
+        (expediente, organismo y últimos valores conocidos)
+    """
+    nuevas, modificadas = [], []
+    vistas = set()
+    for licitacion in licitaciones:
+        clave = clave_licitacion(licitacion)
+        vistas.add(clave)
+        anterior = indice_anterior.get(clave)
+        if anterior is None:
+            nuevas.append(licitacion)
+        elif anterior[0] != hash_licitacion(licitacion):
+            campos = {}
+            for campo, valor_anterior in zip(CAMPOS_SEGUIDOS, anterior[1:]):
+                if licitacion.get(campo) != valor_anterior:
+                    campos[campo] = {"antes": valor_anterior, "despues": licitacion.get(campo)}
+            modificadas.append({"licitacion": licitacion, "campos": campos})
+
+    eliminadas = []
+    for clave, anterior in indice_anterior.items():
+        if clave not in vistas:
+            expediente, _, organismo = clave.partition("|")
+            eliminada = {"expediente": expediente, "organismo": organismo}
+            eliminada.update(zip(CAMPOS_SEGUIDOS, anterior[1:]))
+            eliminadas.append(eliminada)
+
+    return {"nuevas": nuevas, "modificadas": modificadas, "eliminadas": eliminadas}
@@ -0,0 +1,78 @@
+"""
+Normalización de campos de licitaciones
+Interpreta los textos que muestra el portal (importes con formato español,
+fechas DD/MM/YYYY), compone una licitación a partir de las celdas de una fila
+de resultados y pliega mayúsculas y tildes para comparar textos
+"""
+
+import re
+import unicodedata
+from datetime import date, datetime
+from typing import Dict, List, Optional
+
+
+def parsear_importe(texto: Optional[str]) -> Optional[float]:
+    """'1.234.567,89 EUR' -> 1234567.89 (None si no hay importe)"""
+    if not texto:
+        return None
+    numero = re.sub(r"[^\d,.\-]", "", texto)
+    if not numero:
+        return None
+    # Formato español: punto de miles y coma decimal
+    numero = numero.replace(".", "").replace(",", ".")
+    try:
+        return float(numero)
+    except ValueError:
+        return None
+
+
+def parsear_fecha(texto: Optional[str]) -> Optional[date]:
+    """'05/01/2026' o '05-01-2026' (con o sin hora) -> date (None si no se reconoce)"""
+    if not texto:
+        return None
+    texto = texto.strip()[:10]
+    for formato in ("%d/%m/%Y", "%d-%m-%Y", "%Y-%m-%d"):
+        try:
+            return datetime.strptime(texto, formato).date()
+        except ValueError:
+            continue
+    return None
+
+
+def licitacion_desde_celdas(textos: List[str], enlace: Optional[str]) -> Optional[Dict]:
+    """
+    Licitación a partir del texto de las 6 celdas de una fila de resultados
+
+    La primera celda trae expediente y descripción, y la segunda tipo y
+    subtipo, separados por un salto de línea. None si la fila no es una
+    licitación (p. ej. la fila del paginador).
+    """
+    expediente_celda, tipo_contrato, estado, importe, fecha, organismo = (texto.strip() for texto in textos)
+    expediente, _, descripcion = expediente_celda.partition("\n")
+    if not expediente or expediente.startswith("Página"):
+        return None
+    tipo, _, subtipo = tipo_contrato.partition("\n")
+    return {
+        'expediente': expediente,
+        'descripcion': descripcion,
+        'tipo': tipo,
+        'subtipo': subtipo,
+        'estado': estado,
+        'importe': importe,
+        'fecha': fecha,
+        'organismo': organismo,
+        'enlace': enlace or ""
+    }
+
+
+def plegar(texto: Optional[str]) -> str:
+    """Minúsculas y sin tildes: 'Cádiz' -> 'cadiz'"""
+    if not texto:
+        return ""
+    descompuesto = unicodedata.normalize("NFKD", texto.lower())
+    return "".join(c for c in descompuesto if not unicodedata.combining(c))
+
+
+def palabras(texto: Optional[str]) -> set:
+    """Conjunto de palabras plegadas de un texto"""
+    return set(re.findall(r"\w+", plegar(texto)))
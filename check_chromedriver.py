@@ -5,7 +5,6 @@ Script para verificar la instalación de Chrome y ChromeDriver
 import subprocess
 import sys
 import os
-from pathlib import Path
 
 
 def check_chrome():
@@ -14,31 +13,28 @@ def check_chrome():
     print("VERIFICANDO GOOGLE CHROME")
     print("="*80)
     
-    chrome_paths = [
-        r"C:\Program Files\Google\Chrome\Application\chrome.exe",
-        r"C:\Program Files (x86)\Google\Chrome\Application\chrome.exe",
-        os.path.expandvars(r"%LOCALAPPDATA%\Google\Chrome\Application\chrome.exe"),
-    ]
-    
-    for path in chrome_paths:
-        if os.path.exists(path):
-            print(f"✓ Chrome encontrado: {path}")
-            try:
-                # Intentar obtener la versión
-                result = subprocess.run(
-                    [path, "--version"],
-                    capture_output=True,
-                    text=True,
-                    timeout=5
-                )
-                if result.stdout:
-                    print(f"  Versión: {result.stdout.strip()}")
-            except:
-                pass
-            return True
+    from navegador import buscar_chrome
+    
+    path = buscar_chrome()
+    if path:
+        print(f"✓ Chrome encontrado: {path}")
+        try:
+            # Intentar obtener la versión
+            result = subprocess.run(
+                [path, "--version"],
+                capture_output=True,
+                text=True,
+                timeout=5
+            )
+            if result.stdout:
+                print(f"  Versión: {result.stdout.strip()}")
+        except:
+            pass
+        return True
     
     print("✗ Chrome NO encontrado")
     print("\nDescarga Chrome desde: https://www.google.com/chrome/")
+    print("O indica su ruta con la variable de entorno CHROME_BINARY")
     return False
 
 
@@ -73,25 +69,36 @@ def check_webdriver_manager_cache():
     print("VERIFICANDO CACHÉ DE WEBDRIVER-MANAGER")
     print("="*80)
     
-    cache_paths = [
-        Path.home() / ".wdm" / "drivers" / "chromedriver",
-        Path(os.path.expandvars(r"%USERPROFILE%\.wdm\drivers\chromedriver")),
-    ]
+    from navegador import directorios_cache_wdm, buscar_driver_en_cache
     
-    found = False
-    for cache_path in cache_paths:
-        if cache_path.exists():
+    for cache_path in directorios_cache_wdm():
+        if os.path.isdir(cache_path):
             print(f"✓ Caché encontrado: {cache_path}")
-            # Listar versiones en caché
-            for version_dir in cache_path.iterdir():
-                if version_dir.is_dir():
-                    print(f"  - Versión: {version_dir.name}")
-                    found = True
     
-    if not found:
-        print("✗ No se encontró caché de webdriver-manager")
+    driver = buscar_driver_en_cache()
+    if driver:
+        print(f"  - ChromeDriver: {driver}")
+        return True
     
-    return found
+    print("✗ No se encontró caché de webdriver-manager")
+    return False
+
+
+def check_resolucion():
+    """Muestra el navegador que usará el scraper (resolución única por proceso)"""
+    print("\n" + "="*80)
+    print("RESOLUCIÓN DEL SCRAPER")
+    print("="*80)
+    
+    from navegador import resolver_navegador
+    
+    resolucion = resolver_navegador()
+    print(f"  Chrome: {resolucion['chrome']} ({resolucion['version_chrome']})")
+    print(f"  ChromeDriver: {resolucion['driver']} ({resolucion['version_driver']})")
+    print(f"  Origen del driver: {resolucion['origen_driver']}")
+    if resolucion["versiones_compatibles"] is False:
+        print("⚠ La versión mayor de ChromeDriver no coincide con la de Chrome")
+    return resolucion["driver"] is not None
 
 
 def test_selenium():
@@ -111,29 +118,22 @@ def test_selenium():
         chrome_options.add_argument('--no-sandbox')
         chrome_options.add_argument('--disable-dev-shm-usage')
         
-        # Intentar sin service primero
+        # Usar la misma resolución que el scraper (variable de entorno, PATH, caché, descarga)
         try:
-            driver = webdriver.Chrome(options=chrome_options)
-            print("✓ Selenium funciona con ChromeDriver del sistema")
+            from selenium.webdriver.chrome.service import Service
+            from navegador import resolver_navegador
+            
+            resolucion = resolver_navegador()
+            if resolucion["chrome"]:
+                chrome_options.binary_location = resolucion["chrome"]
+            service = Service(resolucion["driver"]) if resolucion["driver"] else Service()
+            driver = webdriver.Chrome(service=service, options=chrome_options)
+            print(f"✓ Selenium funciona con ChromeDriver ({resolucion['origen_driver'] or 'Selenium Manager'})")
             driver.quit()
             return True
         except Exception as e:
-            print(f"✗ No se pudo usar ChromeDriver del sistema: {str(e)[:100]}")
-            
-            # Intentar con webdriver-manager
-            print("\nIntentando con webdriver-manager...")
-            try:
-                from selenium.webdriver.chrome.service import Service
-                from webdriver_manager.chrome import ChromeDriverManager
-                
-                service = Service(ChromeDriverManager().install())
-                driver = webdriver.Chrome(service=service, options=chrome_options)
-                print("✓ Selenium funciona con webdriver-manager")
-                driver.quit()
-                return True
-            except Exception as e2:
-                print(f"✗ Error con webdriver-manager: {str(e2)[:100]}")
-                return False
+            print(f"✗ No se pudo iniciar Chrome: {str(e)[:100]}")
+            return False
                 
     except ImportError:
         print("✗ Selenium no está instalado")
@@ -154,8 +154,8 @@ Si ChromeDriver no funciona, tienes 3 opciones:
 
 OPCIÓN 1: Instalar ChromeDriver manualmente
   1. Descarga ChromeDriver de: https://chromedriver.chromium.org/downloads
-  2. Descomprime el archivo chromedriver.exe
-  3. Muévelo a una carpeta en tu PATH o agrega su ubicación al PATH
+  2. Descomprime el archivo (chromedriver.exe en Windows, chromedriver en Linux)
+  3. Muévelo a una carpeta en tu PATH o indica su ruta en CHROMEDRIVER_PATH
   
 OPCIÓN 2: Usar webdriver-manager con conexión a internet
   - El script automáticamente descargará ChromeDriver si hay conexión
@@ -163,7 +163,7 @@ OPCIÓN 2: Usar webdriver-manager con conexión a internet
 OPCIÓN 3: Copiar ChromeDriver al proyecto
   1. Descarga ChromeDriver
   2. Cópialo a la carpeta del proyecto
-  3. Modifica scraper_selenium.py para usar la ruta local
+  3. Define CHROMEDRIVER_PATH=/ruta/al/chromedriver en el archivo .env
 
 NOTA: La versión de ChromeDriver debe coincidir con tu versión de Chrome
 """)
@@ -178,6 +178,7 @@ def main():
         "chrome": check_chrome(),
         "chromedriver": check_chromedriver_in_path(),
         "cache": check_webdriver_manager_cache(),
+        "resolucion": check_resolucion(),
         "selenium": test_selenium()
     }
     
@@ -0,0 +1,86 @@
+"""
+Checkpoints de paginación
+Guarda en la carpeta de la ejecución el progreso página a página (consulta,
+última página completada, filas acumuladas y clave de la última fila) para
+poder reanudar una ejecución interrumpida sin repetir el trabajo hecho
+"""
+
+import json
+import os
+from datetime import datetime
+from typing import Dict, List, Optional
+
+ARCHIVO_CHECKPOINT = "checkpoint.json"
+ARCHIVO_FILAS = "licitaciones_parciales.jsonl"
+
+
+def clave_licitacion(licitacion: Dict) -> str:
+    """Clave estable de una licitación: expediente + organismo"""
+    return f"{licitacion.get('expediente', '')}|{licitacion.get('organismo', '')}"
+
+
+class CheckpointPaginacion:
+    """Checkpoint de paginación de una ejecución (checkpoint.json + filas en JSON Lines)"""
+
+    def __init__(self, output_folder: str):
+        self.output_folder = output_folder
+        self.ruta = os.path.join(output_folder, ARCHIVO_CHECKPOINT)
+        self.ruta_filas = os.path.join(output_folder, ARCHIVO_FILAS)
+
+    def cargar(self) -> Optional[Dict]:
+        """Devuelve el último checkpoint guardado o None si no existe"""
+        if not os.path.exists(self.ruta):
+            return None
+        with open(self.ruta, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def filas(self, total: int) -> List[Dict]:
+        """
+        Lee las filas acumuladas hasta el checkpoint
+
+        Las filas escritas después del último checkpoint (página a medio
+        procesar) se descartan y el archivo se trunca para seguir añadiendo.
+        """
+        licitaciones = []
+        if os.path.exists(self.ruta_filas):
+            with open(self.ruta_filas, "r", encoding="utf-8") as f:
+                for linea in f:
+                    if len(licitaciones) >= total:
+                        break
+                    if linea.strip():
+                        licitaciones.append(json.loads(linea))
+
+        with open(self.ruta_filas, "w", encoding="utf-8") as f:
+            for licitacion in licitaciones:
+                f.write(json.dumps(licitacion, ensure_ascii=False) + "\n")
+        return licitaciones
+
+    def registrar_pagina(self, consulta: Dict, pagina: int, licitaciones_pagina: List[Dict], total: int,
+                         ultima_clave: Optional[str]) -> None:
+        """Añade las filas de una página completada y actualiza el checkpoint de forma atómica"""
+        with open(self.ruta_filas, "a", encoding="utf-8") as f:
+            for licitacion in licitaciones_pagina:
+                f.write(json.dumps(licitacion, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+        self._escribir({
+            "consulta": consulta,
+            "pagina": pagina,
+            "filas": total,
+            "ultima_clave": ultima_clave,
+            "completo": False,
+            "actualizado": datetime.now().isoformat(),
+        })
+
+    def marcar_completo(self) -> None:
+        estado = self.cargar() or {}
+        estado["completo"] = True
+        estado["actualizado"] = datetime.now().isoformat()
+        self._escribir(estado)
+
+    def _escribir(self, estado: Dict) -> None:
+        temporal = self.ruta + ".tmp"
+        with open(temporal, "w", encoding="utf-8") as f:
+            json.dump(estado, f, ensure_ascii=False, indent=2)
+        os.replace(temporal, self.ruta)
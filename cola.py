@@ -0,0 +1,314 @@
+"""
+Cola de trabajos de scraping
+Cola duradera en SQLite compartida por la API (que solo encola y lee resultados)
+y los workers (worker.py). Cada consulta se encola como un lote de trabajos
+(uno por día si se particiona); los workers los reclaman con un lease que
+renuevan mientras trabajan y que, si el worker muere, caduca y devuelve el
+trabajo a la cola
+"""
+
+import json
+import os
+import sqlite3
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+import almacen
+from config import COLA_DB, COLA_LEASE_SECONDS, COLA_MAX_INTENTOS, RETRY_DELAY, RETRY_MAX_DELAY
+from logger import setup_logger
+
+logger = setup_logger(__name__)
+
+_ESQUEMA = """
+PRAGMA journal_mode = WAL;
+CREATE TABLE IF NOT EXISTS trabajos (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    lote TEXT NOT NULL,
+    consulta TEXT NOT NULL,
+    clave TEXT NOT NULL,
+    cpv_codes TEXT,
+    fecha_desde TEXT NOT NULL,
+    fecha_hasta TEXT NOT NULL,
+    estado TEXT NOT NULL,
+    intentos INTEGER NOT NULL DEFAULT 0,
+    worker TEXT,
+    lease_hasta REAL,
+    disponible_desde REAL NOT NULL,
+    creado REAL NOT NULL,
+    iniciado REAL,
+    terminado REAL,
+    total INTEGER,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS trabajos_estado ON trabajos (estado, disponible_desde);
+CREATE INDEX IF NOT EXISTS trabajos_lote ON trabajos (lote);
+CREATE TABLE IF NOT EXISTS workers (
+    worker TEXT PRIMARY KEY,
+    host TEXT NOT NULL,
+    pid INTEGER NOT NULL,
+    inicio REAL NOT NULL,
+    ultimo_latido REAL NOT NULL,
+    trabajo_actual INTEGER,
+    completados INTEGER NOT NULL DEFAULT 0,
+    fallidos INTEGER NOT NULL DEFAULT 0,
+    licitaciones INTEGER NOT NULL DEFAULT 0,
+    segundos_trabajando REAL NOT NULL DEFAULT 0
+)
+"""
+
+ACTIVOS = ("pendiente", "en_curso")
+
+
+@contextmanager
+def _conectar():
+    """Abre una conexión a la cola (una por operación) y confirma al salir"""
+    os.makedirs(os.path.dirname(COLA_DB) or ".", exist_ok=True)
+    conexion = sqlite3.connect(COLA_DB, timeout=30)
+    conexion.row_factory = sqlite3.Row
+    try:
+        with conexion:
+            conexion.executescript(_ESQUEMA)
+            yield conexion
+    finally:
+        conexion.close()
+
+
+def particiones_diarias(fecha_desde: Optional[str], fecha_hasta: Optional[str]) -> List[Tuple[str, str]]:
+    """Divide un rango de fechas (DD-MM-YYYY) en rangos de un día"""
+    desde, hasta = almacen.resolver_fechas(fecha_desde, fecha_hasta)
+    dia = datetime.strptime(desde, "%d-%m-%Y")
+    fin = datetime.strptime(hasta, "%d-%m-%Y")
+    dias = []
+    while dia <= fin:
+        dias.append((dia.strftime("%d-%m-%Y"), dia.strftime("%d-%m-%Y")))
+        dia += timedelta(days=1)
+    return dias
+
+
+def encolar(cpv_codes: Optional[List[str]], fecha_desde: Optional[str], fecha_hasta: Optional[str],
+            particionar: bool = False) -> Dict:
+    """
+    Encola una consulta como un lote de trabajos
+
+    Si la consulta ya tiene un lote pendiente o en curso se devuelve ese lote
+    en lugar de duplicarlo.
+
+    Args:
+        cpv_codes: Códigos CPV (None = sin filtro)
+        fecha_desde, fecha_hasta: Rango DD-MM-YYYY (por defecto ayer)
+        particionar: Un trabajo por día del rango en lugar de uno para todo el rango
+
+    Returns:
+        dict con el estado del lote (ver estado_lote)
+    """
+    cpv = almacen.normalizar_cpv(cpv_codes)
+    consulta = almacen.clave_consulta(cpv, fecha_desde, fecha_hasta)
+    with _conectar() as conexion:
+        conexion.execute("BEGIN IMMEDIATE")
+        activo = conexion.execute(
+            f"SELECT lote FROM trabajos WHERE consulta = ? AND estado IN ({','.join('?' * len(ACTIVOS))}) "
+            "ORDER BY id DESC LIMIT 1",
+            (consulta, *ACTIVOS),
+        ).fetchone()
+        if activo is not None:
+            lote = activo["lote"]
+        else:
+            lote = uuid.uuid4().hex[:12]
+            ahora = time.time()
+            rangos = particiones_diarias(fecha_desde, fecha_hasta) if particionar else [
+                almacen.resolver_fechas(fecha_desde, fecha_hasta)]
+            conexion.executemany(
+                """
+                INSERT INTO trabajos (lote, consulta, clave, cpv_codes, fecha_desde, fecha_hasta, estado,
+                                      disponible_desde, creado)
+                VALUES (?, ?, ?, ?, ?, ?, 'pendiente', ?, ?)
+                """,
+                [
+                    (lote, consulta, almacen.clave_consulta(cpv, desde, hasta), json.dumps(cpv) if cpv else None,
+                     desde, hasta, ahora, ahora)
+                    for desde, hasta in rangos
+                ],
+            )
+            logger.info(f"✓ Encolado lote {lote}: {consulta} ({len(rangos)} trabajo(s))")
+    return estado_lote(lote)
+
+
+def _liberar_caducados(conexion: sqlite3.Connection, ahora: float) -> None:
+    """Devuelve a la cola los trabajos cuyo lease caducó (worker muerto o colgado)"""
+    caducados = conexion.execute(
+        "SELECT id, worker, intentos FROM trabajos WHERE estado = 'en_curso' AND lease_hasta < ?", (ahora,)
+    ).fetchall()
+    for trabajo in caducados:
+        logger.warning(f"⚠ Lease caducado del trabajo {trabajo['id']} (worker {trabajo['worker']})")
+        _reprogramar(conexion, trabajo["id"], trabajo["intentos"] + 1, "Lease caducado", ahora, espera=0)
+
+
+def _reprogramar(conexion: sqlite3.Connection, trabajo_id: int, intentos: int, error: str, ahora: float,
+                 espera: Optional[float] = None) -> None:
+    if intentos >= COLA_MAX_INTENTOS:
+        conexion.execute(
+            "UPDATE trabajos SET estado = 'error', intentos = ?, worker = NULL, lease_hasta = NULL, "
+            "terminado = ?, error = ? WHERE id = ?",
+            (intentos, ahora, error, trabajo_id),
+        )
+        logger.error(f"✗ Trabajo {trabajo_id} descartado tras {intentos} intento(s): {error}")
+        return
+    if espera is None:
+        espera = min(RETRY_MAX_DELAY, RETRY_DELAY * (2 ** intentos))
+    conexion.execute(
+        "UPDATE trabajos SET estado = 'pendiente', intentos = ?, worker = NULL, lease_hasta = NULL, "
+        "disponible_desde = ?, error = ? WHERE id = ?",
+        (intentos, ahora + espera, error, trabajo_id),
+    )
+
+
+def reclamar(worker: str) -> Optional[Dict]:
+    """Reclama el siguiente trabajo disponible con un lease de COLA_LEASE_SECONDS (None si no hay)"""
+    ahora = time.time()
+    with _conectar() as conexion:
+        conexion.execute("BEGIN IMMEDIATE")
+        _liberar_caducados(conexion, ahora)
+        fila = conexion.execute(
+            "SELECT * FROM trabajos WHERE estado = 'pendiente' AND disponible_desde <= ? ORDER BY id LIMIT 1",
+            (ahora,),
+        ).fetchone()
+        if fila is None:
+            return None
+        conexion.execute(
+            "UPDATE trabajos SET estado = 'en_curso', worker = ?, lease_hasta = ?, iniciado = ? WHERE id = ?",
+            (worker, ahora + COLA_LEASE_SECONDS, ahora, fila["id"]),
+        )
+    trabajo = dict(fila)
+    trabajo["cpv_codes"] = json.loads(trabajo["cpv_codes"]) if trabajo["cpv_codes"] else None
+    return trabajo
+
+
+def renovar(trabajo_id: int, worker: str) -> bool:
+    """Renueva el lease; False si el trabajo ya no pertenece al worker (caducó y se reasignó)"""
+    with _conectar() as conexion:
+        cursor = conexion.execute(
+            "UPDATE trabajos SET lease_hasta = ? WHERE id = ? AND worker = ? AND estado = 'en_curso'",
+            (time.time() + COLA_LEASE_SECONDS, trabajo_id, worker),
+        )
+        return cursor.rowcount == 1
+
+
+def completar(trabajo_id: int, worker: str, total: int) -> None:
+    with _conectar() as conexion:
+        conexion.execute(
+            "UPDATE trabajos SET estado = 'completado', lease_hasta = NULL, terminado = ?, total = ?, error = NULL "
+            "WHERE id = ? AND worker = ?",
+            (time.time(), total, trabajo_id, worker),
+        )
+
+
+def fallar(trabajo_id: int, worker: str, error: str, espera: Optional[float] = None) -> None:
+    """Devuelve el trabajo a la cola con backoff (o lo marca como error si agotó los intentos)"""
+    with _conectar() as conexion:
+        fila = conexion.execute(
+            "SELECT intentos FROM trabajos WHERE id = ? AND worker = ? AND estado = 'en_curso'", (trabajo_id, worker)
+        ).fetchone()
+        if fila is not None:
+            _reprogramar(conexion, trabajo_id, fila["intentos"] + 1, error, time.time(), espera)
+
+
+def estado_lote(lote: str) -> Optional[Dict]:
+    """Estado agregado de un lote: pendiente, en_curso, completado o error"""
+    with _conectar() as conexion:
+        filas = conexion.execute("SELECT * FROM trabajos WHERE lote = ? ORDER BY id", (lote,)).fetchall()
+    if not filas:
+        return None
+
+    estados = [fila["estado"] for fila in filas]
+    if "error" in estados:
+        estado = "error"
+    elif all(e == "completado" for e in estados):
+        estado = "completado"
+    elif "en_curso" in estados or "completado" in estados:
+        estado = "en_curso"
+    else:
+        estado = "pendiente"
+
+    return {
+        "lote": lote,
+        "consulta": filas[0]["consulta"],
+        "cpv_codes": json.loads(filas[0]["cpv_codes"]) if filas[0]["cpv_codes"] else None,
+        "fecha_desde": filas[0]["fecha_desde"],
+        "fecha_hasta": filas[-1]["fecha_hasta"],
+        "estado": estado,
+        "trabajos": [
+            {
+                "id": fila["id"],
+                "clave": fila["clave"],
+                "estado": fila["estado"],
+                "intentos": fila["intentos"],
+                "worker": fila["worker"],
+                "total": fila["total"],
+                "error": fila["error"],
+            }
+            for fila in filas
+        ],
+    }
+
+
+def registrar_worker(worker: str) -> None:
+    ahora = time.time()
+    with _conectar() as conexion:
+        conexion.execute(
+            "INSERT OR REPLACE INTO workers (worker, host, pid, inicio, ultimo_latido) VALUES (?, ?, ?, ?, ?)",
+            (worker, os.uname().nodename if hasattr(os, "uname") else os.getenv("COMPUTERNAME", ""),
+             os.getpid(), ahora, ahora),
+        )
+
+
+def latido_worker(worker: str, trabajo_actual: Optional[int] = None) -> None:
+    with _conectar() as conexion:
+        conexion.execute(
+            "UPDATE workers SET ultimo_latido = ?, trabajo_actual = ? WHERE worker = ?",
+            (time.time(), trabajo_actual, worker),
+        )
+
+
+def contabilizar_trabajo(worker: str, ok: bool, licitaciones: int, segundos: float) -> None:
+    with _conectar() as conexion:
+        conexion.execute(
+            """
+            UPDATE workers SET completados = completados + ?, fallidos = fallidos + ?,
+                licitaciones = licitaciones + ?, segundos_trabajando = segundos_trabajando + ?,
+                trabajo_actual = NULL, ultimo_latido = ?
+            WHERE worker = ?
+            """,
+            (1 if ok else 0, 0 if ok else 1, licitaciones, segundos, time.time(), worker),
+        )
+
+
+def estadisticas() -> Dict:
+    """Trabajos por estado y rendimiento de cada worker (activo si ha dado señales en el último lease)"""
+    ahora = time.time()
+    with _conectar() as conexion:
+        por_estado = {
+            fila["estado"]: fila["n"]
+            for fila in conexion.execute("SELECT estado, COUNT(*) AS n FROM trabajos GROUP BY estado")
+        }
+        filas = conexion.execute("SELECT * FROM workers ORDER BY inicio").fetchall()
+
+    workers = []
+    for fila in filas:
+        vida_horas = max(ahora - fila["inicio"], 1) / 3600
+        workers.append({
+            "worker": fila["worker"],
+            "host": fila["host"],
+            "pid": fila["pid"],
+            "activo": ahora - fila["ultimo_latido"] < COLA_LEASE_SECONDS,
+            "trabajo_actual": fila["trabajo_actual"],
+            "completados": fila["completados"],
+            "fallidos": fila["fallidos"],
+            "licitaciones": fila["licitaciones"],
+            "trabajos_por_hora": round(fila["completados"] / vida_horas, 2),
+            "licitaciones_por_minuto": round(fila["licitaciones"] / max(fila["segundos_trabajando"], 1) * 60, 2),
+            "ocupacion": round(fila["segundos_trabajando"] / max(ahora - fila["inicio"], 1), 3),
+        })
+    return {"trabajos": por_estado, "workers": workers}
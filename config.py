@@ -2,11 +2,12 @@ import os
 from datetime import datetime
 from dotenv import load_dotenv
 
-# Cargar variables de entorno
+# Cargar variables de entorno (antes de leer las constantes de configuración)
 load_dotenv()
 
 # Configuración de seguridad
 API_KEY = os.getenv("API_KEY", "tu_clave_super_secreta_cambiar_en_produccion")
+PERFILADO_PERMITIDO = os.getenv("PERFILADO_PERMITIDO", "false").lower() == "true"  # /licitaciones?perfilar=true
 
 # Configuración base
 BASE_URL = "https://contrataciondelestado.es"
@@ -14,14 +15,94 @@ PLATAFORMA_URL = "https://contrataciondelestado.es/wps/portal/plataforma"
 OUTPUT_DIR = os.path.join(os.path.dirname(__file__), "datos_licitaciones")
 LOG_DIR = os.path.join(os.path.dirname(__file__), "logs")
 
-# Crear directorios si no existen
-os.makedirs(OUTPUT_DIR, exist_ok=True)
-os.makedirs(LOG_DIR, exist_ok=True)
+
+def preparar_directorios():
+    """Crea los directorios de datos y logs (se llama al arrancar, no al importar)"""
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
+    os.makedirs(LOG_DIR, exist_ok=True)
 
 # Configuración de scraping
 TIMEOUT = 30
-RETRY_ATTEMPTS = 3
-RETRY_DELAY = 5
+RETRY_ATTEMPTS = int(os.getenv("RETRY_ATTEMPTS", "3"))
+RETRY_DELAY = float(os.getenv("RETRY_DELAY", "5"))  # Espera base (segundos) antes del primer reintento
+RETRY_BACKOFF = 2  # Factor de crecimiento exponencial de la espera
+RETRY_MAX_DELAY = 60
+
+# Circuit breaker del portal: fallos consecutivos para abrir y segundos hasta la prueba
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "3"))
+CIRCUIT_RESET_SECONDS = int(os.getenv("CIRCUIT_RESET_SECONDS", "300"))
+
+# Almacén de resultados (SQLite) para servir consultas repetidas sin volver al portal
+ALMACEN_DB = os.getenv("ALMACEN_DB", os.path.join(OUTPUT_DIR, "almacen.sqlite3"))
+BUSQUEDA_DB = os.getenv("BUSQUEDA_DB", os.path.join(OUTPUT_DIR, "busqueda.sqlite3"))  # Índice de texto completo
+
+# Suscripciones y avisos por webhook
+SUSCRIPCIONES_DB = os.getenv("SUSCRIPCIONES_DB", os.path.join(OUTPUT_DIR, "suscripciones.sqlite3"))
+WEBHOOK_LOTE = int(os.getenv("WEBHOOK_LOTE", "50"))  # Licitaciones por POST
+WEBHOOK_INTERVALO = int(os.getenv("WEBHOOK_INTERVALO", "10"))  # Segundos entre rondas de entrega
+WEBHOOK_MAX_INTENTOS = int(os.getenv("WEBHOOK_MAX_INTENTOS", "5"))
+WEBHOOK_TIMEOUT = int(os.getenv("WEBHOOK_TIMEOUT", "10"))
+CACHE_TTL_SECONDS = int(os.getenv("CACHE_TTL_SECONDS", "900"))  # Edad máxima de un resultado reutilizable
+PLANIFICADOR_MAX_EDAD = int(os.getenv("PLANIFICADOR_MAX_EDAD", str(CACHE_TTL_SECONDS)))  # Edad máxima de los días reutilizados
+CAMBIOS_RETENCION_DIAS = int(os.getenv("CAMBIOS_RETENCION_DIAS", "30"))  # Historial de cambios entre ejecuciones
+
+# Cola de trabajos y workers (worker.py): "inline" ejecuta el scraping en la API, "cola" solo encola
+SCRAPING_MODO = os.getenv("SCRAPING_MODO", "inline")
+# Backend del navegador en la API: "selenium" (un Chrome por extracción) o "playwright" (un Chromium, un contexto por extracción)
+SCRAPER_BACKEND = os.getenv("SCRAPER_BACKEND", "selenium")
+COLA_DB = os.getenv("COLA_DB", os.path.join(OUTPUT_DIR, "cola.sqlite3"))
+COLA_LEASE_SECONDS = int(os.getenv("COLA_LEASE_SECONDS", "300"))  # Un worker sin renovar el lease se da por muerto
+COLA_MAX_INTENTOS = int(os.getenv("COLA_MAX_INTENTOS", "3"))
+COLA_PARTICIONAR_DIAS = os.getenv("COLA_PARTICIONAR_DIAS", "true").lower() == "true"  # Un trabajo por día del rango
+
+# Backfill histórico (backfill.py): dataset particionado por día y navegadores en paralelo
+BACKFILL_DIR = os.getenv("BACKFILL_DIR", os.path.join(OUTPUT_DIR, "historico"))
+BACKFILL_PARALELO = int(os.getenv("BACKFILL_PARALELO", "2"))
+
+# Exportación a Parquet (exportacion.py, requiere pyarrow): dataset particionado por fecha de publicación
+PARQUET_DIR = os.getenv("PARQUET_DIR", os.path.join(OUTPUT_DIR, "parquet"))
+PARQUET_EXPORTAR = os.getenv("PARQUET_EXPORTAR", "false").lower() == "true"  # Exportar cada extracción completa
+
+# Instantáneas estáticas (instantaneas.py): resultados de días terminados como JSON precomprimido
+INSTANTANEAS_DIR = os.getenv("INSTANTANEAS_DIR", os.path.join(OUTPUT_DIR, "instantaneas"))
+INSTANTANEAS_ENABLED = os.getenv("INSTANTANEAS_ENABLED", "true").lower() == "true"
+INSTANTANEAS_MAX_AGE = int(os.getenv("INSTANTANEAS_MAX_AGE", "300"))  # Cache-Control max-age (s)
+
+# Cortesía con el portal: ritmo de acciones (navegación, envíos, avances de página) y sesiones concurrentes
+PORTAL_RPS = float(os.getenv("PORTAL_RPS", "0.5"))  # Acciones por segundo (0 = sin límite)
+PORTAL_RAFAGA = int(os.getenv("PORTAL_RAFAGA", "3"))
+PORTAL_RATE_COMPARTIDO = os.getenv("PORTAL_RATE_COMPARTIDO", "false").lower() == "true"  # Límite entre procesos
+CORTESIA_DB = os.getenv("CORTESIA_DB", os.path.join(OUTPUT_DIR, "cortesia.sqlite3"))
+CONCURRENCIA_MIN = int(os.getenv("CONCURRENCIA_MIN", "1"))
+CONCURRENCIA_MAX = int(os.getenv("CONCURRENCIA_MAX", "4"))
+CONCURRENCIA_INICIAL = int(os.getenv("CONCURRENCIA_INICIAL", "2"))
+LATENCIA_OBJETIVO_MS = float(os.getenv("LATENCIA_OBJETIVO_MS", "1500"))  # Latencia del portal (TTFB) objetivo
+
+# Navegador: rutas explícitas (opcionales) para no depender de descargas en tiempo de ejecución
+CHROMEDRIVER_PATH = os.getenv("CHROMEDRIVER_PATH")
+CHROME_BINARY = os.getenv("CHROME_BINARY")
+WDM_CACHE_DIR = os.getenv("WDM_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".wdm"))
+
+# Perfil del navegador: "ligero" bloquea imágenes, fuentes, multimedia y analítica; "normal" no bloquea nada
+BROWSER_PERFIL = os.getenv("BROWSER_PERFIL", "ligero")
+BROWSER_BLOCKED_URLS = [p.strip() for p in os.getenv("BROWSER_BLOCKED_URLS", "").split(",") if p.strip()]
+BROWSER_PAGE_LOAD_STRATEGY = os.getenv("BROWSER_PAGE_LOAD_STRATEGY", "eager")  # normal | eager
+BROWSER_METRICAS = os.getenv("BROWSER_METRICAS", "true").lower() == "true"  # Métricas de red por ejecución
+
+# Memoria del navegador: reciclar la sesión al superar este RSS (MB) o este número de páginas (0 = sin límite)
+BROWSER_RSS_MAX_MB = int(os.getenv("BROWSER_RSS_MAX_MB", "1500"))
+BROWSER_RECICLAR_PAGINAS = int(os.getenv("BROWSER_RECICLAR_PAGINAS", "0"))
+
+# Caché de disco persistente del navegador (desactivada si BROWSER_CACHE_DIR está vacío)
+BROWSER_CACHE_DIR = os.getenv("BROWSER_CACHE_DIR", "")
+BROWSER_CACHE_SLOTS = int(os.getenv("BROWSER_CACHE_SLOTS", "4"))  # Perfiles concurrentes (uno por navegador)
+BROWSER_CACHE_MAX_MB = int(os.getenv("BROWSER_CACHE_MAX_MB", "200"))
+BROWSER_CACHE_RESET_HORAS = int(os.getenv("BROWSER_CACHE_RESET_HORAS", "168"))  # Reinicio periódico del perfil
+
+# Configuración de respuestas de la API
+COMPRESSION_MIN_BYTES = int(os.getenv("COMPRESSION_MIN_BYTES", "1024"))  # No comprimir cuerpos más pequeños
+COMPRESSION_GZIP_LEVEL = int(os.getenv("COMPRESSION_GZIP_LEVEL", "6"))
+COMPRESSION_BROTLI_QUALITY = int(os.getenv("COMPRESSION_BROTLI_QUALITY", "5"))
 
 # Rutas de archivo
 def get_output_file(date=None):
@@ -39,4 +120,9 @@ def get_log_file(date=None):
     return os.path.join(LOG_DIR, filename)
 
 # Configuración de horarios
-SCRAP_TIME = "09:00"  # Hora diaria para ejecutar el scraping
+SCRAP_TIME = os.getenv("SCRAP_TIME", "09:00")  # Hora diaria para ejecutar el scraping
+# Horas adicionales (HH:MM separadas por comas) para repetir las consultas programadas
+SCRAP_TIMES_EXTRA = [h.strip() for h in os.getenv("SCRAP_TIMES_EXTRA", "").split(",") if h.strip()]
+# Consultas programadas (fechas por defecto: ayer): conjuntos de CPV separados por ';', '*' = sin filtro CPV
+CONSULTAS_PROGRAMADAS = [c.strip() for c in os.getenv("CONSULTAS_PROGRAMADAS", "*").split(";") if c.strip()]
+SCHEDULER_ENABLED = os.getenv("SCHEDULER_ENABLED", "true").lower() == "true"  # Programador dentro de la API
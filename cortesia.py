@@ -0,0 +1,281 @@
+"""
+Gobernador de cortesía para las peticiones al portal
+Cubo de tokens que limita el ritmo de navegaciones, envíos de formulario y
+avances de página, y concurrencia adaptativa (AIMD) de sesiones de navegador
+según la latencia del portal. El estado es del proceso o, con
+PORTAL_RATE_COMPARTIDO, compartido entre procesos mediante SQLite
+"""
+
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+from typing import Dict, Optional
+
+from config import (
+    PORTAL_RPS, PORTAL_RAFAGA, PORTAL_RATE_COMPARTIDO, CORTESIA_DB,
+    CONCURRENCIA_MIN, CONCURRENCIA_MAX, CONCURRENCIA_INICIAL, LATENCIA_OBJETIVO_MS,
+)
+from logger import setup_logger
+
+logger = setup_logger(__name__)
+
+ALFA_LATENCIA = 0.3  # Peso de cada muestra en la media exponencial de latencia
+MUESTRAS_PARA_SUBIR = 5  # Muestras desde el último ajuste antes de permitir una sesión más
+MUESTRAS_PARA_BAJAR = 2  # Muestras tras el último ajuste antes de volver a reducir
+ESPERA_SESION = 2  # Segundos entre intentos de ocupar una sesión
+SESION_MAX_SEGUNDOS = 3 * 3600  # Sesiones más antiguas se consideran huérfanas
+
+_ESQUEMA = """
+PRAGMA journal_mode = WAL;
+CREATE TABLE IF NOT EXISTS gobernador (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    tokens REAL NOT NULL,
+    actualizado REAL NOT NULL,
+    limite INTEGER NOT NULL,
+    latencia_ewma REAL,
+    muestras INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS sesiones (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    pid INTEGER NOT NULL,
+    inicio REAL NOT NULL
+)
+"""
+
+
+def _estado_inicial(ahora: float) -> Dict:
+    return {
+        "tokens": float(PORTAL_RAFAGA),
+        "actualizado": ahora,
+        "limite": max(CONCURRENCIA_MIN, min(CONCURRENCIA_MAX, CONCURRENCIA_INICIAL)),
+        "latencia_ewma": None,
+        "muestras": 0,
+    }
+
+
+class _EstadoLocal:
+    """Estado del gobernador en memoria, compartido por los hilos del proceso"""
+
+    def __init__(self):
+        self._estado = _estado_inicial(time.monotonic())
+        self._estado["activas"] = 0
+        self._lock = threading.Lock()
+
+    def ahora(self) -> float:
+        return time.monotonic()
+
+    @contextmanager
+    def transaccion(self):
+        with self._lock:
+            yield self._estado
+
+    def ocupar_sesion(self) -> Optional[int]:
+        with self._lock:
+            if self._estado["activas"] >= self._estado["limite"]:
+                return None
+            self._estado["activas"] += 1
+            return self._estado["activas"]
+
+    def liberar_sesion(self, sesion: int) -> None:
+        with self._lock:
+            self._estado["activas"] -= 1
+
+    def activas(self) -> int:
+        return self._estado["activas"]
+
+
+class _EstadoCompartido:
+    """Estado del gobernador en SQLite, compartido por todos los procesos de la máquina"""
+
+    def __init__(self, ruta: str):
+        self.ruta = ruta
+
+    def ahora(self) -> float:
+        return time.time()
+
+    @contextmanager
+    def _conectar(self):
+        os.makedirs(os.path.dirname(self.ruta) or ".", exist_ok=True)
+        conexion = sqlite3.connect(self.ruta, timeout=30)
+        conexion.row_factory = sqlite3.Row
+        try:
+            with conexion:
+                conexion.executescript(_ESQUEMA)
+                conexion.execute("BEGIN IMMEDIATE")
+                yield conexion
+        finally:
+            conexion.close()
+
+    @contextmanager
+    def transaccion(self):
+        with self._conectar() as conexion:
+            fila = conexion.execute("SELECT * FROM gobernador WHERE id = 1").fetchone()
+            estado = dict(fila) if fila else _estado_inicial(time.time())
+            yield estado
+            conexion.execute(
+                "INSERT OR REPLACE INTO gobernador (id, tokens, actualizado, limite, latencia_ewma, muestras) "
+                "VALUES (1, ?, ?, ?, ?, ?)",
+                (estado["tokens"], estado["actualizado"], estado["limite"], estado["latencia_ewma"], estado["muestras"]),
+            )
+
+    def _limpiar_huerfanas(self, conexion: sqlite3.Connection) -> None:
+        conexion.execute("DELETE FROM sesiones WHERE inicio < ?", (time.time() - SESION_MAX_SEGUNDOS,))
+        if os.name != "posix":
+            return
+        for fila in conexion.execute("SELECT id, pid FROM sesiones").fetchall():
+            try:
+                os.kill(fila["pid"], 0)
+            except ProcessLookupError:
+                conexion.execute("DELETE FROM sesiones WHERE id = ?", (fila["id"],))
+            except OSError:
+                pass
+
+    def ocupar_sesion(self) -> Optional[int]:
+        with self._conectar() as conexion:
+            self._limpiar_huerfanas(conexion)
+            fila = conexion.execute("SELECT limite FROM gobernador WHERE id = 1").fetchone()
+            limite = fila["limite"] if fila else _estado_inicial(time.time())["limite"]
+            activas = conexion.execute("SELECT COUNT(*) FROM sesiones").fetchone()[0]
+            if activas >= limite:
+                return None
+            return conexion.execute(
+                "INSERT INTO sesiones (pid, inicio) VALUES (?, ?)", (os.getpid(), time.time())
+            ).lastrowid
+
+    def liberar_sesion(self, sesion: int) -> None:
+        with self._conectar() as conexion:
+            conexion.execute("DELETE FROM sesiones WHERE id = ?", (sesion,))
+
+    def activas(self) -> int:
+        with self._conectar() as conexion:
+            return conexion.execute("SELECT COUNT(*) FROM sesiones").fetchone()[0]
+
+
+class Gobernador:
+    """
+    Ritmo de peticiones (cubo de tokens) y sesiones concurrentes (AIMD) contra el portal
+
+    Cada acción que genera una petición al portal llama antes a esperar_turno();
+    tras cada página se registra la latencia del servidor con registrar_latencia().
+    Mientras la latencia media está por debajo de LATENCIA_OBJETIVO_MS se permite
+    una sesión más cada MUESTRAS_PARA_SUBIR muestras; si supera 1,5 veces el
+    objetivo, el límite se reduce a la mitad.
+    """
+
+    def __init__(self, rps: float = PORTAL_RPS, rafaga: int = PORTAL_RAFAGA, compartido: bool = PORTAL_RATE_COMPARTIDO):
+        self.rps = rps
+        self.rafaga = rafaga
+        self._estado = _EstadoCompartido(CORTESIA_DB) if compartido else _EstadoLocal()
+        self.espera_acumulada = 0.0  # Segundos esperados por turno en este proceso
+
+    def _tomar_token(self, paso: str) -> float:
+        """Toma un token si hay alguno disponible; si no, devuelve los segundos a esperar"""
+        with self._estado.transaccion() as estado:
+            ahora = self._estado.ahora()
+            estado["tokens"] = min(self.rafaga, estado["tokens"] + (ahora - estado["actualizado"]) * self.rps)
+            estado["actualizado"] = ahora
+            if estado["tokens"] >= 1:
+                estado["tokens"] -= 1
+                return 0.0
+            espera = (1 - estado["tokens"]) / self.rps
+        logger.debug(f"Cortesía: {paso} espera {espera:.2f} s")
+        self.espera_acumulada += espera
+        return espera
+
+    def esperar_turno(self, paso: str) -> None:
+        """Bloquea hasta que haya un token disponible para una petición al portal"""
+        if self.rps <= 0:
+            return
+        while True:
+            espera = self._tomar_token(paso)
+            if not espera:
+                return
+            time.sleep(espera)
+
+    async def esperar_turno_async(self, paso: str) -> None:
+        """Como esperar_turno() sin bloquear el bucle de eventos (backend Playwright)"""
+        if self.rps <= 0:
+            return
+        while True:
+            espera = self._tomar_token(paso)
+            if not espera:
+                return
+            await asyncio.sleep(espera)
+
+    def registrar_latencia(self, latencia_ms: float) -> None:
+        """Actualiza la latencia media del portal y ajusta el límite de sesiones"""
+        with self._estado.transaccion() as estado:
+            anterior = estado["latencia_ewma"]
+            ewma = latencia_ms if anterior is None else ALFA_LATENCIA * latencia_ms + (1 - ALFA_LATENCIA) * anterior
+            estado["latencia_ewma"] = ewma
+            estado["muestras"] += 1
+
+            limite = estado["limite"]
+            if ewma > LATENCIA_OBJETIVO_MS * 1.5 and estado["muestras"] >= MUESTRAS_PARA_BAJAR:
+                estado["limite"] = max(CONCURRENCIA_MIN, limite // 2)
+                estado["muestras"] = 0
+            elif ewma < LATENCIA_OBJETIVO_MS and estado["muestras"] >= MUESTRAS_PARA_SUBIR:
+                estado["limite"] = min(CONCURRENCIA_MAX, limite + 1)
+                estado["muestras"] = 0
+
+            if estado["limite"] != limite:
+                logger.info(f"Cortesía: latencia media {ewma:.0f} ms → sesiones concurrentes {limite} → {estado['limite']}")
+
+    @contextmanager
+    def sesion(self, comprobar=None):
+        """
+        Ocupa una de las sesiones de navegador permitidas, esperando si están todas en uso
+
+        comprobar: función llamada en cada espera (p. ej. la comprobación de
+        cancelación del scraper); si lanza, se deja de esperar sin ocupar sesión
+        """
+        inicio = time.time()
+        sesion = self._estado.ocupar_sesion()
+        while sesion is None:
+            if comprobar is not None:
+                comprobar()
+            time.sleep(ESPERA_SESION)
+            sesion = self._estado.ocupar_sesion()
+        if time.time() - inicio >= ESPERA_SESION:
+            logger.info(f"Cortesía: sesión de navegador concedida tras {time.time() - inicio:.0f} s de espera")
+        try:
+            yield
+        finally:
+            self._estado.liberar_sesion(sesion)
+
+    @asynccontextmanager
+    async def sesion_async(self, comprobar=None):
+        """Como sesion() sin bloquear el bucle de eventos (backend Playwright)"""
+        inicio = time.time()
+        sesion = self._estado.ocupar_sesion()
+        while sesion is None:
+            if comprobar is not None:
+                comprobar()
+            await asyncio.sleep(ESPERA_SESION)
+            sesion = self._estado.ocupar_sesion()
+        if time.time() - inicio >= ESPERA_SESION:
+            logger.info(f"Cortesía: sesión de navegador concedida tras {time.time() - inicio:.0f} s de espera")
+        try:
+            yield
+        finally:
+            self._estado.liberar_sesion(sesion)
+
+    def resumen(self) -> Dict:
+        with self._estado.transaccion() as estado:
+            latencia = estado["latencia_ewma"]
+            limite = estado["limite"]
+        return {
+            "peticiones_por_segundo": self.rps,
+            "rafaga": self.rafaga,
+            "compartido": isinstance(self._estado, _EstadoCompartido),
+            "sesiones_activas": self._estado.activas(),
+            "sesiones_maximas": limite,
+            "latencia_media_ms": round(latencia, 1) if latencia is not None else None,
+            "espera_acumulada_s": round(self.espera_acumulada, 1),
+        }
+
+
+gobernador = Gobernador()
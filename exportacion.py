@@ -0,0 +1,217 @@
+"""
+Exportación de licitaciones a Parquet
+Dataset columnar particionado por fecha de publicación:
+
+    <PARQUET_DIR>/fecha=YYYY-MM-DD/licitaciones.parquet
+
+con importe numérico, fecha como date32 y organismo/tipo/estado codificados
+como diccionario. Cada exportación fusiona sus filas con las ya existentes de
+la partición (clave expediente + organismo), así que exportar varias veces los
+mismos días no duplica licitaciones. leer() poda particiones por rango de
+fechas y empuja los filtros simples al lector de Parquet.
+
+Requiere pyarrow (opcional): pip install pyarrow
+"""
+
+import glob
+import json
+import os
+import time
+import uuid
+from datetime import date
+from typing import Dict, Iterable, List, Optional
+
+from bloqueos import bloquear_archivo
+from campos import parsear_fecha, parsear_importe
+from checkpoint import clave_licitacion
+from config import PARQUET_DIR
+from logger import setup_logger
+
+logger = setup_logger(__name__)
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+ARCHIVO_PARTICION = "licitaciones.parquet"
+PARTICION_SIN_FECHA = "fecha=sin_fecha"  # Filas cuya fecha no se pudo interpretar
+ESPERA_BLOQUEO = 0.2
+
+
+def _esquema():
+    cadena_diccionario = pa.dictionary(pa.int32(), pa.string())
+    return pa.schema([
+        ("expediente", pa.string()),
+        ("descripcion", pa.string()),
+        ("tipo", cadena_diccionario),
+        ("subtipo", pa.string()),
+        ("estado", cadena_diccionario),
+        ("importe", pa.float64()),
+        ("importe_texto", pa.string()),
+        ("fecha", pa.date32()),
+        ("organismo", cadena_diccionario),
+        ("enlace", pa.string()),
+    ])
+
+
+def _requerir_pyarrow() -> None:
+    if pa is None:
+        raise RuntimeError("La exportación a Parquet requiere pyarrow: pip install pyarrow")
+
+
+def _fila(licitacion: Dict) -> Dict:
+    return {
+        "expediente": licitacion.get("expediente"),
+        "descripcion": licitacion.get("descripcion"),
+        "tipo": licitacion.get("tipo") or None,
+        "subtipo": licitacion.get("subtipo"),
+        "estado": licitacion.get("estado") or None,
+        "importe": parsear_importe(licitacion.get("importe")),
+        "importe_texto": licitacion.get("importe"),
+        "fecha": parsear_fecha(licitacion.get("fecha")),
+        "organismo": licitacion.get("organismo") or None,
+        "enlace": licitacion.get("enlace"),
+    }
+
+
+def _nombre_particion(dia: Optional[date]) -> str:
+    return f"fecha={dia.isoformat()}" if dia else PARTICION_SIN_FECHA
+
+
+def _escribir_particion(directorio: str, filas: List[Dict]) -> int:
+    """Fusiona las filas con las existentes de la partición y la reescribe de forma atómica"""
+    os.makedirs(directorio, exist_ok=True)
+    ruta = os.path.join(directorio, ARCHIVO_PARTICION)
+    with open(os.path.join(directorio, ".lock"), "w") as archivo_lock:
+        while not bloquear_archivo(archivo_lock):
+            time.sleep(ESPERA_BLOQUEO)
+
+        por_clave = {}
+        if os.path.exists(ruta):
+            for fila in pq.read_table(ruta).to_pylist():
+                por_clave[clave_licitacion(fila)] = fila
+        for fila in filas:
+            por_clave[clave_licitacion(fila)] = fila
+
+        # Orden estable por organismo y expediente: mejores estadísticas por row group
+        combinadas = sorted(por_clave.values(), key=lambda f: (f["organismo"] or "", f["expediente"] or ""))
+        tabla = pa.Table.from_pylist(combinadas, schema=_esquema())
+        temporal = f"{ruta}.{uuid.uuid4().hex[:8]}.tmp"
+        pq.write_table(tabla, temporal, compression="zstd")
+        os.replace(temporal, ruta)
+    return len(combinadas)
+
+
+def exportar(licitaciones: Iterable[Dict], destino: str = PARQUET_DIR) -> Dict[str, int]:
+    """
+    Añade licitaciones al dataset Parquet particionado por fecha de publicación
+
+    Returns:
+        dict partición -> filas totales tras la exportación
+    """
+    _requerir_pyarrow()
+    particiones: Dict[str, List[Dict]] = {}
+    for licitacion in licitaciones:
+        fila = _fila(licitacion)
+        particiones.setdefault(_nombre_particion(fila["fecha"]), []).append(fila)
+
+    resultado = {}
+    for particion, filas in sorted(particiones.items()):
+        resultado[particion] = _escribir_particion(os.path.join(destino, particion), filas)
+    logger.info(f"✓ Exportadas {sum(len(f) for f in particiones.values())} licitaciones a "
+                f"{len(particiones)} partición(es) de {destino}")
+    return resultado
+
+
+def _particiones(destino: str, fecha_desde: Optional[date], fecha_hasta: Optional[date]) -> List[str]:
+    """Rutas de las particiones dentro del rango (poda por nombre de directorio, sin abrir archivos)"""
+    rutas = []
+    for directorio in sorted(glob.glob(os.path.join(destino, "fecha=*"))):
+        nombre = os.path.basename(directorio)
+        ruta = os.path.join(directorio, ARCHIVO_PARTICION)
+        if not os.path.exists(ruta):
+            continue
+        if nombre == PARTICION_SIN_FECHA:
+            if fecha_desde is None and fecha_hasta is None:
+                rutas.append(ruta)
+            continue
+        dia = date.fromisoformat(nombre[len("fecha="):])
+        if (fecha_desde and dia < fecha_desde) or (fecha_hasta and dia > fecha_hasta):
+            continue
+        rutas.append(ruta)
+    return rutas
+
+
+def leer(destino: str = PARQUET_DIR,
+         fecha_desde: Optional[str] = None,
+         fecha_hasta: Optional[str] = None,
+         estado: Optional[str] = None,
+         organismo: Optional[str] = None,
+         tipo: Optional[str] = None,
+         importe_min: Optional[float] = None,
+         importe_max: Optional[float] = None,
+         columnas: Optional[List[str]] = None):
+    """
+    Lee el dataset como una tabla de Arrow
+
+    Las fechas (DD-MM-YYYY) descartan particiones completas; los demás filtros
+    se empujan a pyarrow, que omite los row groups cuyas estadísticas no los
+    cumplen y solo decodifica las columnas pedidas.
+
+    Returns:
+        pyarrow.Table (vacía con el esquema del dataset si nada coincide)
+    """
+    _requerir_pyarrow()
+    filtros = []
+    if estado is not None:
+        filtros.append(("estado", "=", estado))
+    if organismo is not None:
+        filtros.append(("organismo", "=", organismo))
+    if tipo is not None:
+        filtros.append(("tipo", "=", tipo))
+    if importe_min is not None:
+        filtros.append(("importe", ">=", float(importe_min)))
+    if importe_max is not None:
+        filtros.append(("importe", "<=", float(importe_max)))
+
+    rutas = _particiones(destino, parsear_fecha(fecha_desde), parsear_fecha(fecha_hasta))
+    esquema = _esquema()
+    if columnas:
+        esquema = pa.schema([esquema.field(c) for c in columnas])
+    tablas = [pq.read_table(ruta, columns=columnas, filters=filtros or None, schema=_esquema()) for ruta in rutas]
+    tablas = [tabla for tabla in tablas if tabla.num_rows]
+    if not tablas:
+        return esquema.empty_table()
+    # Los diccionarios difieren entre archivos: se unifican al concatenar
+    return pa.concat_tables(tablas).unify_dictionaries()
+
+
+def main():
+    """Exporta a Parquet archivos JSON de resultados o un dataset del backfill"""
+    import argparse
+    parser = argparse.ArgumentParser(description="Exportación de licitaciones a Parquet particionado por fecha")
+    parser.add_argument("origen", nargs="+",
+                        help="licitaciones_extraidas.json, carpetas de ejecución o datasets de backfill.py")
+    parser.add_argument("--destino", default=PARQUET_DIR, help="Directorio del dataset Parquet")
+    args = parser.parse_args()
+
+    archivos = []
+    for origen in args.origen:
+        if os.path.isdir(origen):
+            archivos += sorted(glob.glob(os.path.join(origen, "**", "*licitaciones*.json"), recursive=True))
+        else:
+            archivos.append(origen)
+
+    licitaciones = []
+    for archivo in archivos:
+        with open(archivo, "r", encoding="utf-8") as f:
+            licitaciones += json.load(f)
+    logger.info(f"{len(licitaciones)} licitaciones leídas de {len(archivos)} archivo(s)")
+    exportar(licitaciones, args.destino)
+
+
+if __name__ == "__main__":
+    main()
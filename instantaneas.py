@@ -0,0 +1,174 @@
+"""
+Instantáneas diarias estáticas
+Cada resultado almacenado de un solo día ya terminado (ayer o antes) se
+materializa como archivo estático, con el mismo cuerpo que /licitaciones y sus
+variantes precomprimidas:
+
+    <INSTANTANEAS_DIR>/YYYY-MM-DD/<consulta>.<etag>.json(.gz, .br)
+    <INSTANTANEAS_DIR>/YYYY-MM-DD/<consulta>.meta.json
+
+donde <consulta> es "todos" (sin filtro CPV) o los CPV ordenados y separados
+por comas. /instantaneas/{fecha}/{consulta}.json los sirve con FileResponse:
+el cuerpo no se serializa ni se comprime por petición, solo se elige el
+archivo según Accept-Encoding. La cabecera ETag es el hash del contenido,
+igual que en /licitaciones.
+
+Los cuerpos llevan el ETag en el nombre y .meta.json indica la versión
+vigente: una reescritura crea los archivos nuevos y después sustituye
+.meta.json con un único rename, de modo que nunca se sirve un cuerpo con el
+ETag de otro. Se conserva la versión anterior para las respuestas en curso.
+"""
+
+import glob
+import gzip
+import json
+import os
+import time
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from config import INSTANTANEAS_DIR, INSTANTANEAS_MAX_AGE
+from logger import setup_logger
+
+logger = setup_logger(__name__)
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+CONSULTA_SIN_FILTRO = "todos"
+NIVEL_GZIP = 9  # Se comprime una vez por resultado: nivel máximo
+CALIDAD_BROTLI = 9  # 10-11 multiplican el tiempo para unos pocos puntos de ratio
+SUFIJOS = {"br": ".br", "gzip": ".gz"}
+
+# Metadatos (ETag y Last-Modified) leídos por archivo, invalidados por su mtime
+_metadatos: Dict[str, Tuple[int, Dict]] = {}
+
+
+def nombre_consulta(cpv_codes: Optional[List[str]]) -> str:
+    """Nombre estable de la consulta en la URL: 'todos' o CPV ordenados separados por comas"""
+    return ",".join(cpv_codes) if cpv_codes else CONSULTA_SIN_FILTRO
+
+
+def ruta_instantanea(dia: str, consulta: str) -> str:
+    """Ruta base (sin extensión) de la instantánea de un día (DD-MM-YYYY) y una consulta (nombre_consulta)"""
+    fecha = datetime.strptime(dia, "%d-%m-%Y").strftime("%Y-%m-%d")
+    return os.path.join(INSTANTANEAS_DIR, fecha, consulta)
+
+
+def _ruta_meta(base: str) -> str:
+    return f"{base}.meta.json"
+
+
+def _ruta_cuerpo(base: str, etag_base: str) -> str:
+    return f"{base}.{etag_base}.json"
+
+
+def es_diario_terminado(resultado: Dict) -> bool:
+    """Resultado de un único día anterior a hoy (los datos de hoy aún pueden cambiar)"""
+    if resultado.get("fecha_desde") != resultado.get("fecha_hasta") or not resultado.get("completo", True):
+        return False
+    try:
+        dia = datetime.strptime(resultado["fecha_desde"], "%d-%m-%Y").date()
+    except (TypeError, ValueError):
+        return False
+    return dia < datetime.now().date()
+
+
+def contenido_instantanea(resultado: Dict, cpv_codes: Optional[List[str]]) -> Dict:
+    """Cuerpo de la instantánea: el mismo que /licitaciones para esa consulta"""
+    contenido = {
+        "success": True,
+        "timestamp": datetime.fromtimestamp(resultado["last_modified"]).isoformat(),
+        "total_licitaciones": resultado["total_licitaciones"],
+        "fecha_desde": resultado["fecha_desde"],
+        "fecha_hasta": resultado["fecha_hasta"],
+        "completo": True,
+        "licitaciones": resultado["licitaciones"],
+    }
+    if cpv_codes:
+        contenido["codigos_cpv"] = cpv_codes
+    else:
+        contenido["filtro_cpv"] = "ninguno"
+    return contenido
+
+
+def _escribir(ruta: str, datos: bytes, mtime: float) -> None:
+    temporal = f"{ruta}.tmp"
+    with open(temporal, "wb") as f:
+        f.write(datos)
+    # mtime = momento de obtención de los datos: Last-Modified coherente con /licitaciones
+    os.utime(temporal, (mtime, mtime))
+    os.replace(temporal, ruta)
+
+
+def materializar(resultado: Dict, cpv_codes: Optional[List[str]]) -> Optional[str]:
+    """
+    Escribe la instantánea (JSON, .gz y, con brotli, .br) de un resultado diario terminado
+
+    Returns:
+        Ruta base de la instantánea o None si el resultado no es de un día terminado
+    """
+    if not es_diario_terminado(resultado):
+        return None
+    from respuestas import serializar_json
+
+    inicio = time.perf_counter()
+    base = ruta_instantanea(resultado["fecha_desde"], nombre_consulta(cpv_codes))
+    os.makedirs(os.path.dirname(base), exist_ok=True)
+    cuerpo = serializar_json(contenido_instantanea(resultado, cpv_codes))
+    mtime = resultado["last_modified"]
+    etag_base = resultado["content_hash"][:32]
+    anterior = metadatos(base)
+
+    ruta = _ruta_cuerpo(base, etag_base)
+    _escribir(ruta, cuerpo, mtime)
+    _escribir(ruta + SUFIJOS["gzip"], gzip.compress(cuerpo, compresslevel=NIVEL_GZIP, mtime=0), mtime)
+    if brotli is not None:
+        _escribir(ruta + SUFIJOS["br"], brotli.compress(cuerpo, quality=CALIDAD_BROTLI), mtime)
+    meta = {"etag_base": etag_base, "last_modified": mtime,
+            "total_licitaciones": resultado["total_licitaciones"], "bytes": len(cuerpo)}
+    # Punto de publicación: a partir de aquí se sirve la nueva versión
+    _escribir(_ruta_meta(base), json.dumps(meta).encode("utf-8"), mtime)
+
+    conservar = {etag_base, anterior["etag_base"] if anterior else etag_base}
+    for archivo in glob.glob(f"{glob.escape(base)}.*.json*"):
+        version = os.path.basename(archivo)[len(os.path.basename(base)) + 1:].split(".")[0]
+        if version not in conservar and version != "meta":
+            os.remove(archivo)
+
+    logger.info(f"✓ Instantánea {os.path.relpath(base, INSTANTANEAS_DIR)} ({len(cuerpo) / 1024:.0f} KiB) "
+                f"en {time.perf_counter() - inicio:.2f} s")
+    return base
+
+
+def metadatos(base: str) -> Optional[Dict]:
+    """Metadatos de la versión vigente de la instantánea (None si aún no se ha publicado)"""
+    ruta_meta = _ruta_meta(base)
+    try:
+        mtime = os.stat(ruta_meta).st_mtime_ns
+    except FileNotFoundError:
+        return None
+    cacheado = _metadatos.get(ruta_meta)
+    if cacheado is None or cacheado[0] != mtime:
+        with open(ruta_meta, "r", encoding="utf-8") as f:
+            cacheado = (mtime, json.load(f))
+        if not os.path.exists(_ruta_cuerpo(base, cacheado[1].get("etag_base", ""))):
+            return None  # Metadatos sin su cuerpo (p. ej. formato anterior): se vuelve a materializar
+        _metadatos[ruta_meta] = cacheado
+    return cacheado[1]
+
+
+def variante(base: str, meta: Dict, codificacion: Optional[str]) -> Tuple[str, Optional[str]]:
+    """Archivo de la versión vigente a servir para la codificación negociada (sin comprimir si falta la variante)"""
+    ruta = _ruta_cuerpo(base, meta["etag_base"])
+    if codificacion and os.path.exists(ruta + SUFIJOS[codificacion]):
+        return ruta + SUFIJOS[codificacion], codificacion
+    return ruta, None
+
+
+def cache_control() -> str:
+    # Un día terminado solo cambia si una ejecución posterior trae otro contenido: ETag para revalidar.
+    # private: la ruta exige X-API-Key y las cachés compartidas no distinguen esa cabecera
+    return f"private, max-age={INSTANTANEAS_MAX_AGE}"
@@ -3,6 +3,18 @@ import os
 from datetime import datetime
 from config import LOG_DIR
 
+
+class _ArchivoDiferido(logging.FileHandler):
+    """FileHandler que crea el directorio y abre el archivo en el primer mensaje, no al importar"""
+    
+    def __init__(self, filename, encoding=None):
+        super().__init__(filename, encoding=encoding, delay=True)
+    
+    def _open(self):
+        os.makedirs(os.path.dirname(self.baseFilename), exist_ok=True)
+        return super()._open()
+
+
 def setup_logger(name, log_file=None):
     """Configura el logger para guardar logs en archivos"""
     if log_file is None:
@@ -12,7 +24,7 @@ def setup_logger(name, log_file=None):
     logger.setLevel(logging.DEBUG)
     
     # Handler para archivo
-    file_handler = logging.FileHandler(log_file, encoding='utf-8')
+    file_handler = _ArchivoDiferido(log_file, encoding='utf-8')
     file_handler.setLevel(logging.DEBUG)
     
     # Handler para consola
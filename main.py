@@ -3,23 +3,73 @@ API FastAPI para scraping de licitaciones
 Endpoint principal para consultar licitaciones del día
 """
 
-from fastapi import FastAPI, HTTPException, Query, Header, Depends
-from fastapi.responses import JSONResponse
-from datetime import datetime
+from fastapi import FastAPI, HTTPException, Query, Header, Depends, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse, StreamingResponse
+from pydantic import BaseModel, Field
+from contextlib import asynccontextmanager
+import asyncio
+import hashlib
+import json
+import sys
+import threading
+from datetime import datetime, timedelta
 from typing import Dict, List, Optional
+import time
 import traceback
-from scraper_selenium import ejecutar_scraping
 from logger import setup_logger
-from config import API_KEY
+from config import (
+    API_KEY, SCHEDULER_ENABLED, preparar_directorios, SCRAPING_MODO, COLA_PARTICIONAR_DIAS, SCRAPER_BACKEND,
+    PERFILADO_PERMITIDO,
+)
+from respuestas import (
+    MEDIA_JSON, ORJSONResponse, construir_respuesta, etag_variante, negociar_codificacion, respuesta_no_modificada,
+)
+from reintentos import circuito_portal
+from cortesia import gobernador
+from programador import programador
+from progreso import registro as registro_progreso
+import almacen
+import busqueda
+import cola
+import instantaneas
+import navegador
+import planificador
+import suscripciones
 
 # Configurar logger
 logger = setup_logger(__name__)
 
+SSE_INTERVALO = 0.5  # Segundos entre comprobaciones del progreso
+SSE_LATIDO = 15  # Segundos máximos sin enviar nada al cliente
+SSE_ESPERA_INICIO = 30  # Segundos esperando a que empiece la extracción seguida
+CANCELACION_INTERVALO = 0.5  # Segundos entre comprobaciones de desconexión del cliente y del plazo
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Tareas de arranque: directorios, resolver Chrome/ChromeDriver una vez, programador diario y entrega de webhooks"""
+    preparar_directorios()
+    if SCRAPER_BACKEND != "playwright" and SCRAPING_MODO != "cola":
+        # Solo si este proceso abrirá Selenium; en segundo plano y sin descargas para no retrasar el arranque
+        threading.Thread(target=navegador.preflight, kwargs={"descargar": False}, name="preflight", daemon=True).start()
+    if SCHEDULER_ENABLED:
+        programador.iniciar()
+    suscripciones.entregador.iniciar()
+    yield
+    programador.detener()
+    suscripciones.entregador.detener()
+    if "scraper_playwright" in sys.modules:
+        await sys.modules["scraper_playwright"].navegador_compartido.cerrar()
+
+
 # Crear instancia de FastAPI
 app = FastAPI(
     title="API de Licitaciones",
     description="API para obtener licitaciones de contrataciondelestado.es",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=ORJSONResponse,
+    lifespan=lifespan
 )
 
 
@@ -42,8 +92,17 @@ async def root():
         "mensaje": "API de Licitaciones - contrataciondelestado.es",
         "version": "1.0.0",
         "endpoints": {
-            "/licitaciones": "Obtener licitaciones (parámetros opcionales: cpv_codes, fecha_desde, fecha_hasta)",
-            "/health": "Estado de la API"
+            "/licitaciones": "Obtener licitaciones (parámetros opcionales: cpv_codes, fecha_desde, fecha_hasta, plazo)",
+            "/health": "Estado de la API",
+            "/licitaciones/changes": "Licitaciones nuevas, modificadas y eliminadas desde 'since' (ISO 8601 o DD-MM-YYYY)",
+            "/licitaciones/progress": "Progreso de la extracción en curso de una consulta (Server-Sent Events)",
+            "/licitaciones/search": "Búsqueda de texto completo en las licitaciones ya extraídas (q, fecha_desde, fecha_hasta)",
+            "/instantaneas/{fecha}/{consulta}.json": "Resultado estático y precomprimido de un día terminado "
+                                                    "(fecha YYYY-MM-DD o 'ayer'; consulta 'todos' o CPV separados por comas)",
+            "/trabajos/{lote}": "Estado de una consulta encolada (modo cola)",
+            "/workers": "Estado de la cola y rendimiento de cada worker (modo cola)",
+            "/suscripciones": "Alta (POST), consulta (GET) y baja (DELETE /suscripciones/{id}) de avisos por webhook",
+            "/programador": "Estado de las consultas programadas (última ejecución, duración, próxima ejecución)"
         },
         "parametros": {
             "cpv_codes": {
@@ -70,12 +129,302 @@ async def health():
     """Endpoint para verificar el estado de la API"""
     return {
         "status": "ok",
-        "timestamp": datetime.now().isoformat()
+        "timestamp": datetime.now().isoformat(),
+        "portal": circuito_portal.resumen(),
+        # En modo compartido lee (y purga) el estado SQLite del gobernador: fuera del bucle de eventos
+        "cortesia": await run_in_threadpool(gobernador.resumen)
     }
 
 
+@app.get("/programador", dependencies=[Depends(verify_api_key)])
+async def estado_programador():
+    """Estado del programador diario y de las últimas ejecuciones programadas"""
+    return await run_in_threadpool(programador.estado)
+
+
+def _parsear_since(since: str) -> float:
+    """Acepta fecha y hora ISO 8601 (2026-01-05T09:00) o fecha DD-MM-YYYY"""
+    for parsear in (datetime.fromisoformat, lambda valor: datetime.strptime(valor, "%d-%m-%Y")):
+        try:
+            return parsear(since).timestamp()
+        except ValueError:
+            pass
+    raise HTTPException(
+        status_code=400,
+        detail="Parámetro 'since' inválido: usa ISO 8601 (2026-01-05T09:00) o DD-MM-YYYY"
+    )
+
+
+@app.get("/licitaciones/changes", dependencies=[Depends(verify_api_key)])
+async def obtener_cambios(
+    request: Request,
+    since: str = Query(
+        ...,
+        description="Devuelve los cambios detectados desde este momento (ISO 8601 o DD-MM-YYYY)",
+        examples=["2026-01-05T09:00"]
+    ),
+    cpv_codes: Optional[str] = Query(default=None, description="Limita a la consulta con estos CPV"),
+    fecha_desde: Optional[str] = Query(default=None, description="Limita a la consulta con esta fecha desde"),
+    fecha_hasta: Optional[str] = Query(default=None, description="Limita a la consulta con esta fecha hasta")
+):
+    """
+    Licitaciones nuevas, modificadas (estado, importe u otros campos) y eliminadas
+    entre ejecuciones sucesivas de una misma consulta
+
+    Sin cpv_codes ni fechas devuelve los cambios de todas las consultas.
+    """
+    desde = _parsear_since(since)
+    consulta = None
+    if cpv_codes or fecha_desde or fecha_hasta:
+        cpv_list = [code.strip() for code in cpv_codes.split(",") if code.strip()] if cpv_codes else None
+        consulta = almacen.clave_consulta(cpv_list, fecha_desde, fecha_hasta)
+
+    delta = await run_in_threadpool(almacen.obtener_cambios, desde, consulta)
+    response_content = {
+        "success": True,
+        "since": datetime.fromtimestamp(desde).isoformat(),
+        "consulta": consulta,
+        "total_nuevas": len(delta["nuevas"]),
+        "total_modificadas": len(delta["modificadas"]),
+        "total_eliminadas": len(delta["eliminadas"]),
+        **delta
+    }
+    return construir_respuesta(request, response_content)
+
+
+@app.get("/licitaciones/search", dependencies=[Depends(verify_api_key)])
+async def buscar_licitaciones(
+    request: Request,
+    q: str = Query(..., description="Texto a buscar en expediente, descripción y organismo", examples=["mantenimiento software"]),
+    fecha_desde: Optional[str] = Query(default=None, description="Fecha de la licitación desde (DD-MM-YYYY)"),
+    fecha_hasta: Optional[str] = Query(default=None, description="Fecha de la licitación hasta (DD-MM-YYYY)"),
+    limite: int = Query(default=50, ge=1, le=500, description="Resultados por página"),
+    desplazamiento: int = Query(default=0, ge=0, description="Resultados a omitir (paginación)")
+):
+    """
+    Búsqueda de texto completo sobre todas las licitaciones extraídas, ordenada
+    por relevancia. No accede al portal: solo busca en lo ya almacenado.
+    """
+    try:
+        resultado = await run_in_threadpool(busqueda.buscar, q, fecha_desde, fecha_hasta, limite, desplazamiento)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return construir_respuesta(request, {"success": True, "q": q, **resultado})
+
+
+@app.get("/instantaneas/{fecha}/{consulta}.json", dependencies=[Depends(verify_api_key)])
+async def obtener_instantanea(request: Request, fecha: str, consulta: str):
+    """
+    Resultado de un día terminado como archivo estático
+
+    Mismo cuerpo que /licitaciones con fecha_desde = fecha_hasta = fecha, ya
+    serializado y precomprimido (gzip y, si está instalado, brotli) al
+    almacenarse: se envía el archivo de la variante que acepta el cliente, sin
+    serializar nada. fecha es YYYY-MM-DD o 'ayer'; consulta es 'todos' (sin
+    filtro CPV) o los CPV separados por comas. Responde 404 si el día aún no
+    tiene instantánea (consultar /licitaciones).
+    """
+    try:
+        dia = (datetime.now() - timedelta(days=1) if fecha == "ayer" else datetime.strptime(fecha, "%Y-%m-%d"))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Fecha inválida: usa YYYY-MM-DD o 'ayer'")
+    cpv_list = None if consulta == instantaneas.CONSULTA_SIN_FILTRO else almacen.normalizar_cpv(consulta.split(","))
+    nombre = instantaneas.nombre_consulta(cpv_list)
+    ruta = instantaneas.ruta_instantanea(dia.strftime("%d-%m-%Y"), nombre)
+    meta = await run_in_threadpool(instantaneas.metadatos, ruta)
+    if meta is None:
+        raise HTTPException(
+            status_code=404,
+            detail=f"Sin instantánea de {nombre} para el {dia.strftime('%d-%m-%Y')}: consulta /licitaciones"
+        )
+
+    archivo, codificacion = await run_in_threadpool(
+        instantaneas.variante, ruta, meta, negociar_codificacion(request.headers.get("accept-encoding"))
+    )
+    cabeceras = {
+        "ETag": etag_variante(meta["etag_base"], MEDIA_JSON, codificacion),
+        "Vary": "Accept-Encoding",
+        "Cache-Control": instantaneas.cache_control(),
+        # URL canónica: fecha explícita y CPV ordenados
+        "Content-Location": f"/instantaneas/{dia.strftime('%Y-%m-%d')}/{nombre}.json",
+    }
+    # Solo JSON: el ETag es el de la variante de archivo que se enviaría (con o sin compresión)
+    no_modificada = respuesta_no_modificada(request, meta["etag_base"], meta["last_modified"], etag=cabeceras["ETag"])
+    if no_modificada is not None:
+        no_modificada.headers.update(cabeceras)
+        return no_modificada
+
+    if codificacion:
+        cabeceras["Content-Encoding"] = codificacion
+    return FileResponse(archivo, media_type=MEDIA_JSON, headers=cabeceras)
+
+
+class NuevaSuscripcion(BaseModel):
+    """Perfil de interés: se notifican las licitaciones que cumplen todos los criterios indicados"""
+    nombre: str
+    webhook: str = Field(..., description="URL que recibe los avisos (POST JSON por lotes)")
+    cpv_prefijos: List[str] = Field(default_factory=list, examples=[["48000000", "7221"]])
+    palabras_clave: List[str] = Field(default_factory=list, description="Basta con una; cada una exige todas sus palabras")
+    organismos: List[str] = Field(default_factory=list)
+    importe_min: Optional[float] = None
+    importe_max: Optional[float] = None
+
+
+@app.post("/suscripciones", status_code=201, dependencies=[Depends(verify_api_key)])
+async def crear_suscripcion(suscripcion: NuevaSuscripcion):
+    """Registra una suscripción; las coincidencias de los resultados que se guarden a partir de ahora se envían al webhook"""
+    try:
+        return await run_in_threadpool(suscripciones.crear, **suscripcion.model_dump())
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@app.get("/suscripciones", dependencies=[Depends(verify_api_key)])
+async def listar_suscripciones():
+    """Suscripciones registradas con sus entregas por estado"""
+    return {"suscripciones": await run_in_threadpool(suscripciones.listar),
+            "entregador_activo": suscripciones.entregador.activo}
+
+
+@app.delete("/suscripciones/{id_suscripcion}", status_code=204, dependencies=[Depends(verify_api_key)])
+async def borrar_suscripcion(id_suscripcion: int):
+    """Elimina una suscripción y sus entregas pendientes"""
+    if not await run_in_threadpool(suscripciones.borrar, id_suscripcion):
+        raise HTTPException(status_code=404, detail=f"Suscripción no encontrada: {id_suscripcion}")
+
+
+@app.get("/trabajos/{lote}", dependencies=[Depends(verify_api_key)])
+async def estado_trabajo(lote: str):
+    """Estado de un lote encolado; cuando está completado, /licitaciones sirve el resultado"""
+    estado = await run_in_threadpool(cola.estado_lote, lote)
+    if estado is None:
+        raise HTTPException(status_code=404, detail=f"Lote no encontrado: {lote}")
+    return estado
+
+
+@app.get("/workers", dependencies=[Depends(verify_api_key)])
+async def estado_workers():
+    """Trabajos por estado y rendimiento de cada worker"""
+    return await run_in_threadpool(cola.estadisticas)
+
+
+async def _vigilar_cliente(request: Request, progreso) -> None:
+    """Cancela la extracción si el cliente se desconecta o vence el plazo de la petición"""
+    while progreso.terminado is None:
+        if await request.is_disconnected():
+            progreso.cancelar("cliente desconectado")
+            return
+        if progreso.plazo is not None and time.time() > progreso.plazo:
+            progreso.cancelar("plazo agotado")
+            return
+        await asyncio.sleep(CANCELACION_INTERVALO)
+
+
+async def _ejecutar_con_progreso(request: Request, clave: str, plazo: Optional[float], funcion, *args,
+                                 perfil=None, **kwargs) -> Dict:
+    """
+    Ejecuta una extracción en el pool de hilos siguiendo su progreso
+
+    Fuera del bucle de eventos, la API sigue atendiendo /licitaciones/progress
+    y otras peticiones mientras el navegador pagina. Si el cliente se
+    desconecta o vence el plazo, el scraper se detiene antes de la siguiente
+    página y cierra el navegador (cancelación cooperativa). Con `perfil`
+    (perfilado.PerfilPeticion) la extracción se ejecuta perfilada y el
+    resumen se añade al resultado.
+    """
+    progreso = registro_progreso.iniciar(clave, plazo)
+    vigilancia = asyncio.create_task(_vigilar_cliente(request, progreso))
+    try:
+        if perfil is not None:
+            from perfilado import PerfilOcupado
+            try:
+                if asyncio.iscoroutinefunction(funcion):
+                    # Backend Playwright: se espera en el propio bucle de eventos
+                    resultado = await perfil.ejecutar_async(funcion, *args, progreso=progreso, **kwargs)
+                else:
+                    resultado = await run_in_threadpool(perfil.ejecutar, funcion, *args, progreso=progreso, **kwargs)
+            except PerfilOcupado as e:
+                # Un solo perfil a la vez por proceso
+                raise HTTPException(status_code=409, detail=str(e))
+        elif asyncio.iscoroutinefunction(funcion):
+            # Backend Playwright: se espera en el propio bucle de eventos
+            resultado = await funcion(*args, progreso=progreso, **kwargs)
+        else:
+            resultado = await run_in_threadpool(funcion, *args, progreso=progreso, **kwargs)
+    except Exception as e:
+        progreso.fase_actual("error", str(e))
+        raise
+    finally:
+        vigilancia.cancel()
+    if perfil is not None:
+        resultado["perfil"] = await run_in_threadpool(perfil.guardar, resultado.get("output_folder"))
+    if resultado["success"]:
+        progreso.fase_actual("completado")
+    elif resultado.get("cancelado"):
+        progreso.fase_actual("cancelado", resultado.get("motivo"))
+    else:
+        progreso.fase_actual("error", resultado.get("error"))
+    return resultado
+
+
+def _evento_sse(evento: str, datos: Dict) -> str:
+    return f"event: {evento}\ndata: {json.dumps(datos, ensure_ascii=False)}\n\n"
+
+
+@app.get("/licitaciones/progress", dependencies=[Depends(verify_api_key)])
+async def progreso_licitaciones(
+    request: Request,
+    cpv_codes: Optional[str] = Query(default=None, description="Mismos parámetros que la petición a /licitaciones"),
+    fecha_desde: Optional[str] = Query(default=None),
+    fecha_hasta: Optional[str] = Query(default=None),
+    id: Optional[str] = Query(default=None, description="Id de la extracción (de un evento anterior)")
+):
+    """
+    Progreso de la extracción de una consulta como Server-Sent Events
+
+    Emite un evento 'progreso' en cada cambio (fase, página, filas
+    acumuladas, páginas totales y tiempo restante estimado) y un evento 'fin'
+    al terminar. Si la extracción aún no ha empezado, espera a que empiece.
+    En modo cola la extracción ocurre en los workers: usar /trabajos/{lote}.
+    """
+    cpv_list = [code.strip() for code in cpv_codes.split(",") if code.strip()] if cpv_codes else None
+    clave = almacen.clave_consulta(cpv_list, fecha_desde, fecha_hasta)
+
+    async def eventos():
+        inicio = time.monotonic()
+        ultimo_envio = inicio
+        version = None
+        while not await request.is_disconnected():
+            progreso = registro_progreso.obtener(id_progreso=id, consulta=clave)
+            ahora = time.monotonic()
+            if progreso is None:
+                if ahora - inicio > SSE_ESPERA_INICIO:
+                    yield _evento_sse("fin", {"consulta": clave, "fase": "sin_extraccion"})
+                    return
+            elif progreso.version != version:
+                version = progreso.version
+                resumen = progreso.resumen()
+                ultimo_envio = ahora
+                yield _evento_sse("progreso", resumen)
+                if resumen["terminado"]:
+                    yield _evento_sse("fin", resumen)
+                    return
+            if ahora - ultimo_envio >= SSE_LATIDO:
+                # Comentario SSE: mantiene abierta la conexión a través de proxies
+                ultimo_envio = ahora
+                yield ": latido\n\n"
+            await asyncio.sleep(SSE_INTERVALO)
+
+    return StreamingResponse(
+        eventos(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
 @app.get("/licitaciones", dependencies=[Depends(verify_api_key)])
 async def obtener_licitaciones(
+    request: Request,
     cpv_codes: Optional[str] = Query(
         default=None,
         description="Códigos CPV separados por comas (ej: 48000000,72000000). Si no se especifica, no filtra por CPV.",
@@ -90,6 +439,16 @@ async def obtener_licitaciones(
         default=None,
         description="Fecha hasta en formato DD-MM-YYYY (ej: 31-01-2026). Si no se especifica, usa la fecha de hoy.",
         examples=["31-01-2026"]
+    ),
+    plazo: Optional[float] = Query(
+        default=None,
+        gt=0,
+        description="Segundos máximos de extracción; al vencer se detiene y responde 504 (reanudable). Sin límite si no se especifica.",
+        examples=[120]
+    ),
+    perfilar: bool = Query(
+        default=False,
+        description="Ejecuta la extracción bajo cProfile y guarda el perfil y el reparto CPU/espera en su carpeta"
     )
 ):
     """
@@ -108,10 +467,29 @@ async def obtener_licitaciones(
                      Si no se proporciona, usa la fecha de ayer.
         fecha_hasta: Fecha hasta en formato DD-MM-YYYY (ej: 31-01-2026).
                      Si no se proporciona, usa la fecha de ayer.
+        plazo: Segundos máximos de extracción (opcional). Si vencen, o si el
+               cliente se desconecta, la extracción se detiene antes de la
+               siguiente página, libera el navegador y queda reanudable.
+        perfilar: Perfila la extracción de esta petición (PERFILADO_PERMITIDO).
+                  La respuesta incluye 'perfil' con el reparto del tiempo y la
+                  carpeta de perfil.prof/perfil.txt. No aplica si la consulta se
+                  sirve del almacén.
     
     Returns:
-        JSONResponse con las licitaciones encontradas
+        Respuesta con las licitaciones encontradas. El formato se negocia con la
+        cabecera Accept (JSON, MessagePack o Arrow IPC) y el cuerpo se comprime
+        con brotli/gzip según Accept-Encoding cuando supera COMPRESSION_MIN_BYTES.
+        Incluye ETag (hash del contenido) y Last-Modified; si la consulta se sirve
+        del almacén y el cliente envía If-None-Match/If-Modified-Since vigentes,
+        responde 304 sin cuerpo.
     """
+    if perfilar and not PERFILADO_PERMITIDO:
+        raise HTTPException(status_code=403, detail="El perfilado está desactivado (PERFILADO_PERMITIDO=false)")
+    perfil = None
+    if perfilar:
+        from perfilado import PerfilPeticion
+        perfil = PerfilPeticion()
+    
     try:
         logger.info("=" * 80)
         logger.info("SOLICITUD DE LICITACIONES VIA API")
@@ -137,25 +515,101 @@ async def obtener_licitaciones(
         else:
             logger.info("Fecha hasta: ayer")
         
-        # Ejecutar el scraping con los parámetros especificados
-        resultado = ejecutar_scraping(
-            cpv_codes=cpv_list,
-            fecha_desde=fecha_desde,
-            fecha_hasta=fecha_hasta
-        )
+        # Reutilizar un resultado reciente de la misma consulta si existe
+        clave = almacen.clave_consulta(cpv_list, fecha_desde, fecha_hasta)
+        # SQLite, lectura de disco y planificación son bloqueantes: fuera del bucle de eventos
+        meta = await run_in_threadpool(almacen.obtener_resultado, clave)
+        if meta:
+            etag_base = meta["content_hash"][:32]
+            no_modificada = respuesta_no_modificada(request, etag_base, meta["last_modified"])
+            if no_modificada is not None:
+                logger.info(f"✓ Resultado almacenado sin cambios para el cliente (304): {clave}")
+                return no_modificada
+            try:
+                resultado = await run_in_threadpool(almacen.cargar_resultado, meta)
+            except almacen.ResultadoNoDisponible:
+                # Carpeta borrada o ilegible: la entrada ya se descartó y la consulta se vuelve a extraer
+                meta = None
+        # Si no, comprobar qué días ya cubren resultados almacenados de un solo día
+        plan = None if meta else await run_in_threadpool(planificador.planificar, cpv_list, fecha_desde, fecha_hasta)
+        
+        if meta:
+            logger.info(f"✓ Sirviendo resultado almacenado: {clave}")
+        elif plan["locales"] and (not plan["fragmentos"] or SCRAPING_MODO != "cola"):
+            # Parte de la consulta (o toda) sale del almacén; solo se extraen los fragmentos que faltan
+            resultado = await _ejecutar_con_progreso(request, clave, plazo, planificador.ejecutar_plan, plan,
+                                                     perfil=perfil)
+        elif SCRAPING_MODO == "cola":
+            # La API solo encola: los workers (worker.py) ejecutan el scraping y guardan el resultado
+            lote = await run_in_threadpool(cola.encolar, cpv_list, fecha_desde, fecha_hasta,
+                                           particionar=COLA_PARTICIONAR_DIAS)
+            return ORJSONResponse(
+                status_code=202,
+                content={"success": True, "consultar": f"/trabajos/{lote['lote']}", **lote},
+                headers={"Location": f"/trabajos/{lote['lote']}", "Retry-After": "30"}
+            )
+        else:
+            # Si una ejecución anterior de esta consulta se interrumpió, continuar desde su checkpoint
+            reanudar_desde = await run_in_threadpool(almacen.obtener_reanudable, clave)
+            if reanudar_desde:
+                logger.info(f"Reanudando ejecución interrumpida: {reanudar_desde}")
+            
+            # El navegador (Selenium o Playwright) se importa con el primer scraping, no al arrancar la API
+            if SCRAPER_BACKEND == "playwright":
+                from scraper_playwright import ejecutar_scraping_async as ejecutar_scraping
+            else:
+                from scraper_selenium import ejecutar_scraping
+            
+            # Ejecutar el scraping con los parámetros especificados
+            resultado = await _ejecutar_con_progreso(
+                request,
+                clave,
+                plazo,
+                ejecutar_scraping,
+                cpv_codes=cpv_list,
+                fecha_desde=fecha_desde,
+                fecha_hasta=fecha_hasta,
+                reanudar_desde=reanudar_desde,
+                perfil=perfil
+            )
+            if resultado["success"]:
+                if resultado.get("completo", True):
+                    await run_in_threadpool(almacen.guardar_resultado, clave, resultado)
+                    await run_in_threadpool(almacen.borrar_reanudable, clave)
+                else:
+                    # Resultado truncado: no se cachea y la próxima consulta lo reanuda
+                    await run_in_threadpool(almacen.registrar_reanudable, clave, resultado)
+            elif resultado.get("cancelado") and resultado.get("paginas"):
+                await run_in_threadpool(almacen.registrar_reanudable, clave, resultado)
         
         if resultado["success"]:
             logger.info(f"✓ Scraping exitoso: {resultado['total_licitaciones']} licitaciones encontradas")
             
+            etag_base = resultado["content_hash"][:32]
+            extras = {campo: resultado[campo] for campo in ("plan", "perfil") if campo in resultado}
+            if extras:
+                # plan y perfil dependen de cómo se obtuvo el resultado, no de sus filas: entran en el ETag
+                # para que un mismo ETag fuerte nunca corresponda a cuerpos distintos
+                extras_json = json.dumps(extras, sort_keys=True, ensure_ascii=False, default=str)
+                etag_base = hashlib.sha256(f"{resultado['content_hash']}|{extras_json}".encode("utf-8")).hexdigest()[:32]
+            no_modificada = respuesta_no_modificada(request, etag_base, resultado["last_modified"])
+            if no_modificada is not None:
+                return no_modificada
+            
             response_content = {
                 "success": True,
-                "timestamp": datetime.now().isoformat(),
+                # Momento de obtención de los datos: el cuerpo es estable para un mismo ETag (por eso
+                # no incluye la carpeta de la ejecución, distinta en cada ejecución con el mismo contenido)
+                "timestamp": datetime.fromtimestamp(resultado["last_modified"]).isoformat(),
                 "total_licitaciones": resultado["total_licitaciones"],
-                "carpeta_salida": resultado.get("output_folder", ""),
                 "fecha_desde": resultado.get("fecha_desde"),
                 "fecha_hasta": resultado.get("fecha_hasta"),
+                "completo": resultado.get("completo", True),
                 "licitaciones": resultado["licitaciones"]
             }
+            if not response_content["completo"]:
+                response_content["paginas_completadas"] = resultado.get("paginas")
+            response_content.update(extras)
             
             # Solo incluir códigos CPV si se especificaron
             if cpv_list:
@@ -163,9 +617,37 @@ async def obtener_licitaciones(
             else:
                 response_content["filtro_cpv"] = "ninguno"
             
-            return JSONResponse(
+            return construir_respuesta(
+                request,
+                response_content,
                 status_code=200,
-                content=response_content
+                etag_base=etag_base,
+                last_modified=resultado["last_modified"]
+            )
+        elif resultado.get("circuito_abierto"):
+            # Portal caído: fallar rápido sin abrir navegador e indicar cuándo reintentar
+            raise HTTPException(
+                status_code=503,
+                detail={
+                    "success": False,
+                    "error": resultado["error"],
+                    "reintentar_en": resultado["reintentar_en"],
+                    "timestamp": datetime.now().isoformat()
+                },
+                headers={"Retry-After": str(resultado["reintentar_en"])}
+            )
+        elif resultado.get("cancelado"):
+            # Plazo agotado (504) o cliente desconectado (la respuesta ya no llega a nadie)
+            logger.warning(f"⚠ Extracción de {clave} cancelada: {resultado['motivo']}")
+            raise HTTPException(
+                status_code=504,
+                detail={
+                    "success": False,
+                    "error": resultado["error"],
+                    "paginas_completadas": resultado.get("paginas", 0),
+                    "reanudable": bool(resultado.get("paginas")),
+                    "timestamp": datetime.now().isoformat()
+                }
             )
         else:
             logger.error(f"✗ Error en scraping: {resultado.get('error', 'Error desconocido')}")
@@ -174,9 +656,13 @@ async def obtener_licitaciones(
                 detail={
                     "success": False,
                     "error": resultado.get("error", "Error al ejecutar el scraping"),
+                    "perfil": resultado.get("perfil"),
                     "timestamp": datetime.now().isoformat()
                 }
             )
+    
+    except HTTPException:
+        raise
             
     except Exception as e:
         error_msg = str(e)
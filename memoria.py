@@ -0,0 +1,149 @@
+"""
+Vigilancia de memoria del navegador
+Mide el RSS del árbol de procesos de ChromeDriver/Chrome para reciclar la
+sesión en paginaciones largas antes de que el contenedor se quede sin memoria.
+Usa psutil si está instalado y, si no, /proc (solo Linux)
+"""
+
+import os
+from typing import Dict, List, Optional
+
+from config import BROWSER_RSS_MAX_MB, BROWSER_RECICLAR_PAGINAS
+from logger import setup_logger
+
+logger = setup_logger(__name__)
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+
+def _rss_arbol_psutil(pid: int) -> Optional[int]:
+    try:
+        raiz = psutil.Process(pid)
+        procesos = [raiz] + raiz.children(recursive=True)
+    except psutil.Error:
+        return None
+    total = 0
+    for proceso in procesos:
+        try:
+            total += proceso.memory_info().rss
+        except psutil.Error:
+            pass
+    return total
+
+
+def _rss_arbol_proc(pid: int) -> Optional[int]:
+    if not os.path.isdir("/proc"):
+        return None
+    hijos: Dict[int, List[int]] = {}
+    rss: Dict[int, int] = {}
+    tamano_pagina = os.sysconf("SC_PAGE_SIZE")
+    for entrada in os.listdir("/proc"):
+        if not entrada.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entrada}/stat", "r") as f:
+                # Los campos tras el nombre del proceso: estado, ppid, ..., rss (páginas) en la posición 21
+                campos = f.read().rsplit(")", 1)[1].split()
+        except (OSError, IndexError):
+            continue
+        hijos.setdefault(int(campos[1]), []).append(int(entrada))
+        rss[int(entrada)] = int(campos[21]) * tamano_pagina
+
+    if pid not in rss:
+        return None
+    total, pendientes = 0, [pid]
+    while pendientes:
+        actual = pendientes.pop()
+        total += rss.get(actual, 0)
+        pendientes.extend(hijos.get(actual, []))
+    return total
+
+
+def rss_arbol(pid: int) -> Optional[int]:
+    """
+    RSS total en bytes de un proceso y todos sus descendientes
+
+    Suma el RSS de cada proceso, por lo que cuenta varias veces las páginas
+    compartidas: es una cota superior, suficiente como marca de agua.
+    """
+    if psutil is not None:
+        return _rss_arbol_psutil(pid)
+    return _rss_arbol_proc(pid)
+
+
+def _rss_propio() -> Optional[int]:
+    if psutil is not None:
+        return psutil.Process().memory_info().rss
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def rss_descendientes() -> Optional[int]:
+    """RSS total en bytes de los procesos hijos de este (navegadores lanzados por el proceso)"""
+    total, propio = rss_arbol(os.getpid()), _rss_propio()
+    if total is None or propio is None:
+        return None
+    return max(0, total - propio)
+
+
+class MonitorMemoria:
+    """Muestrea el árbol de procesos del driver y decide cuándo reciclar la sesión"""
+
+    def __init__(self, max_mb: int = BROWSER_RSS_MAX_MB, max_paginas: int = BROWSER_RECICLAR_PAGINAS):
+        self.max_mb = max_mb
+        self.max_paginas = max_paginas
+        self.pico_mb = 0.0
+        self.ultima_mb = None
+        self.reciclajes = 0
+        self.paginas_sesion = 0  # Páginas procesadas con el navegador actual
+
+    def muestrear(self, driver=None) -> Optional[float]:
+        """
+        RSS actual del navegador en MB (None si no se puede medir)
+
+        Sin driver (backend Playwright, un Chromium compartido) se mide el de
+        todos los procesos hijos.
+        """
+        if driver is None:
+            rss = rss_descendientes()
+        else:
+            try:
+                pid = driver.service.process.pid
+            except AttributeError:
+                return None
+            rss = rss_arbol(pid)
+        if rss is None:
+            return None
+        self.ultima_mb = rss / (1024 * 1024)
+        self.pico_mb = max(self.pico_mb, self.ultima_mb)
+        return self.ultima_mb
+
+    def pagina_procesada(self, driver) -> bool:
+        """Registra una página procesada; True si conviene reciclar el navegador"""
+        self.paginas_sesion += 1
+        rss_mb = self.muestrear(driver)
+        if self.max_mb and rss_mb is not None and rss_mb >= self.max_mb:
+            logger.warning(f"⚠ Navegador en {rss_mb:.0f} MB (límite {self.max_mb} MB): se recicla la sesión")
+            return True
+        if self.max_paginas and self.paginas_sesion >= self.max_paginas:
+            logger.info(f"Navegador con {self.paginas_sesion} páginas procesadas: se recicla la sesión")
+            return True
+        return False
+
+    def sesion_reciclada(self) -> None:
+        self.reciclajes += 1
+        self.paginas_sesion = 0
+
+    def resumen(self) -> Dict:
+        return {
+            "memoria_pico_mb": round(self.pico_mb, 1),
+            "memoria_ultima_mb": round(self.ultima_mb, 1) if self.ultima_mb is not None else None,
+            "reciclajes": self.reciclajes,
+            "medicion": "psutil" if psutil is not None else "/proc",
+        }
@@ -0,0 +1,504 @@
+"""
+Resolución y perfil de Chrome/ChromeDriver
+Se resuelve una sola vez por proceso (variable de entorno, PATH, caché de
+webdriver-manager y, como último recurso, descarga con webdriver-manager) para
+que abrir un navegador sea solo el coste de arrancar Chrome. También define el
+perfil ligero (bloqueo de recursos), los perfiles con caché de disco persistente
+y las métricas de red por ejecución
+"""
+
+import glob
+import json
+import os
+import re
+import shutil
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from typing import Dict, List, Optional
+
+from config import (
+    CHROMEDRIVER_PATH, CHROME_BINARY, WDM_CACHE_DIR,
+    BROWSER_PERFIL, BROWSER_BLOCKED_URLS, BROWSER_PAGE_LOAD_STRATEGY, BROWSER_METRICAS,
+    BROWSER_CACHE_DIR, BROWSER_CACHE_SLOTS, BROWSER_CACHE_MAX_MB, BROWSER_CACHE_RESET_HORAS,
+    OUTPUT_DIR,
+)
+from bloqueos import bloquear_archivo
+from logger import setup_logger
+
+logger = setup_logger(__name__)
+
+_NOMBRE_DRIVER = "chromedriver.exe" if sys.platform.startswith("win") else "chromedriver"
+
+# Ejecutables de Chrome/Chromium buscados en el PATH
+_EJECUTABLES_CHROME = ["google-chrome", "google-chrome-stable", "chromium", "chromium-browser", "chrome"]
+
+# Rutas de instalación habituales fuera del PATH
+_RUTAS_CHROME = [
+    r"C:\Program Files\Google\Chrome\Application\chrome.exe",
+    r"C:\Program Files (x86)\Google\Chrome\Application\chrome.exe",
+    os.path.expandvars(r"%LOCALAPPDATA%\Google\Chrome\Application\chrome.exe"),
+    "/Applications/Google Chrome.app/Contents/MacOS/Google Chrome",
+    "/opt/google/chrome/chrome",
+    "/usr/lib/chromium/chromium",
+    "/snap/bin/chromium",
+]
+
+_resolucion = None
+_lock = threading.Lock()
+
+
+def _version(ejecutable: str) -> Optional[str]:
+    """Obtiene la versión de un ejecutable con --version (None si falla)"""
+    try:
+        resultado = subprocess.run([ejecutable, "--version"], capture_output=True, text=True, timeout=10)
+    except Exception:
+        return None
+    coincidencia = re.search(r"\d+(\.\d+)+", resultado.stdout or "")
+    return coincidencia.group(0) if coincidencia else None
+
+
+def _major(version: Optional[str]) -> Optional[str]:
+    return version.split(".", 1)[0] if version else None
+
+
+def buscar_chrome() -> Optional[str]:
+    """Busca el binario de Chrome/Chromium (CHROME_BINARY, PATH o rutas habituales)"""
+    if CHROME_BINARY:
+        return CHROME_BINARY if os.path.exists(CHROME_BINARY) else None
+
+    for nombre in _EJECUTABLES_CHROME:
+        ruta = shutil.which(nombre)
+        if ruta:
+            return ruta
+
+    for ruta in _RUTAS_CHROME:
+        if os.path.exists(ruta):
+            return ruta
+    return None
+
+
+def directorios_cache_wdm() -> List[str]:
+    """Directorios donde webdriver-manager guarda ChromeDriver"""
+    return [os.path.join(WDM_CACHE_DIR, "drivers", "chromedriver")]
+
+
+def buscar_driver_en_cache(version_chrome: Optional[str] = None) -> Optional[str]:
+    """
+    Busca ChromeDriver en la caché de webdriver-manager
+
+    Prefiere un driver cuya versión mayor coincida con la de Chrome; si no hay
+    ninguno, devuelve el más reciente.
+    """
+    candidatos = []
+    for base in directorios_cache_wdm():
+        patron = os.path.join(base, "**", _NOMBRE_DRIVER)
+        candidatos.extend(ruta for ruta in glob.glob(patron, recursive=True) if os.access(ruta, os.X_OK))
+
+    if not candidatos:
+        return None
+
+    major_chrome = _major(version_chrome)
+    if major_chrome:
+        # La ruta de la caché incluye la versión: .../linux64/120.0.6099.109/...
+        compatibles = [ruta for ruta in candidatos if re.search(rf"[\\/]{major_chrome}\.\d+", ruta)]
+        if compatibles:
+            candidatos = compatibles
+
+    return max(candidatos, key=os.path.getmtime)
+
+
+def _resolver(descargar: bool = True) -> Dict:
+    chrome = buscar_chrome()
+    version_chrome = _version(chrome) if chrome else None
+
+    driver, origen = None, None
+    if CHROMEDRIVER_PATH:
+        if os.path.exists(CHROMEDRIVER_PATH):
+            driver, origen = CHROMEDRIVER_PATH, "CHROMEDRIVER_PATH"
+        else:
+            logger.warning(f"CHROMEDRIVER_PATH no existe: {CHROMEDRIVER_PATH}")
+
+    if driver is None:
+        ruta = shutil.which(_NOMBRE_DRIVER)
+        if ruta:
+            driver, origen = ruta, "PATH"
+
+    if driver is None:
+        ruta = buscar_driver_en_cache(version_chrome)
+        if ruta:
+            driver, origen = ruta, "cache webdriver-manager"
+
+    if driver is None and descargar:
+        # Último recurso: requiere red para consultar versiones y descargar
+        try:
+            from webdriver_manager.chrome import ChromeDriverManager
+            driver, origen = ChromeDriverManager().install(), "descarga webdriver-manager"
+        except Exception as e:
+            logger.error(f"No se pudo obtener ChromeDriver con webdriver-manager: {e}")
+
+    version_driver = _version(driver) if driver else None
+    return {
+        "chrome": chrome,
+        "version_chrome": version_chrome,
+        "driver": driver,
+        "version_driver": version_driver,
+        "origen_driver": origen,
+        "versiones_compatibles": (
+            _major(version_chrome) == _major(version_driver)
+            if version_chrome and version_driver else None
+        ),
+    }
+
+
+def resolver_navegador(descargar: bool = True) -> Dict:
+    """
+    Resuelve Chrome y ChromeDriver una sola vez por proceso
+
+    descargar: False no recurre a webdriver-manager (red); si así no hay
+    driver, el resultado no se guarda y el primer scraping vuelve a resolver
+
+    Returns:
+        dict con 'chrome', 'version_chrome', 'driver', 'version_driver',
+        'origen_driver' y 'versiones_compatibles'
+    """
+    global _resolucion
+    if _resolucion is None:
+        with _lock:
+            if _resolucion is None:
+                resolucion = _resolver(descargar)
+                if resolucion["driver"] is None and not descargar:
+                    return resolucion
+                _resolucion = resolucion
+    return _resolucion
+
+
+def preflight(descargar: bool = True) -> Dict:
+    """Resuelve el navegador y registra un informe; pensado para el arranque del proceso"""
+    resolucion = resolver_navegador(descargar)
+
+    logger.info("=" * 80)
+    logger.info("PREFLIGHT DEL NAVEGADOR")
+    logger.info("=" * 80)
+    logger.info(f"Chrome: {resolucion['chrome'] or 'no encontrado (se usará el de Selenium)'}"
+                f"{' (' + resolucion['version_chrome'] + ')' if resolucion['version_chrome'] else ''}")
+    if resolucion["driver"]:
+        logger.info(f"ChromeDriver: {resolucion['driver']} [{resolucion['origen_driver']}]"
+                    f"{' (' + resolucion['version_driver'] + ')' if resolucion['version_driver'] else ''}")
+    elif not descargar:
+        logger.warning("⚠ ChromeDriver no encontrado localmente: se resolverá (con descarga) en el primer scraping")
+    else:
+        logger.error("✗ ChromeDriver no disponible: define CHROMEDRIVER_PATH o instálalo en el PATH")
+    if resolucion["versiones_compatibles"] is False:
+        logger.warning("⚠ La versión mayor de ChromeDriver no coincide con la de Chrome")
+
+    return resolucion
+
+
+# Patrones bloqueados por el perfil ligero (DevTools Network.setBlockedURLs)
+PATRONES_BLOQUEO_LIGERO = [
+    # Imágenes
+    "*.png", "*.jpg", "*.jpeg", "*.gif", "*.webp", "*.svg", "*.ico", "*.bmp",
+    # Fuentes
+    "*.woff", "*.woff2", "*.ttf", "*.otf", "*.eot",
+    # Multimedia
+    "*.mp4", "*.webm", "*.mp3", "*.ogg", "*.wav", "*.avi",
+    # Analítica y terceros
+    "*google-analytics.com*", "*googletagmanager.com*", "*doubleclick.net*",
+    "*hotjar.com*", "*facebook.net*", "*clarity.ms*",
+]
+
+
+def patrones_bloqueo() -> List[str]:
+    """Patrones de URL a bloquear según el perfil configurado"""
+    if BROWSER_PERFIL != "ligero":
+        return list(BROWSER_BLOCKED_URLS)
+    return PATRONES_BLOQUEO_LIGERO + BROWSER_BLOCKED_URLS
+
+
+def configurar_opciones_perfil(chrome_options) -> None:
+    """Aplica a las opciones de Chrome el perfil de rendimiento y el registro de red"""
+    if BROWSER_PERFIL == "ligero":
+        chrome_options.add_experimental_option("prefs", {
+            "profile.managed_default_content_settings.images": 2,
+            "profile.managed_default_content_settings.notifications": 2,
+            "profile.managed_default_content_settings.geolocation": 2,
+        })
+        chrome_options.add_argument("--blink-settings=imagesEnabled=false")
+        chrome_options.add_argument("--disable-features=Translate,MediaRouter,OptimizationHints")
+        chrome_options.add_argument("--autoplay-policy=user-gesture-required")
+        # eager: el DOM está listo sin esperar a recursos secundarios; el scraper ya espera a los elementos
+        chrome_options.page_load_strategy = BROWSER_PAGE_LOAD_STRATEGY
+
+    if BROWSER_METRICAS:
+        chrome_options.set_capability("goog:loggingPrefs", {"performance": "ALL"})
+
+
+def activar_bloqueo(driver) -> None:
+    """Activa el bloqueo de URLs por DevTools en un driver ya creado"""
+    patrones = patrones_bloqueo()
+    if not patrones:
+        return
+    try:
+        driver.execute_cdp_cmd("Network.enable", {})
+        driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": patrones})
+        logger.info(f"✓ Perfil {BROWSER_PERFIL}: {len(patrones)} patrones de URL bloqueados")
+    except Exception as e:
+        logger.warning(f"No se pudo activar el bloqueo de URLs por DevTools: {e}")
+
+
+def _tamano_directorio(ruta: str) -> int:
+    total = 0
+    for raiz, _, archivos in os.walk(ruta):
+        for nombre in archivos:
+            try:
+                total += os.path.getsize(os.path.join(raiz, nombre))
+            except OSError:
+                pass
+    return total
+
+
+class PerfilCache:
+    """
+    Perfil de Chrome con caché de disco persistente entre ejecuciones
+
+    Hay BROWSER_CACHE_SLOTS perfiles; cada navegador bloquea uno libre (Chrome no
+    permite compartir un user-data-dir entre procesos) y lo libera al cerrarse.
+    El perfil se reinicia cuando supera BROWSER_CACHE_RESET_HORAS o excede
+    holgadamente BROWSER_CACHE_MAX_MB.
+    """
+
+    def __init__(self, slot: int, ruta: str, archivo_lock):
+        self.slot = slot
+        self.ruta = ruta
+        self._archivo_lock = archivo_lock
+        self.reiniciado = False
+
+    @classmethod
+    def adquirir(cls) -> Optional["PerfilCache"]:
+        """Bloquea un perfil libre; None si la caché está desactivada o todos están ocupados"""
+        if not BROWSER_CACHE_DIR:
+            return None
+        os.makedirs(BROWSER_CACHE_DIR, exist_ok=True)
+        for slot in range(BROWSER_CACHE_SLOTS):
+            archivo_lock = open(os.path.join(BROWSER_CACHE_DIR, f"slot_{slot}.lock"), "a+")
+            if bloquear_archivo(archivo_lock):
+                perfil = cls(slot, os.path.join(BROWSER_CACHE_DIR, f"slot_{slot}"), archivo_lock)
+                perfil._mantenimiento()
+                logger.info(f"✓ Perfil con caché persistente: {perfil.ruta}")
+                return perfil
+            archivo_lock.close()
+        logger.warning("⚠ Todos los perfiles con caché están en uso; se usa un perfil temporal")
+        return None
+
+    def _mantenimiento(self) -> None:
+        """Reinicia el perfil si es demasiado antiguo o grande"""
+        marca = os.path.join(self.ruta, ".creado")
+        if os.path.exists(marca):
+            edad_horas = (time.time() - os.path.getmtime(marca)) / 3600
+            tamano_mb = _tamano_directorio(self.ruta) / (1024 * 1024)
+            if edad_horas > BROWSER_CACHE_RESET_HORAS or tamano_mb > BROWSER_CACHE_MAX_MB * 1.5:
+                logger.info(f"Reiniciando perfil {self.slot} ({edad_horas:.0f} h, {tamano_mb:.0f} MB)")
+                shutil.rmtree(self.ruta, ignore_errors=True)
+                self.reiniciado = True
+        os.makedirs(self.ruta, exist_ok=True)
+        if not os.path.exists(marca):
+            with open(marca, "w") as f:
+                f.write(str(time.time()))
+
+    def aplicar(self, chrome_options) -> None:
+        """Añade a las opciones de Chrome el directorio de perfil y la caché de disco"""
+        chrome_options.add_argument(f"--user-data-dir={os.path.join(self.ruta, 'perfil')}")
+        chrome_options.add_argument(f"--disk-cache-dir={os.path.join(self.ruta, 'cache')}")
+        chrome_options.add_argument(f"--disk-cache-size={BROWSER_CACHE_MAX_MB * 1024 * 1024}")
+
+    def liberar(self) -> None:
+        if self._archivo_lock is not None:
+            self._archivo_lock.close()
+            self._archivo_lock = None
+
+
+def latencia_documento(driver) -> Optional[tuple]:
+    """
+    Latencia del servidor (TTFB) del documento actual según Navigation Timing
+
+    Returns:
+        (origen, ms): `origen` identifica el documento para no contar dos veces la
+        misma carga; None si no se puede medir
+    """
+    try:
+        medida = driver.execute_script(
+            "const n = performance.getEntriesByType('navigation')[0];"
+            "return n ? [performance.timeOrigin, n.responseStart - n.requestStart] : null;"
+        )
+    except Exception:
+        return None
+    if not medida or medida[1] is None or medida[1] <= 0:
+        return None
+    return medida[0], medida[1]
+
+
+def _content_length(cabeceras: Dict) -> int:
+    """Content-Length de unas cabeceras de DevTools (sin distinguir mayúsculas); 0 si falta"""
+    for nombre, valor in cabeceras.items():
+        if nombre.lower() == "content-length":
+            try:
+                return int(valor)
+            except (TypeError, ValueError):
+                return 0
+    return 0
+
+
+# Bytes por URL de los recursos descargados en ejecuciones anteriores. Una petición bloqueada no
+# llega a enviarse, así que su tamaño solo se conoce si alguna ejecución sin bloqueo (p. ej.
+# BROWSER_PERFIL=normal) descargó esa misma URL: el ahorro en bytes es una estimación con esa tabla
+TAMANOS_RECURSOS = os.path.join(OUTPUT_DIR, "tamanos_recursos.json")
+
+
+def _cargar_tamanos(ruta: str) -> Dict[str, int]:
+    try:
+        with open(ruta, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+class MetricasRed:
+    """Acumula peticiones, bytes, aciertos de caché y tiempos de carga a partir del log de rendimiento de Chrome"""
+
+    def __init__(self, ruta_tamanos: Optional[str] = None):
+        self.peticiones = 0
+        self.bloqueadas = 0
+        self.fallidas = 0
+        self.bytes_transferidos = 0
+        self.bloqueadas_por_tipo = {}
+        self.respuestas = 0
+        self.ids_cache = set()  # requestId servidos desde caché: Chrome puede notificar el mismo acierto dos veces
+        self.bytes_desde_cache = 0
+        self.cargas = []
+        self.cache_persistente = False
+        self.ruta_tamanos = ruta_tamanos or TAMANOS_RECURSOS
+        self.urls = {}  # requestId -> URL
+        self.urls_bloqueadas = []
+        self.tamanos_observados = {}  # URL -> bytes transferidos en esta ejecución
+        self._tamanos_conocidos = None
+
+    def registrar_bloqueada(self, url: Optional[str], tipo: str) -> None:
+        self.bloqueadas += 1
+        self.bloqueadas_por_tipo[tipo] = self.bloqueadas_por_tipo.get(tipo, 0) + 1
+        if url:
+            self.urls_bloqueadas.append(url)
+
+    def registrar_tamano(self, url: Optional[str], tamano: int) -> None:
+        """Anota los bytes de un recurso descargado (los aciertos de caché, ~0 bytes, no cuentan)"""
+        if url and tamano > 0:
+            self.tamanos_observados[url] = tamano
+
+    def registrar_carga(self, driver, etiqueta: str) -> None:
+        """Registra los tiempos de navegación del documento actual (Navigation Timing)"""
+        if driver is None:
+            return
+        try:
+            tiempos = driver.execute_script(
+                "const n = performance.getEntriesByType('navigation')[0];"
+                "return n ? [n.domContentLoadedEventEnd, n.loadEventEnd] : null;"
+            )
+        except Exception:
+            return
+        if tiempos:
+            self.cargas.append({
+                "pagina": etiqueta,
+                "dom_ms": round(tiempos[0] or 0, 1),
+                "load_ms": round(tiempos[1] or 0, 1),
+            })
+
+    def recoger(self, driver) -> None:
+        """Vacía el log de rendimiento del driver y acumula sus eventos (llamar tras cada página)"""
+        if not BROWSER_METRICAS or driver is None:
+            return
+        try:
+            entradas = driver.get_log("performance")
+        except Exception:
+            return
+
+        for entrada in entradas:
+            try:
+                mensaje = json.loads(entrada["message"])["message"]
+            except (KeyError, ValueError):
+                continue
+            metodo = mensaje.get("method")
+            params = mensaje.get("params", {})
+            if metodo == "Network.requestWillBeSent":
+                self.peticiones += 1
+                self.urls[params.get("requestId")] = params.get("request", {}).get("url")
+            elif metodo == "Network.responseReceived":
+                self.respuestas += 1
+                respuesta = params.get("response", {})
+                if respuesta.get("fromDiskCache") or params.get("requestId") in self.ids_cache:
+                    self.ids_cache.add(params.get("requestId"))
+                    # encodedDataLength de un acierto es ~0: el tamaño evitado es el Content-Length original
+                    self.bytes_desde_cache += _content_length(respuesta.get("headers", {}))
+            elif metodo == "Network.requestServedFromCache":
+                self.ids_cache.add(params.get("requestId"))
+            elif metodo == "Network.loadingFinished":
+                tamano = int(params.get("encodedDataLength") or 0)
+                self.bytes_transferidos += tamano
+                if params.get("requestId") not in self.ids_cache:
+                    self.registrar_tamano(self.urls.get(params.get("requestId")), tamano)
+            elif metodo == "Network.loadingFailed":
+                if params.get("blockedReason"):
+                    self.registrar_bloqueada(self.urls.get(params.get("requestId")), params.get("type", "Other"))
+                else:
+                    self.fallidas += 1
+
+    @property
+    def respuestas_cache(self) -> int:
+        return len(self.ids_cache)
+
+    def _ahorro_estimado(self) -> Dict:
+        """Bytes que habrían costado las peticiones bloqueadas, según los tamaños ya conocidos de cada URL"""
+        if self._tamanos_conocidos is None:
+            self._tamanos_conocidos = _cargar_tamanos(self.ruta_tamanos)
+        conocidos = {**self._tamanos_conocidos, **self.tamanos_observados}
+        tamanos = [conocidos.get(url) for url in self.urls_bloqueadas]
+        estimados = [t for t in tamanos if t]
+        return {
+            "bytes_ahorrados_estimados": sum(estimados) if estimados else None,
+            "bloqueadas_sin_tamano": len(tamanos) - len(estimados),
+        }
+
+    def guardar_tamanos(self) -> None:
+        """Añade los tamaños observados en esta ejecución a la tabla compartida (la última escritura gana)"""
+        if not self.tamanos_observados:
+            return
+        tamanos = _cargar_tamanos(self.ruta_tamanos)
+        tamanos.update(self.tamanos_observados)
+        temporal = f"{self.ruta_tamanos}.{uuid.uuid4().hex[:8]}.tmp"
+        try:
+            with open(temporal, "w", encoding="utf-8") as f:
+                json.dump(tamanos, f, ensure_ascii=False)
+            os.replace(temporal, self.ruta_tamanos)
+        except OSError as e:
+            logger.warning(f"No se pudo guardar la tabla de tamaños de recursos: {e}")
+
+    def resumen(self) -> Dict:
+        tiempos_dom = [c["dom_ms"] for c in self.cargas if c["dom_ms"]]
+        return {
+            "perfil": BROWSER_PERFIL,
+            "cache_persistente": self.cache_persistente,
+            "respuestas": self.respuestas,
+            "respuestas_desde_cache": self.respuestas_cache,
+            "ratio_aciertos_cache": round(min(1.0, self.respuestas_cache / self.respuestas), 3) if self.respuestas else None,
+            "bytes_desde_cache": self.bytes_desde_cache,
+            "carga_media_dom_ms": round(sum(tiempos_dom) / len(tiempos_dom), 1) if tiempos_dom else None,
+            "cargas": list(self.cargas),
+            "peticiones": self.peticiones,
+            "peticiones_bloqueadas": self.bloqueadas,
+            "peticiones_fallidas": self.fallidas,
+            "bloqueadas_por_tipo": dict(self.bloqueadas_por_tipo),
+            "peticiones_ahorradas": self.bloqueadas,
+            **self._ahorro_estimado(),
+            "bytes_transferidos": self.bytes_transferidos,
+        }
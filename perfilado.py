@@ -0,0 +1,147 @@
+"""
+Perfilado bajo demanda de una extracción
+Con /licitaciones?perfilar=true la extracción de esa petición se ejecuta bajo
+cProfile y en su carpeta de salida se guardan el perfil (perfil.prof, para
+pstats o snakeviz), las funciones más costosas (perfil.txt) y el reparto del
+tiempo entre CPU y espera (perfil.json): pausas (time.sleep), red/IPC con el
+navegador (sockets, select) y turnos del gobernador de cortesía.
+
+Sin el parámetro no se instala ningún profiler: el coste es una comprobación.
+"""
+
+import cProfile
+import io
+import json
+import os
+import pstats
+import threading
+import time
+import uuid
+from datetime import datetime
+from typing import Dict, Optional
+
+from config import OUTPUT_DIR
+from cortesia import gobernador
+from logger import setup_logger
+
+logger = setup_logger(__name__)
+
+FUNCIONES_LISTADO = 40  # Funciones en perfil.txt (por tiempo acumulado)
+
+# Un solo perfil a la vez en el proceso: en el bucle de eventos un segundo perfil desplazaría al
+# primero, y desde Python 3.12 cProfile usa sys.monitoring (global) y falla con dos perfiles activos
+_perfil_activo = threading.Lock()
+
+# Funciones nativas en las que el hilo espera en lugar de ejecutar Python
+_ESPERAS = {
+    "pausas_s": ("time.sleep",),
+    "red_s": ("_socket.socket", "select.", "_ssl._SSLSocket"),
+}
+
+
+class PerfilOcupado(RuntimeError):
+    """Ya hay una extracción perfilada en curso en el proceso"""
+
+
+def _clasificar_esperas(estadisticas: pstats.Stats) -> Dict[str, float]:
+    """Tiempo propio de las funciones de espera conocidas, por categoría"""
+    totales = {categoria: 0.0 for categoria in _ESPERAS}
+    for (_, _, funcion), (_, _, tiempo_propio, _, _) in estadisticas.stats.items():
+        for categoria, marcas in _ESPERAS.items():
+            if any(marca in funcion for marca in marcas):
+                totales[categoria] += tiempo_propio
+                break
+    return {categoria: round(segundos, 3) for categoria, segundos in totales.items()}
+
+
+class PerfilPeticion:
+    """Perfil de una extracción: cProfile más tiempos de pared y de CPU del hilo que la ejecuta"""
+
+    def __init__(self):
+        self.perfil = cProfile.Profile()
+        self.pared = 0.0
+        self.cpu = 0.0
+        self.espera_cortesia = 0.0
+        self.aislado = True  # False si el hilo compartía trabajo con otras peticiones (bucle de eventos)
+
+    def _medir(self):
+        return time.perf_counter(), time.thread_time(), gobernador.espera_acumulada
+
+    def _acumular(self, inicio):
+        pared, cpu, cortesia = self._medir()
+        self.pared += pared - inicio[0]
+        self.cpu += cpu - inicio[1]
+        # Contador del proceso: con otras extracciones simultáneas es una cota superior
+        self.espera_cortesia += cortesia - inicio[2]
+
+    def _reservar(self) -> None:
+        if not _perfil_activo.acquire(blocking=False):
+            raise PerfilOcupado("Ya hay una extracción perfilada en curso; reintenta cuando termine")
+
+    def ejecutar(self, funcion, *args, **kwargs):
+        """
+        Ejecuta `funcion` perfilada en el hilo actual (p. ej. uno del pool de la API)
+
+        Lanza PerfilOcupado si ya hay otro perfil activo en el proceso.
+        """
+        self._reservar()
+        inicio = self._medir()
+        self.perfil.enable()
+        try:
+            return funcion(*args, **kwargs)
+        finally:
+            self.perfil.disable()
+            self._acumular(inicio)
+            _perfil_activo.release()
+
+    async def ejecutar_async(self, funcion, *args, **kwargs):
+        """
+        Espera la corrutina de `funcion` perfilando el bucle de eventos
+
+        El perfil y la CPU incluyen lo que hagan a la vez otras peticiones del
+        mismo bucle; el resumen lo indica con aislado=False. Lanza
+        PerfilOcupado si ya hay otro perfil activo en el proceso.
+        """
+        self._reservar()
+        self.aislado = False
+        inicio = self._medir()
+        self.perfil.enable()
+        try:
+            return await funcion(*args, **kwargs)
+        finally:
+            self.perfil.disable()
+            self._acumular(inicio)
+            _perfil_activo.release()
+
+    def resumen(self, estadisticas: Optional[pstats.Stats] = None) -> Dict:
+        estadisticas = estadisticas or pstats.Stats(self.perfil)
+        return {
+            "pared_s": round(self.pared, 3),
+            "cpu_s": round(self.cpu, 3),
+            "espera_s": round(max(0.0, self.pared - self.cpu), 3),
+            **_clasificar_esperas(estadisticas),
+            "cortesia_s": round(self.espera_cortesia, 3),
+            "aislado": self.aislado,
+        }
+
+    def guardar(self, carpeta: Optional[str] = None) -> Dict:
+        """Escribe perfil.prof, perfil.txt y perfil.json en la carpeta de la ejecución y devuelve el resumen"""
+        if not carpeta or not os.path.isdir(carpeta):
+            marca = f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:8]}"
+            carpeta = os.path.join(OUTPUT_DIR, "perfiles", marca)
+            os.makedirs(carpeta, exist_ok=True)
+
+        self.perfil.dump_stats(os.path.join(carpeta, "perfil.prof"))
+        texto = io.StringIO()
+        estadisticas = pstats.Stats(self.perfil, stream=texto)
+        estadisticas.sort_stats("cumulative").print_stats(FUNCIONES_LISTADO)
+        with open(os.path.join(carpeta, "perfil.txt"), "w", encoding="utf-8") as f:
+            f.write(texto.getvalue())
+
+        resumen = self.resumen(estadisticas)
+        resumen["carpeta"] = carpeta
+        with open(os.path.join(carpeta, "perfil.json"), "w", encoding="utf-8") as f:
+            json.dump(resumen, f, ensure_ascii=False, indent=2)
+        logger.info(f"✓ Perfil guardado en {carpeta}: {resumen['pared_s']} s de pared, {resumen['cpu_s']} s de CPU, "
+                    f"{resumen['pausas_s']} s en pausas, {resumen['red_s']} s en red")
+        return resumen
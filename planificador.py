@@ -0,0 +1,155 @@
+"""
+Planificador de consultas
+Antes de abrir el navegador comprueba qué días del rango pedido ya están
+cubiertos por resultados almacenados (particiones de la cola, backfill,
+consultas programadas o consultas anteriores de varios días) y solo extrae del
+portal los fragmentos que faltan; el resultado se compone en el almacén a
+partir de todas las partes. De un resultado de varios días se toman las filas
+de cada día por su fecha de publicación (columna fecha).
+
+Las filas del portal no indican su CPV, así que un día con filtro CPV solo se
+cubre con resultados que incluyen ese día filtrados por subconjuntos de los CPV
+pedidos (p. ej. 48000000 y 72000000 por separado cubren "48000000,72000000"); un
+resultado sin filtro CPV solo cubre consultas sin filtro. Si faltan algunos
+CPV de un día, se extraen solo esos.
+"""
+
+from typing import Dict, List, Optional
+
+import almacen
+from cola import particiones_diarias
+from config import PLANIFICADOR_MAX_EDAD, SCRAPER_BACKEND
+from logger import setup_logger
+
+logger = setup_logger(__name__)
+
+
+def _cubrir_dia(cpv: Optional[List[str]], resultados: List[Dict]):
+    """Elige resultados de un día para la consulta; devuelve (claves, CPV que faltan o None si falta todo)"""
+    recientes = sorted(resultados, key=lambda meta: meta["creado"], reverse=True)
+    if cpv is None:
+        for meta in recientes:
+            if meta["cpv_codes"] is None:
+                return [meta["clave"]], []
+        return [], None
+
+    pedidos = set(cpv)
+    # Primero los que más CPV aportan; a igualdad, el más reciente
+    candidatos = [meta for meta in recientes if meta["cpv_codes"] and set(meta["cpv_codes"]) <= pedidos]
+    candidatos.sort(key=lambda meta: len(meta["cpv_codes"]), reverse=True)
+    claves, cubiertos = [], set()
+    for meta in candidatos:
+        if not set(meta["cpv_codes"]) <= cubiertos:
+            claves.append(meta["clave"])
+            cubiertos |= set(meta["cpv_codes"])
+    faltan = sorted(pedidos - cubiertos)
+    return claves, (faltan if len(faltan) < len(pedidos) else None)
+
+
+def planificar(cpv_codes: Optional[List[str]], fecha_desde: Optional[str], fecha_hasta: Optional[str],
+               max_edad: Optional[float] = PLANIFICADOR_MAX_EDAD) -> Dict:
+    """
+    Divide una consulta en días servidos del almacén y fragmentos a extraer
+
+    Returns:
+        dict con la clave de la consulta, 'locales' (día y claves de los
+        resultados que lo cubren) y 'fragmentos' (rangos de días consecutivos
+        con los mismos CPV pendientes, cada uno con su clave de consulta)
+    """
+    cpv = almacen.normalizar_cpv(cpv_codes)
+    desde, hasta = almacen.resolver_fechas(fecha_desde, fecha_hasta)
+    dias = [dia for dia, _ in particiones_diarias(desde, hasta)]
+
+    por_dia: Dict[str, List[Dict]] = {}
+    for meta in almacen.resultados_diarios(dias, max_edad):
+        por_dia.setdefault(meta["fecha_desde"], []).append(meta)
+    pedidos = set(dias)
+    for meta in almacen.resultados_multidia(desde, hasta, max_edad):
+        for dia, _ in particiones_diarias(meta["fecha_desde"], meta["fecha_hasta"]):
+            if dia in pedidos:
+                por_dia.setdefault(dia, []).append(meta)
+
+    locales, fragmentos = [], []
+    for indice, dia in enumerate(dias):
+        claves, faltan = _cubrir_dia(cpv, por_dia.get(dia, []))
+        if claves:
+            locales.append({"fecha": dia, "consultas": claves})
+        if faltan == []:
+            continue
+        cpv_fragmento = cpv if faltan is None else faltan
+        anterior = fragmentos[-1] if fragmentos else None
+        # Se extiende el fragmento anterior si acaba el día previo y le faltan los mismos CPV
+        if anterior and anterior["cpv_codes"] == cpv_fragmento and anterior["fecha_hasta"] == dias[indice - 1]:
+            anterior["fecha_hasta"] = dia
+        else:
+            fragmentos.append({"cpv_codes": cpv_fragmento, "fecha_desde": dia, "fecha_hasta": dia})
+
+    for fragmento in fragmentos:
+        fragmento["clave"] = almacen.clave_consulta(fragmento["cpv_codes"], fragmento["fecha_desde"],
+                                                    fragmento["fecha_hasta"])
+
+    return {
+        "consulta": almacen.clave_consulta(cpv, desde, hasta),
+        "cpv_codes": cpv,
+        "fecha_desde": desde,
+        "fecha_hasta": hasta,
+        "locales": locales,
+        "fragmentos": fragmentos,
+    }
+
+
+def ejecutar_plan(plan: Dict, progreso=None) -> Dict:
+    """
+    Extrae los fragmentos pendientes y compone el resultado de la consulta
+
+    Returns:
+        dict como el de ejecutar_scraping, con 'plan' indicando qué días se
+        sirvieron del almacén y qué fragmentos se extrajeron del portal
+    """
+    logger.info(f"Plan de {plan['consulta']}: {len(plan['locales'])} día(s) desde el almacén, "
+                f"{len(plan['fragmentos'])} fragmento(s) a extraer")
+    for fragmento in plan["fragmentos"]:
+        if SCRAPER_BACKEND == "playwright":
+            from scraper_playwright import ejecutar_scraping
+        else:
+            from scraper_selenium import ejecutar_scraping
+
+        clave = fragmento["clave"]
+        if progreso is not None:
+            progreso.fase_actual("fragmento", clave)
+        resultado = ejecutar_scraping(
+            cpv_codes=fragmento["cpv_codes"],
+            fecha_desde=fragmento["fecha_desde"],
+            fecha_hasta=fragmento["fecha_hasta"],
+            reanudar_desde=almacen.obtener_reanudable(clave),
+            progreso=progreso
+        )
+        if not resultado["success"]:
+            if resultado.get("cancelado") and resultado.get("paginas"):
+                # Las páginas ya extraídas del fragmento se reanudan en la siguiente consulta
+                almacen.registrar_reanudable(clave, resultado)
+            return resultado
+        if not resultado.get("completo", True):
+            almacen.registrar_reanudable(clave, resultado)
+            return {"success": False, "error": f"Extracción incompleta de {clave}; se reanudará en la siguiente consulta"}
+        almacen.guardar_resultado(clave, resultado)
+        almacen.borrar_reanudable(clave)
+
+    # Partes en orden cronológico: cada día local y cada fragmento por su primer día.
+    # Los días locales llevan su fecha: si salen de un resultado de varios días, solo se toman sus filas
+    partes = [(local["fecha"], (clave, local["fecha"])) for local in plan["locales"] for clave in local["consultas"]]
+    partes += [(fragmento["fecha_desde"], fragmento["clave"]) for fragmento in plan["fragmentos"]]
+    partes.sort(key=lambda parte: tuple(reversed(parte[0].split("-"))))
+
+    resultado = almacen.fusionar_resultados(plan["consulta"], [parte for _, parte in partes],
+                                            plan["cpv_codes"], plan["fecha_desde"], plan["fecha_hasta"])
+    if resultado is None:
+        return {"success": False, "error": "Una parte almacenada dejó de estar disponible al componer la consulta"}
+
+    resultado["plan"] = {
+        "servido_localmente": plan["locales"],
+        "extraido": plan["fragmentos"],
+    }
+    logger.info(f"✓ Consulta {plan['consulta']} compuesta: {len(plan['locales'])} día(s) locales, "
+                f"{len(plan['fragmentos'])} fragmento(s) extraídos")
+    return resultado
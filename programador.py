@@ -0,0 +1,203 @@
+"""
+Programador diario de consultas
+Ejecuta las consultas programadas (CONSULTAS_PROGRAMADAS, fechas de ayer) a
+SCRAP_TIME y a las horas de SCRAP_TIMES_EXTRA, y deja los resultados en el
+almacén para que /licitaciones los sirva al instante
+"""
+
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+import schedule
+
+import almacen
+import cola
+from bloqueos import bloquear_archivo
+from config import SCRAP_TIME, SCRAP_TIMES_EXTRA, CONSULTAS_PROGRAMADAS, OUTPUT_DIR, SCRAPING_MODO, preparar_directorios
+from logger import setup_logger
+from navegador import preflight
+
+logger = setup_logger(__name__)
+
+# Un resultado programado sigue vigente hasta la siguiente ejecución más este margen (su duración)
+MARGEN_VIGENCIA = 3600
+
+
+def horas_programadas() -> List[str]:
+    """Horas (HH:MM) de ejecución diaria, sin duplicados"""
+    return sorted(set([SCRAP_TIME] + SCRAP_TIMES_EXTRA))
+
+
+def consultas_programadas() -> List[Optional[List[str]]]:
+    """Códigos CPV de cada consulta programada (None = sin filtro CPV)"""
+    return [None if consulta == "*" else almacen.normalizar_cpv(consulta.split(","))
+            for consulta in CONSULTAS_PROGRAMADAS]
+
+
+def siguiente_ejecucion(desde: Optional[datetime] = None) -> datetime:
+    """Próximo instante programado posterior a `desde`"""
+    desde = desde or datetime.now()
+    candidatas = []
+    for hora in horas_programadas():
+        horas, minutos = (int(parte) for parte in hora.split(":"))
+        candidata = desde.replace(hour=horas, minute=minutos, second=0, microsecond=0)
+        if candidata <= desde:
+            candidata += timedelta(days=1)
+        candidatas.append(candidata)
+    return min(candidatas)
+
+
+class ProgramadorDiario:
+    """
+    Hilo que ejecuta las consultas programadas con el paquete schedule
+
+    Solo un proceso por máquina programa ejecuciones (bloqueo de archivo en
+    OUTPUT_DIR), aunque la API corra con varios workers. El estado de cada
+    ejecución se guarda en el almacén, visible desde cualquier worker.
+    """
+
+    def __init__(self):
+        self.scheduler = schedule.Scheduler()
+        self.activo = False
+        self.en_curso = None  # Clave de la consulta en ejecución
+        self._hilo = None
+        self._parar = threading.Event()
+        self._lock_ejecucion = threading.Lock()
+        self._archivo_lock = None
+
+    def iniciar(self) -> bool:
+        """Arranca el hilo del programador; False si otro proceso ya lo tiene"""
+        os.makedirs(OUTPUT_DIR, exist_ok=True)
+        archivo_lock = open(os.path.join(OUTPUT_DIR, "programador.lock"), "a+")
+        if not bloquear_archivo(archivo_lock):
+            archivo_lock.close()
+            logger.info("Programador activo en otro proceso; este proceso no programa ejecuciones")
+            return False
+        self._archivo_lock = archivo_lock
+
+        for hora in horas_programadas():
+            self.scheduler.every().day.at(hora).do(self.ejecutar_consultas)
+        self._parar.clear()
+        self._hilo = threading.Thread(target=self._bucle, name="programador", daemon=True)
+        self._hilo.start()
+        self.activo = True
+        logger.info(f"✓ Programador iniciado: {', '.join(horas_programadas())} "
+                    f"({len(CONSULTAS_PROGRAMADAS)} consulta(s))")
+        return True
+
+    def detener(self) -> None:
+        """Detiene el hilo (una ejecución en curso termina en segundo plano) y libera el bloqueo"""
+        self._parar.set()
+        self.scheduler.clear()
+        if self._hilo is not None:
+            self._hilo.join(timeout=5)
+        if self._archivo_lock is not None:
+            self._archivo_lock.close()
+            self._archivo_lock = None
+        self.activo = False
+
+    def _bucle(self) -> None:
+        while not self._parar.is_set():
+            self.scheduler.run_pending()
+            espera = self.scheduler.idle_seconds
+            self._parar.wait(min(30, max(1, espera if espera is not None else 30)))
+
+    def ejecutar_consultas(self) -> None:
+        """Ejecuta todas las consultas programadas, una tras otra"""
+        if not self._lock_ejecucion.acquire(blocking=False):
+            logger.warning("⚠ Las consultas programadas anteriores siguen en curso; se omite esta ejecución")
+            return
+        try:
+            vigente_hasta = siguiente_ejecucion().timestamp() + MARGEN_VIGENCIA
+            for cpv_codes in consultas_programadas():
+                self._ejecutar_consulta(cpv_codes, vigente_hasta)
+        finally:
+            self._lock_ejecucion.release()
+
+    def _ejecutar_consulta(self, cpv_codes: Optional[List[str]], vigente_hasta: float) -> None:
+        from scraper_selenium import ejecutar_scraping
+
+        clave = almacen.clave_consulta(cpv_codes, None, None)
+        inicio = time.time()
+        if SCRAPING_MODO == "cola":
+            # Lo ejecuta un worker; el resultado que guarde queda vigente hasta la siguiente ejecución
+            lote = cola.encolar(cpv_codes, None, None)
+            almacen.registrar_programada(clave, inicio, "encolada", vigente_hasta=vigente_hasta)
+            logger.info(f"✓ Consulta programada encolada: {clave} (lote {lote['lote']})")
+            return
+        self.en_curso = clave
+        almacen.registrar_programada(clave, inicio, "en_curso")
+        logger.info(f"→ Consulta programada: {clave}")
+        try:
+            resultado = ejecutar_scraping(cpv_codes=cpv_codes, reanudar_desde=almacen.obtener_reanudable(clave))
+            duracion = time.time() - inicio
+            if not resultado["success"]:
+                almacen.registrar_programada(clave, inicio, "error", duracion, error=resultado.get("error"))
+            elif resultado.get("completo", True):
+                almacen.guardar_resultado(clave, resultado)
+                almacen.borrar_reanudable(clave)
+                almacen.registrar_programada(clave, inicio, "ok", duracion, resultado["total_licitaciones"],
+                                             vigente_hasta=vigente_hasta)
+            else:
+                almacen.registrar_reanudable(clave, resultado)
+                almacen.registrar_programada(clave, inicio, "incompleta", duracion, resultado["total_licitaciones"])
+            logger.info(f"✓ Consulta programada {clave} terminada en {duracion:.0f} s")
+        except Exception as e:
+            logger.error(f"✗ Error en la consulta programada {clave}: {e}")
+            almacen.registrar_programada(clave, inicio, "error", time.time() - inicio, error=str(e))
+        finally:
+            self.en_curso = None
+
+    def estado(self) -> Dict:
+        """Configuración, próxima ejecución y últimas ejecuciones registradas"""
+        ejecuciones = []
+        for ejecucion in almacen.ejecuciones_programadas():
+            ejecucion["inicio"] = datetime.fromtimestamp(ejecucion["inicio"]).isoformat()
+            if ejecucion["vigente_hasta"]:
+                ejecucion["vigente_hasta"] = datetime.fromtimestamp(ejecucion["vigente_hasta"]).isoformat()
+            if ejecucion["duracion"] is not None:
+                ejecucion["duracion"] = round(ejecucion["duracion"], 1)
+            ejecuciones.append(ejecucion)
+
+        return {
+            "activo_en_este_proceso": self.activo,
+            "horas": horas_programadas(),
+            "consultas": CONSULTAS_PROGRAMADAS,
+            "proxima_ejecucion": siguiente_ejecucion().isoformat(),
+            "en_curso": self.en_curso,
+            "ejecuciones": ejecuciones,
+        }
+
+
+programador = ProgramadorDiario()
+
+
+def main():
+    """Ejecuta el programador en primer plano (alternativa a ejecutarlo dentro de la API)"""
+    import argparse
+    parser = argparse.ArgumentParser(description="Programador diario de consultas de licitaciones")
+    parser.add_argument("--ahora", action="store_true",
+                        help="Ejecuta las consultas programadas una vez y termina")
+    args = parser.parse_args()
+
+    preparar_directorios()
+    preflight()
+
+    if args.ahora:
+        programador.ejecutar_consultas()
+        return
+
+    if not programador.iniciar():
+        return
+    try:
+        while programador._hilo.is_alive():
+            programador._hilo.join(timeout=60)
+    except KeyboardInterrupt:
+        programador.detener()
+
+
+if __name__ == "__main__":
+    main()
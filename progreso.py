@@ -0,0 +1,139 @@
+"""
+Progreso y cancelación de las extracciones en curso
+Registro en memoria (por proceso) del estado de cada extracción: fase, página
+actual, filas extraídas y tiempo restante estimado. El scraper lo actualiza
+desde el bucle de paginación y /licitaciones/progress lo emite como
+Server-Sent Events. El mismo objeto transporta la cancelación (cliente
+desconectado o plazo agotado), que el scraper comprueba entre pasos y páginas
+"""
+
+import threading
+import time
+import uuid
+from typing import Dict, Optional
+
+RETENCION_TERMINADAS = 120  # Segundos que se conserva una extracción terminada para clientes rezagados
+FASES_FINALES = ("completado", "error", "cancelado")
+
+
+class ExtraccionCancelada(Exception):
+    """La extracción se canceló (cliente desconectado o plazo agotado)"""
+
+    def __init__(self, motivo: str):
+        super().__init__(motivo)
+        self.motivo = motivo
+
+
+class Progreso:
+    """Estado de una extracción; cada cambio incrementa la versión"""
+
+    def __init__(self, consulta: str, plazo: Optional[float] = None):
+        self.id = uuid.uuid4().hex[:12]
+        self.consulta = consulta
+        self.fase = "pendiente"
+        self.detalle = None
+        self.pagina = 0
+        self.paginas_totales = None
+        self.filas = 0
+        self.inicio = time.time()
+        self.inicio_paginacion = None
+        self.pagina_inicial = None
+        self.terminado = None
+        self.version = 0
+        self.plazo = time.time() + plazo if plazo else None  # Epoch límite (opcional)
+        self.motivo_cancelacion = None
+        self._lock = threading.Lock()
+
+    def cancelar(self, motivo: str) -> None:
+        """Pide detener la extracción; el scraper lo atiende en su siguiente comprobación"""
+        if self.motivo_cancelacion is None:
+            self.motivo_cancelacion = motivo
+
+    def comprobar_cancelacion(self) -> None:
+        """Lanza ExtraccionCancelada si se pidió cancelar o se agotó el plazo"""
+        if self.motivo_cancelacion is None and self.plazo is not None and time.time() > self.plazo:
+            self.motivo_cancelacion = "plazo agotado"
+        if self.motivo_cancelacion is not None:
+            raise ExtraccionCancelada(self.motivo_cancelacion)
+
+    def fase_actual(self, fase: str, detalle: Optional[str] = None) -> None:
+        with self._lock:
+            self.fase = fase
+            self.detalle = detalle
+            if fase == "busqueda":
+                # Nueva búsqueda (p. ej. otro fragmento del plan): la paginación vuelve a empezar
+                self.inicio_paginacion = None
+            if fase in FASES_FINALES:
+                self.terminado = time.time()
+            self.version += 1
+
+    def pagina_procesada(self, pagina: int, filas: int, paginas_totales: Optional[int] = None) -> None:
+        with self._lock:
+            if self.inicio_paginacion is None:
+                # La primera página marca el inicio: el ritmo excluye formulario y búsqueda
+                self.inicio_paginacion = time.time()
+                self.pagina_inicial = pagina
+            self.fase = "paginando"
+            self.pagina = pagina
+            self.filas = filas
+            if paginas_totales:
+                self.paginas_totales = paginas_totales
+            self.version += 1
+
+    def eta(self) -> Optional[float]:
+        """Segundos restantes estimados con el ritmo medio por página (None si no se conoce el total)"""
+        if not self.paginas_totales or self.inicio_paginacion is None or self.pagina <= self.pagina_inicial:
+            return None
+        por_pagina = (time.time() - self.inicio_paginacion) / (self.pagina - self.pagina_inicial)
+        return max(0.0, (self.paginas_totales - self.pagina) * por_pagina)
+
+    def resumen(self) -> Dict:
+        with self._lock:
+            eta = self.eta() if self.terminado is None else 0.0
+            return {
+                "id": self.id,
+                "consulta": self.consulta,
+                "fase": self.fase,
+                "detalle": self.detalle,
+                "pagina": self.pagina,
+                "paginas_totales": self.paginas_totales,
+                "filas": self.filas,
+                "transcurrido_s": round((self.terminado or time.time()) - self.inicio, 1),
+                "eta_s": round(eta, 1) if eta is not None else None,
+                "terminado": self.terminado is not None,
+            }
+
+
+class RegistroProgreso:
+    """Extracciones en curso y recientes del proceso, por id y por clave de consulta"""
+
+    def __init__(self):
+        self._por_id: Dict[str, Progreso] = {}
+        self._lock = threading.Lock()
+
+    def iniciar(self, consulta: str, plazo: Optional[float] = None) -> Progreso:
+        progreso = Progreso(consulta, plazo)
+        with self._lock:
+            self._limpiar()
+            self._por_id[progreso.id] = progreso
+        return progreso
+
+    def _limpiar(self) -> None:
+        limite = time.time() - RETENCION_TERMINADAS
+        for id_progreso in [i for i, p in self._por_id.items() if p.terminado and p.terminado < limite]:
+            del self._por_id[id_progreso]
+
+    def obtener(self, id_progreso: Optional[str] = None, consulta: Optional[str] = None) -> Optional[Progreso]:
+        """Por id o, si no, la extracción más reciente de la consulta"""
+        with self._lock:
+            if id_progreso is not None:
+                return self._por_id.get(id_progreso)
+            candidatos = [p for p in self._por_id.values() if p.consulta == consulta]
+        return max(candidatos, key=lambda p: p.inicio) if candidatos else None
+
+    def activos(self) -> int:
+        with self._lock:
+            return sum(1 for p in self._por_id.values() if p.terminado is None)
+
+
+registro = RegistroProgreso()
@@ -0,0 +1,211 @@
+"""
+Política de reintentos y circuit breaker para las operaciones contra el portal
+Reintenta cada paso con backoff exponencial y jitter (RETRY_ATTEMPTS, RETRY_DELAY)
+y deja de abrir navegadores mientras el portal está caído
+"""
+
+import asyncio
+import random
+import threading
+import time
+from typing import Callable, Optional, Tuple, Type
+
+from config import (
+    RETRY_ATTEMPTS, RETRY_DELAY, RETRY_BACKOFF, RETRY_MAX_DELAY,
+    CIRCUIT_FAILURE_THRESHOLD, CIRCUIT_RESET_SECONDS,
+)
+from logger import setup_logger
+
+logger = setup_logger(__name__)
+
+
+class CircuitoAbiertoError(Exception):
+    """El circuit breaker está abierto: el portal se considera caído"""
+
+    def __init__(self, reintentar_en: float):
+        self.reintentar_en = reintentar_en
+        super().__init__(f"Portal no disponible (circuito abierto), reintentar en {reintentar_en:.0f} s")
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker de tres estados (cerrado, abierto, semiabierto)
+
+    Tras `umbral_fallos` fallos consecutivos se abre y rechaza operaciones durante
+    `tiempo_apertura` segundos; después deja pasar una operación de prueba
+    (semiabierto) que lo cierra si tiene éxito o lo vuelve a abrir si falla.
+    """
+
+    def __init__(self, nombre: str, umbral_fallos: int = CIRCUIT_FAILURE_THRESHOLD,
+                 tiempo_apertura: float = CIRCUIT_RESET_SECONDS):
+        self.nombre = nombre
+        self.umbral_fallos = umbral_fallos
+        self.tiempo_apertura = tiempo_apertura
+        self.fallos_consecutivos = 0
+        self.abierto_desde = None
+        self._prueba_en_curso = False
+        self._lock = threading.Lock()
+
+    @property
+    def estado(self) -> str:
+        with self._lock:
+            return self._estado()
+
+    def _estado(self) -> str:
+        if self.abierto_desde is None:
+            return "cerrado"
+        if time.monotonic() - self.abierto_desde >= self.tiempo_apertura:
+            return "semiabierto"
+        return "abierto"
+
+    def comprobar(self) -> bool:
+        """
+        Lanza CircuitoAbiertoError si no se permite operar ahora
+
+        Returns:
+            True si la operación es la de prueba (semiabierto): quien la
+            ejecuta debe registrar su éxito o su fallo pase lo que pase
+        """
+        with self._lock:
+            estado = self._estado()
+            if estado == "cerrado":
+                return False
+            if estado == "semiabierto" and not self._prueba_en_curso:
+                self._prueba_en_curso = True
+                logger.info(f"Circuito '{self.nombre}' semiabierto: operación de prueba")
+                return True
+            raise CircuitoAbiertoError(self._reintentar_en())
+
+    def reintentar_en(self) -> float:
+        """Segundos hasta que se permita la operación de prueba (0 si no está abierto)"""
+        with self._lock:
+            return self._reintentar_en()
+
+    def _reintentar_en(self) -> float:
+        if self.abierto_desde is None:
+            return 0
+        return max(0.0, self.tiempo_apertura - (time.monotonic() - self.abierto_desde))
+
+    def registrar_exito(self) -> None:
+        with self._lock:
+            if self.abierto_desde is not None:
+                logger.info(f"✓ Circuito '{self.nombre}' cerrado")
+            self.fallos_consecutivos = 0
+            self.abierto_desde = None
+            self._prueba_en_curso = False
+
+    def registrar_fallo(self) -> None:
+        with self._lock:
+            self.fallos_consecutivos += 1
+            if self._prueba_en_curso or self.fallos_consecutivos >= self.umbral_fallos:
+                if self.abierto_desde is None or self._prueba_en_curso:
+                    logger.error(f"✗ Circuito '{self.nombre}' abierto tras {self.fallos_consecutivos} fallo(s) "
+                                 f"durante {self.tiempo_apertura:.0f} s")
+                self.abierto_desde = time.monotonic()
+            self._prueba_en_curso = False
+
+    def resumen(self) -> dict:
+        with self._lock:
+            return {
+                "nombre": self.nombre,
+                "estado": self._estado(),
+                "fallos_consecutivos": self.fallos_consecutivos,
+                "reintentar_en": round(self._reintentar_en()),
+            }
+
+
+class PoliticaReintentos:
+    """Reintentos con backoff exponencial y jitter completo"""
+
+    def __init__(self, intentos: int = RETRY_ATTEMPTS, espera_base: float = RETRY_DELAY,
+                 factor: float = RETRY_BACKOFF, espera_max: float = RETRY_MAX_DELAY):
+        self.intentos = max(1, intentos)
+        self.espera_base = espera_base
+        self.factor = factor
+        self.espera_max = espera_max
+
+    def espera(self, intento: int) -> float:
+        """Espera antes del reintento número `intento` (1 = primer reintento)"""
+        limite = min(self.espera_max, self.espera_base * (self.factor ** (intento - 1)))
+        return random.uniform(limite / 2, limite)
+
+    def ejecutar(self, funcion: Callable, paso: str,
+                 excepciones: Tuple[Type[BaseException], ...] = (Exception,),
+                 circuito: Optional[CircuitBreaker] = None):
+        """
+        Ejecuta `funcion` reintentando ante las excepciones indicadas
+
+        Args:
+            funcion: Callable sin argumentos con el paso a ejecutar
+            paso: Nombre del paso para los logs (navegación, búsqueda, ...)
+            excepciones: Excepciones que se consideran transitorias
+            circuito: Circuit breaker a consultar y actualizar (opcional)
+
+        Returns:
+            El valor devuelto por `funcion`
+
+        Raises:
+            CircuitoAbiertoError si el circuito está abierto, o la última
+            excepción cuando se agotan los intentos
+        """
+        # Una sola comprobación: los reintentos de la operación de prueba forman parte de ella
+        prueba = circuito.comprobar() if circuito else False
+        try:
+            for intento in range(1, self.intentos + 1):
+                try:
+                    resultado = funcion()
+                except excepciones as e:
+                    if intento == self.intentos:
+                        logger.error(f"✗ {paso}: fallo tras {intento} intento(s): {e}")
+                        if circuito:
+                            circuito.registrar_fallo()
+                        raise
+                    espera = self.espera(intento)
+                    logger.warning(f"⚠ {paso}: intento {intento}/{self.intentos} fallido ({e}); "
+                                   f"reintentando en {espera:.1f} s")
+                    time.sleep(espera)
+                else:
+                    if circuito:
+                        circuito.registrar_exito()
+                    return resultado
+        except excepciones:
+            raise  # Fallo ya registrado
+        except BaseException:
+            # Cancelación u otro error no transitorio: la prueba no puede quedar en curso
+            if prueba:
+                circuito.registrar_fallo()
+            raise
+
+    async def ejecutar_async(self, funcion: Callable, paso: str,
+                             excepciones: Tuple[Type[BaseException], ...] = (Exception,),
+                             circuito: Optional[CircuitBreaker] = None):
+        """Como ejecutar() para corrutinas: `funcion` devuelve un awaitable y las esperas no bloquean el bucle"""
+        prueba = circuito.comprobar() if circuito else False
+        try:
+            for intento in range(1, self.intentos + 1):
+                try:
+                    resultado = await funcion()
+                except excepciones as e:
+                    if intento == self.intentos:
+                        logger.error(f"✗ {paso}: fallo tras {intento} intento(s): {e}")
+                        if circuito:
+                            circuito.registrar_fallo()
+                        raise
+                    espera = self.espera(intento)
+                    logger.warning(f"⚠ {paso}: intento {intento}/{self.intentos} fallido ({e}); "
+                                   f"reintentando en {espera:.1f} s")
+                    await asyncio.sleep(espera)
+                else:
+                    if circuito:
+                        circuito.registrar_exito()
+                    return resultado
+        except excepciones:
+            raise
+        except BaseException:
+            if prueba:
+                circuito.registrar_fallo()
+            raise
+
+
+# Circuito compartido por todas las ejecuciones del proceso contra el portal
+circuito_portal = CircuitBreaker("portal")
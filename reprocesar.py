@@ -0,0 +1,260 @@
+"""
+Re-extracción desde ejecuciones archivadas
+Cada ejecución guarda el HTML de sus páginas de resultados
+(resultados_pagina_N.html) en su carpeta de datos_licitaciones. Tras corregir
+o cambiar la extracción de filas, este comando vuelve a analizar esas páginas
+sin ir al portal, con un pool de procesos sobre todos los núcleos, y regenera
+licitaciones_extraidas.json, el CSV y, si la carpeta está registrada, el
+resultado del almacén y su índice de búsqueda. Como el portal no ha cambiado,
+no se registran cambios (/licitaciones/changes) ni se avisa a las suscripciones:
+solo se sustituye el índice base con el que se compara la siguiente ejecución.
+
+El resultado es determinista: las páginas se procesan en paralelo pero se
+recomponen en orden, y los archivos se reescriben con el mismo formato que el
+scraper. El texto de cada celda se obtiene como lo mostraría el navegador
+(saltos de línea en <br> y elementos de bloque, espacios colapsados, sin
+elementos ocultos por style).
+"""
+
+import glob
+import json
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional
+from urllib.parse import urljoin
+
+from bs4 import BeautifulSoup, NavigableString
+
+from campos import licitacion_desde_celdas
+from checkpoint import ARCHIVO_CHECKPOINT
+from config import OUTPUT_DIR, preparar_directorios
+from logger import setup_logger
+
+logger = setup_logger(__name__)
+
+URL_PORTAL = "https://contrataciondelestado.es/wps/portal/plataforma/buscadores/busqueda"
+ARCHIVO_RESULTADOS = "licitaciones_extraidas.json"
+PATRON_PAGINA = re.compile(r"resultados_pagina_(\d+)\.html$")
+
+ELEMENTOS_BLOQUE = frozenset("""
+address article aside blockquote dd div dl dt fieldset figure footer form h1 h2 h3 h4 h5 h6 header
+hr li main nav ol p pre section table tbody thead tfoot tr ul
+""".split())
+ELEMENTOS_SIN_TEXTO = frozenset(("script", "style", "noscript", "template", "head"))
+
+
+def _oculto(elemento) -> bool:
+    estilo = re.sub(r"\s+", "", (elemento.get("style") or "").lower())
+    return elemento.has_attr("hidden") or "display:none" in estilo or "visibility:hidden" in estilo
+
+
+def texto_visible(elemento) -> str:
+    """Aproximación al innerText de Selenium: líneas sin espacios sobrantes y sin líneas vacías"""
+    partes = []
+
+    def recorrer(nodo):
+        for hijo in nodo.children:
+            if isinstance(hijo, NavigableString):
+                # Solo texto: se omiten comentarios, CDATA y declaraciones
+                if type(hijo) is NavigableString:
+                    partes.append(re.sub(r"\s+", " ", str(hijo).replace("\xa0", " ")))
+            elif hijo.name in ELEMENTOS_SIN_TEXTO or _oculto(hijo):
+                continue
+            elif hijo.name == "br":
+                partes.append("\n")
+            else:
+                bloque = hijo.name in ELEMENTOS_BLOQUE
+                if bloque:
+                    partes.append("\n")
+                recorrer(hijo)
+                if bloque:
+                    partes.append("\n")
+
+    recorrer(elemento)
+    # Como en el navegador, los espacios entre nodos de texto contiguos se colapsan
+    lineas = (linea.strip() for linea in re.sub(r" +", " ", "".join(partes)).split("\n"))
+    return "\n".join(linea for linea in lineas if linea)
+
+
+def extraer_filas_html(html: str) -> List[Dict]:
+    """Licitaciones de una página de resultados guardada (mismo recorrido de tablas que el scraper)"""
+    soup = BeautifulSoup(html, "lxml")
+    licitaciones = []
+    for tabla in soup.find_all("table"):
+        filas = tabla.find_all("tr")
+        if len(filas) <= 1:
+            continue
+        for fila in filas[1:]:
+            celdas = fila.find_all("td")
+            if len(celdas) != 6:
+                continue
+            enlace = celdas[0].select_one("a[target='_blank']") or celdas[0].find("a")
+            href = enlace.get("href") if enlace is not None else None
+            licitacion = licitacion_desde_celdas([texto_visible(celda) for celda in celdas],
+                                                 urljoin(URL_PORTAL, href) if href else "")
+            if licitacion:
+                licitaciones.append(licitacion)
+    return licitaciones
+
+
+def _procesar_pagina(ruta: str) -> List[Dict]:
+    """Tarea del pool: una página HTML -> sus licitaciones"""
+    with open(ruta, "r", encoding="utf-8") as f:
+        return extraer_filas_html(f.read())
+
+
+def paginas_de(carpeta: str) -> List[str]:
+    """
+    Páginas archivadas de una ejecución en orden numérico
+
+    Con checkpoint solo cuentan las páginas completadas: el HTML de una página
+    se guarda antes de extraerla y puede corresponder a una página fallida.
+    """
+    paginas = {}
+    for ruta in glob.glob(os.path.join(carpeta, "resultados_pagina_*.html")):
+        coincidencia = PATRON_PAGINA.search(ruta)
+        if coincidencia:
+            paginas[int(coincidencia.group(1))] = ruta
+
+    ruta_checkpoint = os.path.join(carpeta, ARCHIVO_CHECKPOINT)
+    if os.path.exists(ruta_checkpoint):
+        with open(ruta_checkpoint, "r", encoding="utf-8") as f:
+            ultima = json.load(f).get("pagina") or 0
+        paginas = {numero: ruta for numero, ruta in paginas.items() if numero <= ultima}
+    return [paginas[numero] for numero in sorted(paginas)]
+
+
+def carpetas_archivadas(raiz: str = OUTPUT_DIR) -> List[str]:
+    """Carpetas de ejecución bajo `raiz` con páginas de resultados guardadas"""
+    return sorted(
+        os.path.dirname(ruta)
+        for ruta in glob.glob(os.path.join(raiz, "*", "resultados_pagina_1.html"))
+    )
+
+
+def _nombre_csv(carpeta: str) -> str:
+    """CSV existente de la ejecución o, si no hay, el que habría escrito el scraper (fecha de la carpeta)"""
+    existentes = sorted(glob.glob(os.path.join(carpeta, "licitaciones_*.csv")))
+    if existentes:
+        return existentes[0]
+    return os.path.join(carpeta, f"licitaciones_{os.path.basename(carpeta)[:8]}.csv")
+
+
+def _escribir_resultados(carpeta: str, licitaciones: List[Dict]) -> None:
+    """JSON y CSV con el mismo formato que LicitacionesScraperSelenium._guardar_resultados"""
+    ruta = os.path.join(carpeta, ARCHIVO_RESULTADOS)
+    temporal = ruta + ".tmp"
+    with open(temporal, "w", encoding="utf-8") as f:
+        json.dump(licitaciones, f, ensure_ascii=False, indent=2)
+    os.replace(temporal, ruta)
+
+    if licitaciones:
+        import pandas as pd
+        pd.DataFrame(licitaciones).to_csv(_nombre_csv(carpeta), index=False, encoding="utf-8-sig")
+
+
+def _actualizar_almacen(carpeta: str, licitaciones: List[Dict]) -> int:
+    """Vuelve a guardar los resultados del almacén que apuntan a la carpeta; devuelve cuántos"""
+    import almacen
+    ruta = os.path.abspath(carpeta)
+    actualizados = 0
+    for meta in almacen.consultas_almacenadas():
+        if os.path.abspath(meta["output_folder"]) != ruta:
+            continue
+        resultado = almacen.cargar_resultado(meta)
+        resultado.update({
+            "licitaciones": licitaciones,
+            "total_licitaciones": len(licitaciones),
+            "content_hash": almacen.hash_filas(licitaciones),
+            "last_modified": time.time(),
+        })
+        # Se conserva la antigüedad original: los datos del portal no son más recientes.
+        # Un parser corregido no es un cambio del portal: ni feed de cambios ni avisos a suscripciones
+        almacen.guardar_resultado(meta["clave"], resultado, creado=meta["creado"], notificar=False)
+        actualizados += 1
+    return actualizados
+
+
+def _leer_anteriores(carpeta: str) -> Optional[List[Dict]]:
+    ruta = os.path.join(carpeta, ARCHIVO_RESULTADOS)
+    if not os.path.exists(ruta):
+        return None
+    with open(ruta, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def reprocesar(carpetas: List[str], procesos: Optional[int] = None, escribir: bool = True,
+               actualizar_almacen: bool = True) -> Dict:
+    """
+    Vuelve a extraer las licitaciones de las páginas archivadas de cada carpeta
+
+    Args:
+        carpetas: Carpetas de ejecución (con resultados_pagina_N.html)
+        procesos: Procesos del pool (por defecto, todos los núcleos)
+        escribir: Si es False solo compara con licitaciones_extraidas.json
+        actualizar_almacen: Actualizar también los resultados registrados en el almacén
+
+    Returns:
+        dict con carpetas, páginas, licitaciones, carpetas con cambios,
+        segundos y páginas por segundo del análisis
+    """
+    paginas_por_carpeta = {carpeta: paginas_de(carpeta) for carpeta in carpetas}
+    rutas = [ruta for paginas in paginas_por_carpeta.values() for ruta in paginas]
+    procesos = procesos or os.cpu_count() or 1
+    logger.info(f"Reprocesando {len(rutas)} página(s) de {len(carpetas)} carpeta(s) con {procesos} proceso(s)")
+
+    inicio = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=procesos) as pool:
+        # map conserva el orden de entrada: el resultado no depende del reparto entre procesos
+        filas_por_pagina = list(pool.map(_procesar_pagina, rutas, chunksize=max(1, len(rutas) // (procesos * 4))))
+    segundos = time.perf_counter() - inicio
+
+    resumen = {"carpetas": len(carpetas), "paginas": len(rutas), "licitaciones": 0, "con_cambios": [],
+               "almacen_actualizados": 0}
+    posicion = 0
+    for carpeta, paginas in paginas_por_carpeta.items():
+        licitaciones = [lic for filas in filas_por_pagina[posicion:posicion + len(paginas)] for lic in filas]
+        posicion += len(paginas)
+        resumen["licitaciones"] += len(licitaciones)
+
+        anteriores = _leer_anteriores(carpeta)
+        if anteriores == licitaciones or (anteriores is None and not licitaciones):
+            logger.info(f"✓ {carpeta}: {len(licitaciones)} licitaciones (sin cambios)")
+            continue
+        resumen["con_cambios"].append(carpeta)
+        logger.info(f"✓ {carpeta}: {len(licitaciones)} licitaciones "
+                    f"(antes {len(anteriores) if anteriores is not None else 'sin resultados'})")
+        if escribir:
+            _escribir_resultados(carpeta, licitaciones)
+            if actualizar_almacen:
+                resumen["almacen_actualizados"] += _actualizar_almacen(carpeta, licitaciones)
+
+    resumen["segundos"] = round(segundos, 2)
+    resumen["paginas_por_segundo"] = round(len(rutas) / segundos, 1) if segundos else None
+    logger.info(f"✓ Análisis: {len(rutas)} páginas en {segundos:.1f} s "
+                f"({resumen['paginas_por_segundo']} páginas/s); {len(resumen['con_cambios'])} carpeta(s) con cambios")
+    return resumen
+
+
+def main():
+    """Re-extracción desde línea de comandos"""
+    import argparse
+    parser = argparse.ArgumentParser(description="Re-extrae licitaciones del HTML archivado de ejecuciones anteriores")
+    parser.add_argument("carpetas", nargs="*", help="Carpetas de ejecución (por defecto, todas las de --raiz)")
+    parser.add_argument("--raiz", default=OUTPUT_DIR, help="Directorio con las carpetas de ejecución")
+    parser.add_argument("--procesos", type=int, help="Procesos del pool (por defecto, todos los núcleos)")
+    parser.add_argument("--comprobar", action="store_true", help="Solo informa de las carpetas que cambiarían")
+    parser.add_argument("--sin-almacen", action="store_true", help="No actualiza el almacén de resultados")
+    args = parser.parse_args()
+
+    preparar_directorios()
+    carpetas = args.carpetas or carpetas_archivadas(args.raiz)
+    resumen = reprocesar(carpetas, args.procesos, escribir=not args.comprobar,
+                         actualizar_almacen=not args.sin_almacen)
+    print(json.dumps(resumen, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,286 @@
+"""
+Serialización y compresión de las respuestas de la API
+Usa orjson cuando está disponible, negocia gzip/brotli según Accept-Encoding
+y permite formatos compactos (MessagePack, Arrow IPC) según la cabecera Accept.
+También gestiona ETag/Last-Modified y las peticiones condicionales (304)
+"""
+
+import gzip
+import json
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Dict, List, Optional, Tuple
+
+from fastapi import Request
+from fastapi.responses import JSONResponse, Response
+
+from config import COMPRESSION_MIN_BYTES, COMPRESSION_GZIP_LEVEL, COMPRESSION_BROTLI_QUALITY
+
+# Dependencias opcionales: si no están instaladas se usa el camino estándar
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
+
+MEDIA_JSON = "application/json"
+MEDIA_MSGPACK = "application/msgpack"
+MEDIA_ARROW = "application/vnd.apache.arrow.stream"
+
+# Alias aceptados en la cabecera Accept para cada formato
+_ALIAS_FORMATOS = {
+    "application/json": MEDIA_JSON,
+    "application/msgpack": MEDIA_MSGPACK,
+    "application/x-msgpack": MEDIA_MSGPACK,
+    "application/vnd.msgpack": MEDIA_MSGPACK,
+    "application/vnd.apache.arrow.stream": MEDIA_ARROW,
+}
+
+
+class ORJSONResponse(JSONResponse):
+    """JSONResponse que serializa con orjson (o json estándar si no está instalado)"""
+
+    def render(self, content) -> bytes:
+        return serializar_json(content)
+
+
+def serializar_json(content) -> bytes:
+    """Serializa a JSON compacto en UTF-8"""
+    if orjson is not None:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(
+        content,
+        ensure_ascii=False,
+        allow_nan=False,
+        separators=(",", ":"),
+    ).encode("utf-8")
+
+
+def _parsear_cabecera_q(valor: Optional[str]) -> List[Tuple[str, float]]:
+    """Parsea una cabecera con valores de calidad (Accept, Accept-Encoding), ordenada por q"""
+    if not valor:
+        return []
+
+    elementos = []
+    for posicion, parte in enumerate(valor.split(",")):
+        trozos = [t.strip() for t in parte.split(";")]
+        token = trozos[0].lower()
+        if not token:
+            continue
+        q = 1.0
+        for parametro in trozos[1:]:
+            if parametro.startswith("q="):
+                try:
+                    q = float(parametro[2:])
+                except ValueError:
+                    q = 0.0
+        elementos.append((token, q, posicion))
+
+    # Orden estable: mayor calidad primero, respetando el orden del cliente
+    elementos.sort(key=lambda e: (-e[1], e[2]))
+    return [(token, q) for token, q, _ in elementos]
+
+
+def _formatos_disponibles() -> Dict[str, bool]:
+    return {
+        MEDIA_JSON: True,
+        MEDIA_MSGPACK: msgpack is not None,
+        MEDIA_ARROW: pa is not None,
+    }
+
+
+def negociar_formato(accept: Optional[str]) -> str:
+    """Elige el formato de respuesta a partir de la cabecera Accept (JSON por defecto)"""
+    disponibles = _formatos_disponibles()
+    for token, q in _parsear_cabecera_q(accept):
+        if q <= 0:
+            continue
+        formato = _ALIAS_FORMATOS.get(token)
+        if formato and disponibles[formato]:
+            return formato
+        if token in ("*/*", "application/*"):
+            return MEDIA_JSON
+    return MEDIA_JSON
+
+
+def negociar_codificacion(accept_encoding: Optional[str]) -> Optional[str]:
+    """Elige la compresión (br, gzip) aceptada por el cliente o None"""
+    soportadas = ["br", "gzip"] if brotli is not None else ["gzip"]
+    for token, q in _parsear_cabecera_q(accept_encoding):
+        if q <= 0:
+            continue
+        if token in soportadas:
+            return token
+        if token == "*":
+            return soportadas[0]
+    return None
+
+
+def _serializar_arrow(content: Dict) -> bytes:
+    """Serializa las licitaciones como tabla Arrow IPC (stream) con el resto de campos como metadatos"""
+    licitaciones = content.get("licitaciones") or []
+    metadatos = {k: v for k, v in content.items() if k != "licitaciones"}
+
+    tabla = pa.Table.from_pylist(licitaciones)
+    tabla = tabla.replace_schema_metadata({"respuesta": serializar_json(metadatos)})
+
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, tabla.schema) as writer:
+        writer.write_table(tabla)
+    return sink.getvalue().to_pybytes()
+
+
+def serializar(content, formato: str) -> bytes:
+    """Serializa el contenido en el formato indicado"""
+    if formato == MEDIA_MSGPACK:
+        return msgpack.packb(content, use_bin_type=True)
+    if formato == MEDIA_ARROW:
+        return _serializar_arrow(content)
+    return serializar_json(content)
+
+
+def comprimir(cuerpo: bytes, codificacion: Optional[str]) -> Tuple[bytes, Optional[str]]:
+    """Comprime el cuerpo si supera el umbral configurado"""
+    if codificacion is None or len(cuerpo) < COMPRESSION_MIN_BYTES:
+        return cuerpo, None
+    if codificacion == "br":
+        return brotli.compress(cuerpo, quality=COMPRESSION_BROTLI_QUALITY), "br"
+    return gzip.compress(cuerpo, compresslevel=COMPRESSION_GZIP_LEVEL), "gzip"
+
+
+def _negociar(request: Request) -> Tuple[str, Optional[str]]:
+    """Formato y compresión negociados para la petición"""
+    formato = negociar_formato(request.headers.get("accept"))
+    codificacion = negociar_codificacion(request.headers.get("accept-encoding"))
+    return formato, codificacion
+
+
+def etag_variante(etag_base: str, formato: str, codificacion: Optional[str]) -> str:
+    """
+    ETag fuerte de una representación concreta
+
+    La base es el hash del contenido; el sufijo distingue formato y compresión
+    negociados para que representaciones con bytes distintos no compartan ETag.
+    """
+    sufijos = []
+    if formato != MEDIA_JSON:
+        sufijos.append(formato.rsplit("/", 1)[-1].rsplit(".", 1)[-1])
+    if codificacion:
+        sufijos.append(codificacion)
+    return '"' + "-".join([etag_base] + sufijos) + '"'
+
+
+def _etag_coincide(if_none_match: str, etag: str) -> bool:
+    """
+    Comprueba If-None-Match contra el ETag completo de la variante que se serviría
+
+    Comparación débil (RFC 9110): se ignora W/, pero no los sufijos de formato y
+    compresión; un cliente con la variante gzip JSON no valida la msgpack.
+    """
+    for etiqueta in if_none_match.split(","):
+        etiqueta = etiqueta.strip()
+        if etiqueta == "*":
+            return True
+        if etiqueta.startswith("W/"):
+            etiqueta = etiqueta[2:]
+        if etiqueta == etag:
+            return True
+    return False
+
+
+def _no_modificado_desde(if_modified_since: str, last_modified: float) -> bool:
+    """Comprueba If-Modified-Since (resolución de segundos, como Last-Modified)"""
+    try:
+        referencia = parsedate_to_datetime(if_modified_since)
+    except (TypeError, ValueError):
+        return False
+    if referencia is None:
+        return False
+    return int(last_modified) <= referencia.timestamp()
+
+
+def _cabeceras_validacion(etag: str, last_modified: Optional[float]) -> Dict[str, str]:
+    cabeceras = {
+        "ETag": etag,
+        "Cache-Control": "no-cache",
+        "Vary": "Accept, Accept-Encoding",
+    }
+    if last_modified is not None:
+        cabeceras["Last-Modified"] = formatdate(last_modified, usegmt=True)
+    return cabeceras
+
+
+def respuesta_no_modificada(request: Request, etag_base: str, last_modified: Optional[float] = None,
+                            etag: Optional[str] = None) -> Optional[Response]:
+    """
+    Evalúa las cabeceras condicionales de la petición
+
+    If-None-Match tiene prioridad sobre If-Modified-Since (RFC 9110).
+
+    Args:
+        etag: ETag completo de la variante a servir (por defecto, el de la
+              variante negociada con Accept y Accept-Encoding)
+
+    Returns:
+        Response 304 si el cliente ya tiene la representación vigente, None en otro caso
+    """
+    if_none_match = request.headers.get("if-none-match")
+    if_modified_since = request.headers.get("if-modified-since")
+    if etag is None:
+        etag = etag_variante(etag_base, *_negociar(request))
+
+    if if_none_match:
+        no_modificado = _etag_coincide(if_none_match, etag)
+    elif if_modified_since and last_modified is not None:
+        no_modificado = _no_modificado_desde(if_modified_since, last_modified)
+    else:
+        no_modificado = False
+
+    if not no_modificado:
+        return None
+
+    return Response(status_code=304, headers=_cabeceras_validacion(etag, last_modified))
+
+
+def construir_respuesta(request: Request, content, status_code: int = 200, headers: Optional[Dict[str, str]] = None,
+                        etag_base: Optional[str] = None, last_modified: Optional[float] = None) -> Response:
+    """
+    Construye la respuesta negociando formato y compresión con el cliente
+
+    Args:
+        request: Petición entrante (se leen Accept y Accept-Encoding)
+        content: Contenido serializable de la respuesta
+        status_code: Código HTTP
+        headers: Cabeceras adicionales
+        etag_base: Hash del contenido para la cabecera ETag (opcional)
+        last_modified: Epoch de la última modificación del contenido (opcional)
+
+    Returns:
+        Response con el cuerpo ya serializado (y comprimido si procede)
+    """
+    formato, codificacion = _negociar(request)
+    cuerpo = serializar(content, formato)
+    cuerpo, aplicada = comprimir(cuerpo, codificacion)
+
+    cabeceras = dict(headers or {})
+    cabeceras["Vary"] = "Accept, Accept-Encoding"
+    if etag_base:
+        cabeceras.update(_cabeceras_validacion(etag_variante(etag_base, formato, codificacion), last_modified))
+    if aplicada:
+        cabeceras["Content-Encoding"] = aplicada
+
+    return Response(content=cuerpo, status_code=status_code, headers=cabeceras, media_type=formato)
@@ -0,0 +1,565 @@
+"""
+Scraper asíncrono con Playwright para contrataciondelestado.es
+Alternativa a scraper_selenium (SCRAPER_BACKEND=playwright): un solo Chromium
+por proceso y un contexto de navegador aislado (cookies, sesión JSF, caché) por
+extracción, en lugar de un Chrome con su ChromeDriver por extracción. Los
+handlers de FastAPI lo esperan con await, sin ocupar hilos del pool.
+
+Sigue el mismo flujo que LicitacionesScraperSelenium (formulario, CPV, fechas,
+estado, paginación con checkpoint, cancelación cooperativa), reutiliza su
+estado de extracción (carpeta, checkpoint, hash, guardado de JSON/CSV) y
+devuelve el mismo dict de resultado. Las filas de cada página se leen con una
+sola evaluación de JavaScript y los avances de página esperan a que cambie la
+tabla en lugar de pausas fijas. No guarda capturas de pantalla.
+
+Requiere: pip install playwright && playwright install chromium
+"""
+
+import asyncio
+import fnmatch
+import functools
+import json
+import os
+from datetime import datetime, timedelta
+
+import anyio
+
+from campos import licitacion_desde_celdas
+from checkpoint import clave_licitacion
+from config import CHROME_BINARY, preparar_directorios
+from cortesia import gobernador
+from logger import setup_logger
+from navegador import patrones_bloqueo
+from progreso import ExtraccionCancelada
+from reintentos import CircuitoAbiertoError, circuito_portal
+from scraper_selenium import (
+    LicitacionesScraperSelenium, _resultado_extraccion, _resultado_cancelado, _resultado_circuito_abierto,
+)
+
+logger = setup_logger(__name__)
+
+try:
+    from playwright.async_api import async_playwright, Error as PlaywrightError, TimeoutError as PlaywrightTimeout
+except ImportError:
+    async_playwright = None
+
+    class PlaywrightError(Exception):
+        pass
+
+    class PlaywrightTimeout(PlaywrightError):
+        pass
+
+URL_BUSCADOR = "https://contrataciondelestado.es/wps/portal/plataforma/buscadores/busqueda"
+PREFIJO_ID = "viewns_Z7_AVEQAI930OBRD02JPMTPG21004_:form1:"
+USER_AGENT = ("Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) "
+              "Chrome/120.0.0.0 Safari/537.36")
+TIMEOUT_MS = 120000  # Carga de página y acciones (como set_page_load_timeout en Selenium)
+ESPERA_RESULTADOS_MS = 30000  # Sin filas en este tiempo tras buscar: la búsqueda no tiene resultados
+
+# Primera celda de la primera fila de resultados: identifica la página mostrada
+_JS_FIRMA = """() => {
+    for (const tr of document.querySelectorAll('table tr')) {
+        const celdas = tr.querySelectorAll(':scope > td');
+        if (celdas.length === 6) return celdas[0].innerText;
+    }
+    return null;
+}"""
+
+# Texto de las celdas y enlace de detalle de cada fila de 6 columnas (mismo recorrido que Selenium)
+_JS_FILAS = """() => {
+    const filas = [];
+    for (const tabla of document.querySelectorAll('table')) {
+        const trs = tabla.querySelectorAll('tr');
+        if (trs.length <= 1) continue;
+        for (const tr of Array.from(trs).slice(1)) {
+            const celdas = tr.querySelectorAll('td');
+            if (celdas.length !== 6) continue;
+            const enlace = celdas[0].querySelector("a[target='_blank']") || celdas[0].querySelector('a');
+            filas.push({textos: Array.from(celdas, c => c.innerText), enlace: enlace ? enlace.href : ''});
+        }
+    }
+    return filas;
+}"""
+
+_JS_PAGINAS_TOTALES = """() => {
+    const m = document.body.innerText.match(/P[áa]gina\\s+\\d+\\s+de\\s+(\\d+)/i);
+    return m ? parseInt(m[1], 10) : null;
+}"""
+
+_JS_TIEMPOS = """() => {
+    const n = performance.getEntriesByType('navigation')[0];
+    return n ? [performance.timeOrigin, n.responseStart - n.requestStart, n.domContentLoadedEventEnd, n.loadEventEnd] : null;
+}"""
+
+
+def _escribir_texto(ruta: str, texto: str) -> None:
+    with open(ruta, 'w', encoding='utf-8') as f:
+        f.write(texto)
+
+
+class NavegadorCompartido:
+    """Chromium del proceso: se lanza con la primera extracción y cada extracción abre su propio contexto"""
+
+    def __init__(self):
+        self._playwright = None
+        self._navegador = None
+        self._lock = None
+        self.contextos_abiertos = 0
+
+    async def _asegurar(self):
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            if self._navegador is not None and self._navegador.is_connected():
+                return
+            if async_playwright is None:
+                raise RuntimeError("Playwright no está instalado: pip install playwright && playwright install chromium")
+            if self._playwright is None:
+                self._playwright = await async_playwright().start()
+            opciones = {
+                "headless": True,
+                "args": ["--no-sandbox", "--disable-dev-shm-usage", "--disable-blink-features=AutomationControlled"],
+            }
+            if CHROME_BINARY:
+                opciones["executable_path"] = CHROME_BINARY
+            self._navegador = await self._playwright.chromium.launch(**opciones)
+            logger.info("✓ Chromium (Playwright) lanzado; cada extracción usa un contexto aislado")
+
+    async def nuevo_contexto(self):
+        await self._asegurar()
+        contexto = await self._navegador.new_context(
+            user_agent=USER_AGENT,
+            viewport={"width": 1920, "height": 1080},
+            locale="es-ES",
+        )
+        contexto.set_default_timeout(TIMEOUT_MS)
+        self.contextos_abiertos += 1
+        return contexto
+
+    async def cerrar_contexto(self, contexto) -> None:
+        try:
+            await contexto.close()
+        except PlaywrightError as e:
+            logger.warning(f"⚠ No se pudo cerrar el contexto del navegador: {e}")
+        finally:
+            self.contextos_abiertos -= 1
+
+    async def cerrar(self) -> None:
+        """Cierra Chromium y Playwright (al parar la API o tras una ejecución fuera de ella)"""
+        if self._navegador is not None:
+            await self._navegador.close()
+        if self._playwright is not None:
+            await self._playwright.stop()
+        self._navegador = None
+        self._playwright = None
+
+
+class ScraperPlaywright(LicitacionesScraperSelenium):
+    """Mismo flujo que el scraper de Selenium sobre un contexto de Playwright (métodos asíncronos)"""
+
+    def __init__(self, navegador: NavegadorCompartido, **kwargs):
+        super().__init__(**kwargs)
+        self.navegador = navegador
+        self.contexto = None
+        self.page = None
+
+    def _localizar(self, sufijo):
+        # Los id del portal llevan ':' y no sirven como selector CSS '#id'
+        return self.page.locator(f'[id="{PREFIJO_ID}{sufijo}"]')
+
+    async def _abrir_contexto(self):
+        self.contexto = await self.navegador.nuevo_contexto()
+        patrones = patrones_bloqueo()
+        if patrones:
+            await self.contexto.route("**/*", functools.partial(self._filtrar_peticion, patrones))
+        self.contexto.on("request", self._contar_peticion)
+        self.contexto.on("response", self._contar_respuesta)
+        self.page = await self.contexto.new_page()
+
+    async def _filtrar_peticion(self, patrones, route):
+        """Equivalente a Network.setBlockedURLs del perfil ligero"""
+        url = route.request.url
+        if any(fnmatch.fnmatchcase(url, patron) for patron in patrones):
+            self.metricas_red.registrar_bloqueada(url, route.request.resource_type)
+            await route.abort("blockedbyclient")
+        else:
+            await route.continue_()
+
+    def _contar_peticion(self, request):
+        self.metricas_red.peticiones += 1
+
+    def _contar_respuesta(self, response):
+        tamano = int(response.headers.get("content-length") or 0)
+        self.metricas_red.respuestas += 1
+        self.metricas_red.bytes_transferidos += tamano
+        self.metricas_red.registrar_tamano(response.url, tamano)
+
+    async def _registrar_carga(self, etiqueta):
+        """Tiempos de navegación del documento y latencia del portal para el gobernador"""
+        try:
+            tiempos = await self.page.evaluate(_JS_TIEMPOS)
+        except PlaywrightError:
+            return
+        if not tiempos:
+            return
+        self.metricas_red.cargas.append({
+            "pagina": etiqueta,
+            "dom_ms": round(tiempos[2] or 0, 1),
+            "load_ms": round(tiempos[3] or 0, 1),
+        })
+        if tiempos[1] and tiempos[1] > 0 and tiempos[0] != self._origen_latencia:
+            self._origen_latencia = tiempos[0]
+            gobernador.registrar_latencia(tiempos[1])
+
+    async def _paginas_totales(self):
+        try:
+            return await self.page.evaluate(_JS_PAGINAS_TOTALES)
+        except PlaywrightError:
+            return None
+
+    async def _navegar(self, url):
+        await gobernador.esperar_turno_async("navegación")
+        await self.page.goto(url, wait_until="domcontentloaded")
+
+    async def _abrir_formulario(self):
+        """Abre el buscador del portal y entra en el formulario de licitaciones ('Bids')"""
+        logger.info("Accediendo al formulario de búsqueda...")
+        await self.reintentos.ejecutar_async(
+            lambda: self._navegar(URL_BUSCADOR),
+            "Navegación al buscador",
+            excepciones=(PlaywrightError,),
+            circuito=circuito_portal
+        )
+        await self._registrar_carga("formulario")
+
+        enlace = self._localizar("linkFormularioBusqueda")
+        await enlace.wait_for()
+        await gobernador.esperar_turno_async("formulario")
+        await enlace.click()
+        await self._localizar("button1").wait_for()
+        logger.info("✓ Formulario de búsqueda cargado")
+
+        html_path = os.path.join(self.output_folder, 'formulario_busqueda_playwright.html')
+        with open(html_path, 'w', encoding='utf-8') as f:
+            f.write(await self.page.content())
+
+    async def _rellenar_formulario(self):
+        """Rellena CPV, fechas y estado en el formulario de búsqueda"""
+        ayer = (datetime.now() - timedelta(days=1)).strftime("%d-%m-%Y")
+        fecha_desde = self.fecha_desde or ayer
+        fecha_hasta = self.fecha_hasta or ayer
+        self.fechas_busqueda = (fecha_desde, fecha_hasta)
+        logger.info(f"Buscando licitaciones publicadas entre: {fecha_desde} y {fecha_hasta}"
+                    + (f" (CPV {', '.join(self.cpv_codes)})" if self.cpv_codes else " (sin filtro CPV)"))
+
+        # Si se agotan los reintentos se aborta: buscar sin un CPV daría resultados incorrectos
+        for cpv_code in self.cpv_codes or []:
+            await self.reintentos.ejecutar_async(
+                functools.partial(self._agregar_cpv, cpv_code),
+                f"Agregar CPV {cpv_code}",
+                excepciones=(PlaywrightError,)
+            )
+
+        for sufijo, valor, campo in (("textMinFecAnuncioMAQ2", fecha_desde, "fecha desde"),
+                                     ("textMaxFecAnuncioMAQ", fecha_hasta, "fecha hasta")):
+            try:
+                await self._localizar(sufijo).fill(valor)
+                logger.info(f"✓ {campo.capitalize()}: {valor}")
+            except PlaywrightError as e:
+                logger.error(f"Error al llenar {campo}: {e}")
+        try:
+            await self._localizar("estadoLici").select_option("PUB")
+            logger.info("✓ Estado: Publicada")
+        except PlaywrightError as e:
+            logger.error(f"Error al seleccionar estado: {e}")
+
+    async def _agregar_cpv(self, cpv_code):
+        """Escribe un código CPV, pulsa 'Add' y espera a que aparezca en la lista de CPV"""
+        await self._localizar("cpvMultiple:codigoCpv").fill(cpv_code)
+        await gobernador.esperar_turno_async("cpv")
+        await self._localizar("cpvMultiplebuttonAnyadirMultiple").click()
+        # El valor del campo no forma parte de innerText: solo cuenta el CPV ya añadido a la lista
+        await self.page.wait_for_function("c => document.body.innerText.includes(c)", arg=cpv_code)
+        logger.info(f"✓ CPV {cpv_code} agregado")
+
+    async def _buscar(self):
+        """Lanza la búsqueda y espera a la primera fila de resultados (con reintentos)"""
+        async def pulsar():
+            logger.info("Realizando búsqueda...")
+            await gobernador.esperar_turno_async("búsqueda")
+            await self._localizar("button1").click()
+            try:
+                await self.page.wait_for_function(f"() => ({_JS_FIRMA})() !== null", timeout=ESPERA_RESULTADOS_MS)
+            except PlaywrightTimeout:
+                logger.info("⚠ La búsqueda no muestra filas de resultados")
+
+        await self.reintentos.ejecutar_async(pulsar, "Búsqueda", excepciones=(PlaywrightError,),
+                                             circuito=circuito_portal)
+
+    async def _guardar_artefactos_pagina(self, pagina_actual):
+        """Guarda el HTML de la página de resultados actual (base de la re-extracción offline)"""
+        html_path = os.path.join(self.output_folder, f'resultados_pagina_{pagina_actual}.html')
+        html = await self.page.content()
+        await asyncio.to_thread(_escribir_texto, html_path, html)
+
+    async def _extraer_pagina(self, pagina_actual):
+        """Extrae las filas de la página actual con una sola evaluación, repitiéndola si falla"""
+        async def extraer():
+            filas = await self.page.evaluate(_JS_FILAS)
+            return [lic for lic in (licitacion_desde_celdas(f["textos"], f["enlace"]) for f in filas) if lic]
+
+        return await self.reintentos.ejecutar_async(extraer, f"Extracción de la página {pagina_actual}",
+                                                    excepciones=(PlaywrightError,))
+
+    async def _avanzar_pagina(self, pagina_actual):
+        """
+        Pulsa 'Next >>' y espera a que cambie la primera fila (con reintentos)
+
+        Returns:
+            bool: True si se avanzó, False si es la última página.
+        """
+        boton = self._localizar("footerSiguiente")
+        if not await boton.count() or not await boton.is_visible() or not await boton.is_enabled():
+            logger.info("✓ Botón 'Next' no disponible. Última página alcanzada.")
+            return False
+
+        firma_inicial = await self.page.evaluate(_JS_FIRMA)
+        intentos = []
+
+        async def avanzar():
+            # Antes de repetir el clic, comprobar si el intento fallido ya avanzó la página
+            if intentos and await self.page.evaluate(_JS_FIRMA) != firma_inicial:
+                logger.info("✓ La página ya había avanzado en el intento anterior")
+                return True
+            intentos.append(1)
+            await gobernador.esperar_turno_async("paginación")
+            await boton.click()
+            await self.page.wait_for_function(f"anterior => ({_JS_FIRMA})() !== anterior", arg=firma_inicial)
+            return True
+
+        return await self.reintentos.ejecutar_async(avanzar, f"Avance a la página {pagina_actual + 1}",
+                                                    excepciones=(PlaywrightError,))
+
+    async def _reposicionar(self):
+        """Lleva la búsqueda a la primera página pendiente según el checkpoint (None si era la última)"""
+        if not self.pagina_completada:
+            return 1
+
+        logger.info(f"→ Reanudando: avanzando hasta la página {self.pagina_completada} sin extraer...")
+        for pagina in range(1, self.pagina_completada):
+            self._comprobar_cancelacion()
+            if not await self._avanzar_pagina(pagina):
+                raise RuntimeError(f"La búsqueda tiene menos páginas ({pagina}) que el checkpoint ({self.pagina_completada})")
+
+        claves = [clave_licitacion(lic) for lic in await self._extraer_pagina(self.pagina_completada)]
+        if self.ultima_clave and (not claves or claves[-1] != self.ultima_clave):
+            logger.warning("⚠ La última fila de la página reanudada no coincide con el checkpoint "
+                           "(los resultados del portal pueden haber cambiado)")
+
+        if not await self._avanzar_pagina(self.pagina_completada):
+            return None
+        return self.pagina_completada + 1
+
+    async def _paginar(self, pagina_actual):
+        """Extrae página a página, registrando un checkpoint tras cada página completada"""
+        while True:
+            # Antes de cada página: una extracción abandonada se detiene como mucho una página después
+            self._comprobar_cancelacion()
+
+            await self._guardar_artefactos_pagina(pagina_actual)
+            licitaciones_pagina = await self._extraer_pagina(pagina_actual)
+
+            for licitacion in licitaciones_pagina:
+                self._actualizar_hash(licitacion)
+            self.licitaciones.extend(licitaciones_pagina)
+            if licitaciones_pagina:
+                self.ultima_clave = clave_licitacion(licitaciones_pagina[-1])
+            # Escritura con fsync: fuera del bucle de eventos, que comparten todas las peticiones
+            await asyncio.to_thread(
+                self.checkpoint.registrar_pagina,
+                self._consulta(),
+                pagina_actual,
+                licitaciones_pagina,
+                len(self.licitaciones),
+                self.ultima_clave
+            )
+            self.pagina_completada = pagina_actual
+
+            logger.info(f"✓ Página {pagina_actual}: {len(licitaciones_pagina)} licitaciones "
+                        f"(total acumulado: {len(self.licitaciones)})")
+            await self._registrar_carga(f"resultados_{pagina_actual}")
+            # Chromium compartido: se mide el de todo el proceso, sin reciclado por extracción
+            await asyncio.to_thread(self.memoria.muestrear)
+            if self.progreso is not None:
+                self.progreso.pagina_procesada(pagina_actual, len(self.licitaciones), await self._paginas_totales())
+
+            if not await self._avanzar_pagina(pagina_actual):
+                break
+            pagina_actual += 1
+
+    async def extraer(self):
+        """Realiza el scraping en un contexto propio del Chromium compartido"""
+        try:
+            if self.completo:
+                logger.info("✓ El checkpoint indica que la ejecución ya estaba completa")
+                await asyncio.to_thread(self._guardar_resultados)
+                return True
+
+            self._comprobar_cancelacion()
+            self._fase("navegador")
+            await self._abrir_contexto()
+
+            try:
+                self._comprobar_cancelacion()
+                self._fase("formulario")
+                await self._abrir_formulario()
+            except PlaywrightTimeout:
+                logger.error("✗ No se encontró el enlace de 'Bids'")
+                return False
+
+            await self._rellenar_formulario()
+
+            try:
+                self._comprobar_cancelacion()
+                self._fase("busqueda")
+                await self._buscar()
+
+                pagina_inicial = await self._reposicionar()
+                if pagina_inicial is not None:
+                    await self._paginar(pagina_inicial)
+                self.completo = True
+                await asyncio.to_thread(self.checkpoint.marcar_completo)
+
+            except (CircuitoAbiertoError, ExtraccionCancelada):
+                raise
+
+            except Exception as e:
+                logger.error(f"Error al buscar o extraer resultados: {e}")
+                logger.error(f"✗ Paginación interrumpida tras la página {self.pagina_completada}; "
+                             f"reanudable desde {self.output_folder}")
+
+            self._fase("guardando")
+            # JSON y CSV (pandas) fuera del bucle de eventos
+            await asyncio.to_thread(self._guardar_resultados)
+            return True
+
+        except CircuitoAbiertoError:
+            raise
+
+        except ExtraccionCancelada as e:
+            logger.warning(f"⚠ Extracción cancelada ({e.motivo}) tras la página {self.pagina_completada}; "
+                           f"reanudable desde {self.output_folder}")
+            raise
+
+        except Exception as e:
+            logger.error(f"Error en la extracción con Playwright: {e}")
+            return False
+
+        finally:
+            if self.contexto is not None:
+                self._guardar_metricas_red()
+                await self.navegador.cerrar_contexto(self.contexto)
+                self.contexto = None
+                self.page = None
+
+
+# Chromium compartido por las extracciones de la API (bucle de eventos de uvicorn)
+navegador_compartido = NavegadorCompartido()
+
+
+async def ejecutar_scraping_async(cpv_codes=None, fecha_desde=None, fecha_hasta=None, reanudar_desde=None,
+                                  progreso=None, navegador=None):
+    """
+    Equivalente asíncrono de scraper_selenium.ejecutar_scraping (mismos argumentos y dict de resultado)
+
+    Args:
+        navegador: NavegadorCompartido a usar (por defecto, el del proceso)
+    """
+    logger.info("=" * 80)
+    logger.info("EJECUTANDO SCRAPING VIA API (Playwright)")
+    logger.info("=" * 80)
+
+    if circuito_portal.estado == "abierto":
+        return _resultado_circuito_abierto(circuito_portal.reintentar_en())
+
+    scraper = None
+    try:
+        scraper = ScraperPlaywright(
+            navegador or navegador_compartido,
+            headless=True,
+            cpv_codes=cpv_codes,
+            fecha_desde=fecha_desde,
+            fecha_hasta=fecha_hasta,
+            reanudar_desde=reanudar_desde,
+            progreso=progreso
+        )
+
+        scraper._fase("esperando_sesion")
+        async with gobernador.sesion_async(comprobar=scraper._comprobar_cancelacion):
+            completado = await scraper.extraer()
+
+        return _resultado_extraccion(scraper, completado, cpv_codes, fecha_desde, fecha_hasta)
+
+    except CircuitoAbiertoError as e:
+        return _resultado_circuito_abierto(e.reintentar_en)
+
+    except ExtraccionCancelada as e:
+        return _resultado_cancelado(scraper, e.motivo)
+
+    except Exception as e:
+        logger.error(f"Error al ejecutar scraping: {str(e)}")
+        return {
+            'success': False,
+            'error': str(e),
+            'total_licitaciones': 0,
+            'licitaciones': []
+        }
+
+
+async def _ejecutar_aislado(**kwargs):
+    """Extracción con un Chromium propio que se cierra al terminar (fuera de la API)"""
+    navegador = NavegadorCompartido()
+    try:
+        return await ejecutar_scraping_async(navegador=navegador, **kwargs)
+    finally:
+        await navegador.cerrar()
+
+
+def ejecutar_scraping(cpv_codes=None, fecha_desde=None, fecha_hasta=None, reanudar_desde=None, progreso=None):
+    """
+    Versión síncrona, con la misma firma que scraper_selenium.ejecutar_scraping
+
+    Desde un hilo del pool de la API (p. ej. el planificador) se ejecuta en el
+    bucle de eventos de la API con el Chromium compartido; fuera de la API
+    (worker, backfill, línea de comandos) lanza un Chromium propio.
+    """
+    kwargs = dict(cpv_codes=cpv_codes, fecha_desde=fecha_desde, fecha_hasta=fecha_hasta,
+                  reanudar_desde=reanudar_desde, progreso=progreso)
+    try:
+        return anyio.from_thread.run(functools.partial(ejecutar_scraping_async, **kwargs))
+    except RuntimeError:
+        # No es un hilo lanzado desde el bucle de eventos (ejecutar_scraping_async no propaga excepciones)
+        return asyncio.run(_ejecutar_aislado(**kwargs))
+
+
+def main():
+    """Ejecuta una extracción con Playwright desde línea de comandos"""
+    import argparse
+    parser = argparse.ArgumentParser(description="Scraper de licitaciones con Playwright")
+    parser.add_argument("--cpv", help="Códigos CPV separados por comas (opcional)")
+    parser.add_argument("--desde", help="Fecha desde DD-MM-YYYY (por defecto, ayer)")
+    parser.add_argument("--hasta", help="Fecha hasta DD-MM-YYYY (por defecto, ayer)")
+    parser.add_argument("--reanudar", metavar="CARPETA",
+                        help="Carpeta de una ejecución interrumpida a reanudar desde su checkpoint")
+    args = parser.parse_args()
+
+    preparar_directorios()
+    cpv = [code.strip() for code in args.cpv.split(",") if code.strip()] if args.cpv else None
+    resultado = ejecutar_scraping(cpv_codes=cpv, fecha_desde=args.desde, fecha_hasta=args.hasta,
+                                  reanudar_desde=args.reanudar)
+    resumen = {clave: valor for clave, valor in resultado.items() if clave != "licitaciones"}
+    print(json.dumps(resumen, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -9,23 +9,30 @@ from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.chrome.service import Service
-from selenium.common.exceptions import TimeoutException, NoSuchElementException
-from webdriver_manager.chrome import ChromeDriverManager
+from selenium.common.exceptions import TimeoutException, NoSuchElementException, StaleElementReferenceException, WebDriverException
 import time
-from datetime import datetime
-import pandas as pd
+from datetime import datetime, timedelta
 import json
 import os
 import uuid
+import hashlib
 from logger import setup_logger
-from config import get_output_file
+from config import get_output_file, preparar_directorios, PARQUET_EXPORTAR
+from campos import licitacion_desde_celdas
+from checkpoint import CheckpointPaginacion, clave_licitacion
+from navegador import resolver_navegador, preflight, configurar_opciones_perfil, activar_bloqueo, latencia_documento, MetricasRed, PerfilCache
+from cortesia import gobernador
+from memoria import MonitorMemoria
+from progreso import ExtraccionCancelada
+from reintentos import PoliticaReintentos, CircuitoAbiertoError, circuito_portal
 
 logger = setup_logger(__name__)
 
 class LicitacionesScraperSelenium:
     """Scraper usando Selenium para manejar JavaScript"""
     
-    def __init__(self, headless=True, cpv_codes=None, fecha_desde=None, fecha_hasta=None):
+    def __init__(self, headless=True, cpv_codes=None, fecha_desde=None, fecha_hasta=None, reanudar_desde=None,
+                 progreso=None):
         self.headless = headless
         self.driver = None
         self.licitaciones = []
@@ -33,19 +40,57 @@ class LicitacionesScraperSelenium:
         self.fecha_desde = fecha_desde  # Fecha desde en formato DD-MM-YYYY (opcional)
         self.fecha_hasta = fecha_hasta  # Fecha hasta en formato DD-MM-YYYY (opcional)
         
-        # Crear carpeta única para esta ejecución
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        unique_id = str(uuid.uuid4())[:8]
-        self.output_folder = f"datos_licitaciones/{timestamp}_{unique_id}"
+        # Hash del contenido, calculado fila a fila según se extraen (base del ETag)
+        self.hash_contenido = hashlib.sha256()
+        self.content_hash = None
+        self.ultima_modificacion = None
+        
+        # Peticiones y bytes de red de la ejecución (perfil ligero)
+        self.metricas_red = MetricasRed()
+        self.perfil_cache = None  # Perfil con caché de disco persistente (si está configurado)
+        
+        # Reintentos con backoff por paso (RETRY_ATTEMPTS / RETRY_DELAY)
+        self.reintentos = PoliticaReintentos()
+        self._origen_latencia = None  # Último documento cuya latencia se registró en el gobernador
+        
+        # Memoria del navegador: pico por ejecución y reciclado de la sesión en paginaciones largas
+        self.memoria = MonitorMemoria()
+        
+        # Progreso visible desde /licitaciones/progress (opcional)
+        self.progreso = progreso
+        
+        # Estado de la paginación (checkpoint)
+        self.fechas_busqueda = None
+        self.pagina_completada = 0
+        self.ultima_clave = None
+        self.completo = False
+        
+        if reanudar_desde:
+            # Reanudar en la carpeta de una ejecución anterior
+            self.output_folder = reanudar_desde
+        else:
+            # Crear carpeta única para esta ejecución
+            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+            unique_id = str(uuid.uuid4())[:8]
+            self.output_folder = f"datos_licitaciones/{timestamp}_{unique_id}"
         os.makedirs(self.output_folder, exist_ok=True)
         logger.info(f"Carpeta de salida: {self.output_folder}")
         
+        self.checkpoint = CheckpointPaginacion(self.output_folder)
+        if reanudar_desde:
+            self._cargar_checkpoint()
+        
     def _setup_driver(self):
-        """Configura el driver de Chrome con webdriver-manager"""
+        """Configura el driver de Chrome con el ChromeDriver resuelto al arrancar el proceso"""
         try:
             logger.info("Configurando navegador Chrome...")
             
+            # Resolución cacheada por proceso (sin consultas de versión ni descargas aquí)
+            resolucion = resolver_navegador()
+            
             chrome_options = Options()
+            if resolucion["chrome"]:
+                chrome_options.binary_location = resolucion["chrome"]
             if self.headless:
                 chrome_options.add_argument('--headless=new')
             chrome_options.add_argument('--no-sandbox')
@@ -55,513 +100,710 @@ class LicitacionesScraperSelenium:
             chrome_options.add_argument('--window-size=1920,1080')
             chrome_options.add_experimental_option("excludeSwitches", ["enable-automation"])
             chrome_options.add_experimental_option('useAutomationExtension', False)
+            configurar_opciones_perfil(chrome_options)
+            
+            # Caché de disco persistente entre ejecuciones (JS/CSS del portal)
+            self.perfil_cache = PerfilCache.adquirir()
+            if self.perfil_cache:
+                self.perfil_cache.aplicar(chrome_options)
+                self.metricas_red.cache_persistente = True
             
-            # Usar webdriver-manager para instalar automáticamente el driver
-            service = Service(ChromeDriverManager().install())
+            # Sin driver resuelto, Selenium Manager intenta localizarlo por su cuenta
+            service = Service(resolucion["driver"]) if resolucion["driver"] else Service()
             self.driver = webdriver.Chrome(service=service, options=chrome_options)
             self.driver.set_page_load_timeout(120)  # Aumentar timeout a 120 segundos
+            activar_bloqueo(self.driver)
             logger.info("✓ Navegador configurado correctamente")
             
         except Exception as e:
+            self._liberar_perfil_cache()
             logger.error(f"Error configurando navegador: {str(e)}")
             logger.error("Instala Chrome si no lo tienes: https://www.google.com/chrome/")
             raise
     
-    def scrape_licitaciones(self):
-        """Realiza el scraping usando Selenium"""
+    def _cargar_checkpoint(self):
+        """Restaura consulta, filas y página completada desde el checkpoint de la carpeta"""
+        estado = self.checkpoint.cargar()
+        if not estado:
+            logger.warning(f"⚠ No hay checkpoint en {self.output_folder}; se empieza desde la página 1")
+            return
+        
+        consulta = estado["consulta"]
+        self.cpv_codes = consulta.get("cpv_codes")
+        self.fecha_desde = consulta.get("fecha_desde")
+        self.fecha_hasta = consulta.get("fecha_hasta")
+        self.pagina_completada = estado["pagina"]
+        self.ultima_clave = estado.get("ultima_clave")
+        self.completo = estado.get("completo", False)
+        
+        self.licitaciones = self.checkpoint.filas(estado["filas"])
+        for licitacion in self.licitaciones:
+            self._actualizar_hash(licitacion)
+        logger.info(f"✓ Checkpoint cargado: página {self.pagina_completada}, {len(self.licitaciones)} licitaciones")
+    
+    def _actualizar_hash(self, licitacion):
+        """Incorpora una fila al hash del contenido (serialización canónica)"""
+        fila = json.dumps(licitacion, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+        self.hash_contenido.update(fila.encode("utf-8"))
+        self.hash_contenido.update(b"\n")
+    
+    def _liberar_perfil_cache(self):
+        """Libera el perfil con caché para que lo use otro navegador"""
+        if self.perfil_cache:
+            self.perfil_cache.liberar()
+            self.perfil_cache = None
+    
+    def _guardar_metricas_red(self):
+        """Recoge los últimos eventos de red y guarda el resumen en la carpeta de salida"""
+        self.metricas_red.recoger(self.driver)
+        resumen = self.metricas_red.resumen()
+        resumen["memoria"] = self.memoria.resumen()
         try:
-            if not self.driver:
-                self._setup_driver()
-            
-            logger.info("Accediendo al formulario de búsqueda...")
-            url = "https://contrataciondelestado.es/wps/portal/plataforma/buscadores/busqueda"
-            
-            try:
-                self.driver.get(url)
-            except Exception as e:
-                logger.warning(f"Timeout inicial, reintentando... ({e})")
-                time.sleep(5)
-                self.driver.get(url)
-            
-            # Esperar a que la página cargue
-            logger.info("Esperando carga de la página...")
-            time.sleep(8)
-            
-            # Tomar captura para debugging
-            screenshot_path = os.path.join(self.output_folder, 'screenshot_formulario.png')
-            self.driver.save_screenshot(screenshot_path)
-            logger.info(f"✓ Captura guardada: {screenshot_path}")
-            
-            # Buscar iframes (el formulario puede estar dentro de uno)
-            logger.info("\nBuscando iframes...")
-            iframes = self.driver.find_elements(By.TAG_NAME, "iframe")
-            logger.info(f"Iframes encontrados: {len(iframes)}")
-            
-            for i, iframe in enumerate(iframes):
-                src = iframe.get_attribute("src")
-                name = iframe.get_attribute("name")
-                logger.info(f"  {i+1}. name={name}, src={src[:80] if src else 'N/A'}")
-            
-            # Buscar el botón/enlace de "Bids" (Licitaciones)
-            logger.info("\nBuscando enlace de 'Bids' (Licitaciones)...")
+            with open(os.path.join(self.output_folder, 'metricas_red.json'), 'w', encoding='utf-8') as f:
+                json.dump(resumen, f, ensure_ascii=False, indent=2)
+        except OSError as e:
+            logger.warning(f"No se pudieron guardar las métricas de red: {e}")
+        self.metricas_red.guardar_tamanos()
+        ahorro = resumen["bytes_ahorrados_estimados"]
+        logger.info(
+            f"✓ Red (perfil {resumen['perfil']}): {resumen['peticiones']} peticiones, "
+            f"{resumen['peticiones_ahorradas']} bloqueadas, "
+            f"{resumen['bytes_transferidos'] / 1024:.1f} KiB transferidos, "
+            f"~{(ahorro or 0) / 1024:.1f} KiB ahorrados ({resumen['bloqueadas_sin_tamano']} bloqueadas sin tamaño conocido)"
+        )
+        logger.info(
+            f"✓ Caché {'persistente' if resumen['cache_persistente'] else 'temporal'}: "
+            f"ratio de aciertos {resumen['ratio_aciertos_cache']}, "
+            f"carga media (DOM) {resumen['carga_media_dom_ms']} ms"
+        )
+    
+    def _consulta(self):
+        """Parámetros efectivos de la búsqueda (los que se guardan en el checkpoint)"""
+        fecha_desde, fecha_hasta = self.fechas_busqueda or (self.fecha_desde, self.fecha_hasta)
+        return {
+            'cpv_codes': self.cpv_codes,
+            'fecha_desde': fecha_desde,
+            'fecha_hasta': fecha_hasta
+        }
+    
+    def _fase(self, fase, detalle=None):
+        """Publica la fase actual en el progreso de la extracción (si se sigue)"""
+        if self.progreso is not None:
+            self.progreso.fase_actual(fase, detalle)
+    
+    def _comprobar_cancelacion(self):
+        """Punto de cancelación cooperativa: lanza ExtraccionCancelada si el cliente se fue o venció el plazo"""
+        if self.progreso is not None:
+            self.progreso.comprobar_cancelacion()
+    
+    def _paginas_totales(self):
+        """Total de páginas según el paginador del portal ('Página 1 de 12'), o None si no aparece"""
+        try:
+            return self.driver.execute_script(
+                "const m = document.body.innerText.match(/P[áa]gina\\s+\\d+\\s+de\\s+(\\d+)/i);"
+                "return m ? parseInt(m[1], 10) : null;"
+            )
+        except WebDriverException:
+            return None
+    
+    def _navegar(self, url):
+        """Carga una URL respetando el ritmo de peticiones al portal"""
+        gobernador.esperar_turno("navegación")
+        self.driver.get(url)
+    
+    def _registrar_latencia(self):
+        """Comunica al gobernador la latencia del portal en el documento actual (una vez por documento)"""
+        medida = latencia_documento(self.driver)
+        if medida and medida[0] != self._origen_latencia:
+            self._origen_latencia = medida[0]
+            gobernador.registrar_latencia(medida[1])
+    
+    def _abrir_formulario(self):
+        """Abre el buscador del portal y entra en el formulario de licitaciones ('Bids')"""
+        logger.info("Accediendo al formulario de búsqueda...")
+        url = "https://contrataciondelestado.es/wps/portal/plataforma/buscadores/busqueda"
+        
+        self.reintentos.ejecutar(
+            lambda: self._navegar(url),
+            "Navegación al buscador",
+            excepciones=(WebDriverException,),
+            circuito=circuito_portal
+        )
+        
+        # Esperar a que la página cargue
+        logger.info("Esperando carga de la página...")
+        time.sleep(8)
+        self.metricas_red.registrar_carga(self.driver, "formulario")
+        self._registrar_latencia()
+        
+        # Tomar captura para debugging
+        screenshot_path = os.path.join(self.output_folder, 'screenshot_formulario.png')
+        self.driver.save_screenshot(screenshot_path)
+        logger.info(f"✓ Captura guardada: {screenshot_path}")
+        
+        # Buscar iframes (el formulario puede estar dentro de uno)
+        logger.info("\nBuscando iframes...")
+        iframes = self.driver.find_elements(By.TAG_NAME, "iframe")
+        logger.info(f"Iframes encontrados: {len(iframes)}")
+        
+        for i, iframe in enumerate(iframes):
+            src = iframe.get_attribute("src")
+            name = iframe.get_attribute("name")
+            logger.info(f"  {i+1}. name={name}, src={src[:80] if src else 'N/A'}")
+        
+        # Buscar el botón/enlace de "Bids" (Licitaciones)
+        logger.info("\nBuscando enlace de 'Bids' (Licitaciones)...")
+        # ID del enlace de licitaciones
+        link_id = "viewns_Z7_AVEQAI930OBRD02JPMTPG21004_:form1:linkFormularioBusqueda"
+        enlace_licitaciones = self.driver.find_element(By.ID, link_id)
+        
+        logger.info(f"✓ Enlace encontrado: {enlace_licitaciones.text}")
+        logger.info("Haciendo click en 'Bids'...")
+        
+        gobernador.esperar_turno("formulario")
+        enlace_licitaciones.click()
+        time.sleep(5)  # Esperar a que cargue el formulario
+        
+        logger.info("✓ Click realizado, formulario de búsqueda cargado")
+    
+    def _analizar_formulario(self):
+        """Guarda capturas, HTML y campos visibles del formulario para depuración"""
+        # Tomar captura del formulario
+        screenshot_path = os.path.join(self.output_folder, 'screenshot_formulario_busqueda.png')
+        self.driver.save_screenshot(screenshot_path)
+        logger.info(f"✓ Captura guardada: {screenshot_path}")
+        
+        # Guardar HTML del formulario de búsqueda
+        html_path = os.path.join(self.output_folder, 'formulario_busqueda_selenium.html')
+        with open(html_path, 'w', encoding='utf-8') as f:
+            f.write(self.driver.page_source)
+        logger.info(f"✓ HTML del formulario guardado: {html_path}")
+        
+        # Buscar campos del formulario de búsqueda
+        logger.info("\n" + "="*80)
+        logger.info("ANALIZANDO FORMULARIO DE BÚSQUEDA")
+        logger.info("="*80)
+        
+        # Buscar inputs visibles
+        inputs = self.driver.find_elements(By.TAG_NAME, "input")
+        logger.info(f"\nInputs encontrados: {len(inputs)}")
+        
+        campos_visibles = []
+        for inp in inputs:
             try:
-                # ID del enlace de licitaciones
-                link_id = "viewns_Z7_AVEQAI930OBRD02JPMTPG21004_:form1:linkFormularioBusqueda"
-                enlace_licitaciones = self.driver.find_element(By.ID, link_id)
-                
-                logger.info(f"✓ Enlace encontrado: {enlace_licitaciones.text}")
-                logger.info("Haciendo click en 'Bids'...")
-                
-                enlace_licitaciones.click()
-                time.sleep(5)  # Esperar a que cargue el formulario
-                
-                logger.info("✓ Click realizado, formulario de búsqueda cargado")
-                
-                # Tomar captura del formulario
-                screenshot_path = os.path.join(self.output_folder, 'screenshot_formulario_busqueda.png')
-                self.driver.save_screenshot(screenshot_path)
-                logger.info(f"✓ Captura guardada: {screenshot_path}")
-                
-                # Guardar HTML del formulario de búsqueda
-                html_path = os.path.join(self.output_folder, 'formulario_busqueda_selenium.html')
-                with open(html_path, 'w', encoding='utf-8') as f:
-                    f.write(self.driver.page_source)
-                logger.info(f"✓ HTML del formulario guardado: {html_path}")
-                
-                # Buscar campos del formulario de búsqueda
-                logger.info("\n" + "="*80)
-                logger.info("ANALIZANDO FORMULARIO DE BÚSQUEDA")
-                logger.info("="*80)
-                
-                # Buscar inputs visibles
-                inputs = self.driver.find_elements(By.TAG_NAME, "input")
-                logger.info(f"\nInputs encontrados: {len(inputs)}")
-                
-                campos_visibles = []
-                for inp in inputs:
-                    try:
-                        if inp.is_displayed():  # Solo campos visibles
-                            input_type = inp.get_attribute("type")
-                            name = inp.get_attribute("name")
-                            placeholder = inp.get_attribute("placeholder")
-                            id_attr = inp.get_attribute("id")
-                            value = inp.get_attribute("value")
-                            
-                            if input_type not in ['hidden']:
-                                logger.info(f"  ✓ type={input_type}, name={name}, placeholder={placeholder}")
-                                campos_visibles.append({
-                                    'type': input_type,
-                                    'name': name,
-                                    'placeholder': placeholder,
-                                    'id': id_attr,
-                                    'value': value
-                                })
-                    except:
-                        pass
-                
-                # Buscar selects visibles
-                selects = self.driver.find_elements(By.TAG_NAME, "select")
-                logger.info(f"\nSelects encontrados: {len(selects)}")
-                
-                for sel in selects:
-                    try:
-                        if sel.is_displayed():
-                            name = sel.get_attribute("name")
-                            id_attr = sel.get_attribute("id")
-                            logger.info(f"  ✓ name={name}, id={id_attr}")
-                            
-                            # Ver opciones
-                            options = sel.find_elements(By.TAG_NAME, "option")
-                            if len(options) > 0 and len(options) <= 10:
-                                logger.info(f"    Opciones:")
-                                for opt in options[:5]:
-                                    logger.info(f"      - {opt.text}")
-                    except:
-                        pass
-                
-                # Buscar botones visibles
-                botones = self.driver.find_elements(By.TAG_NAME, "button")
-                logger.info(f"\nBotones encontrados: {len(botones)}")
-                
-                for btn in botones:
-                    try:
-                        if btn.is_displayed():
-                            texto = btn.text.strip()
-                            btn_type = btn.get_attribute("type")
-                            if texto:
-                                logger.info(f"  ✓ '{texto}' (type={btn_type})")
-                    except:
-                        pass
-                
-                # Guardar campos encontrados
-                if campos_visibles:
-                    json_path = os.path.join(self.output_folder, 'campos_formulario_busqueda.json')
-                    with open(json_path, 'w', encoding='utf-8') as f:
-                        json.dump(campos_visibles, f, indent=2, ensure_ascii=False)
-                    logger.info(f"\n✓ Campos del formulario guardados: {json_path}")
-                
-                # ===================================================================
-                # PASO 3: LLENAR EL FORMULARIO
-                # ===================================================================
-                logger.info("\n" + "="*80)
-                logger.info("LLENANDO FORMULARIO DE BÚSQUEDA")
-                logger.info("="*80)
-                
-                # Obtener fechas (usar las proporcionadas o las de ayer por defecto)
-                from datetime import datetime, timedelta
-                from selenium.webdriver.support.ui import Select
-                ayer = datetime.now() - timedelta(days=1)
-                
-                # Si no se proporcionan fechas, usar ayer
-                if self.fecha_desde:
-                    fecha_desde = self.fecha_desde
-                else:
-                    fecha_desde = ayer.strftime("%d-%m-%Y")
-                
-                if self.fecha_hasta:
-                    fecha_hasta = self.fecha_hasta
-                else:
-                    fecha_hasta = ayer.strftime("%d-%m-%Y")
-                
-                logger.info(f"\nBuscando licitaciones publicadas entre: {fecha_desde} y {fecha_hasta}")
-                if self.cpv_codes:
-                    logger.info(f"Filtros: Estado=Publicada, CPV={', '.join(self.cpv_codes)}")
-                else:
-                    logger.info("Filtros: Estado=Publicada (sin filtro CPV)")
-                
-                # PRIMERO: Agregar los códigos CPV (solo si se proporcionaron)
-                if self.cpv_codes:
-                    logger.info("\n--- Agregando códigos CPV ---")
-                    for idx, cpv_code in enumerate(self.cpv_codes, 1):
-                        try:
-                            logger.info(f"\nAgregando CPV {cpv_code} ({idx}/{len(self.cpv_codes)})...")
-                            campo_cpv = self.driver.find_element(By.ID, "viewns_Z7_AVEQAI930OBRD02JPMTPG21004_:form1:cpvMultiple:codigoCpv")
-                            campo_cpv.clear()
-                            campo_cpv.send_keys(cpv_code)
-                            
-                            # Click en botón "Add"
-                            boton_add_cpv = self.driver.find_element(By.ID, "viewns_Z7_AVEQAI930OBRD02JPMTPG21004_:form1:cpvMultiplebuttonAnyadirMultiple")
-                            boton_add_cpv.click()
-                            logger.info(f"✓ Click en 'Add' para CPV {cpv_code}")
-                            
-                            # Esperar a que recargue la página
-                            time.sleep(3)
-                            logger.info(f"✓ CPV {cpv_code} agregado")
-                        except Exception as e:
-                            logger.error(f"Error al agregar CPV {cpv_code}: {e}")
-                    
-                    logger.info(f"✓ Todos los CPV agregados correctamente ({len(self.cpv_codes)} códigos)")
-                else:
-                    logger.info("\n⚠ No se especificaron códigos CPV - buscando todas las licitaciones")
-                
-                # SEGUNDO: Llenar el resto de campos del formulario
-                # Llenar campo de fecha desde (fecha publicación desde)
-                try:
-                    campo_fecha_desde = self.driver.find_element(By.ID, "viewns_Z7_AVEQAI930OBRD02JPMTPG21004_:form1:textMinFecAnuncioMAQ2")
-                    campo_fecha_desde.clear()
-                    campo_fecha_desde.send_keys(fecha_desde)
-                    logger.info(f"✓ Fecha desde: {fecha_desde}")
-                except Exception as e:
-                    logger.error(f"Error al llenar fecha desde: {e}")
-                
-                # Llenar campo de fecha hasta (fecha publicación hasta)
-                try:
-                    campo_fecha_hasta = self.driver.find_element(By.ID, "viewns_Z7_AVEQAI930OBRD02JPMTPG21004_:form1:textMaxFecAnuncioMAQ")
-                    campo_fecha_hasta.clear()
-                    campo_fecha_hasta.send_keys(fecha_hasta)
-                    logger.info(f"✓ Fecha hasta: {fecha_hasta}")
-                except Exception as e:
-                    logger.error(f"Error al llenar fecha hasta: {e}")
-                
-                # Seleccionar Estado: Publicada
-                try:
-                    select_estado = Select(self.driver.find_element(By.ID, "viewns_Z7_AVEQAI930OBRD02JPMTPG21004_:form1:estadoLici"))
-                    select_estado.select_by_value("PUB")
-                    logger.info("✓ Estado: Publicada")
-                except Exception as e:
-                    logger.error(f"Error al seleccionar estado: {e}")
-                
-                # Captura antes de buscar
-                screenshot_path = os.path.join(self.output_folder, "screenshot_antes_busqueda.png")
-                self.driver.save_screenshot(screenshot_path)
-                logger.info(f"✓ Captura guardada: {screenshot_path}")
-                
-                # Hacer click en el botón de búsqueda
-                try:
-                    boton_buscar = self.driver.find_element(By.ID, "viewns_Z7_AVEQAI930OBRD02JPMTPG21004_:form1:button1")
-                    logger.info("\nRealizando búsqueda...")
-                    boton_buscar.click()
+                if inp.is_displayed():  # Solo campos visibles
+                    input_type = inp.get_attribute("type")
+                    name = inp.get_attribute("name")
+                    placeholder = inp.get_attribute("placeholder")
+                    id_attr = inp.get_attribute("id")
+                    value = inp.get_attribute("value")
                     
-                    # Esperar resultados
-                    time.sleep(5)
-                    
-                    # ===================================================================
-                    # PASO 4: EXTRAER RESULTADOS CON PAGINACIÓN
-                    # ===================================================================
-                    logger.info("\n" + "="*80)
-                    logger.info("EXTRAYENDO RESULTADOS")
-                    logger.info("=" * 80)
+                    if input_type not in ['hidden']:
+                        logger.info(f"  ✓ type={input_type}, name={name}, placeholder={placeholder}")
+                        campos_visibles.append({
+                            'type': input_type,
+                            'name': name,
+                            'placeholder': placeholder,
+                            'id': id_attr,
+                            'value': value
+                        })
+            except:
+                pass
+        
+        # Buscar selects visibles
+        selects = self.driver.find_elements(By.TAG_NAME, "select")
+        logger.info(f"\nSelects encontrados: {len(selects)}")
+        
+        for sel in selects:
+            try:
+                if sel.is_displayed():
+                    name = sel.get_attribute("name")
+                    id_attr = sel.get_attribute("id")
+                    logger.info(f"  ✓ name={name}, id={id_attr}")
                     
-                    # Lista para almacenar todas las licitaciones de todas las páginas
-                    todas_licitaciones = []
-                    pagina_actual = 1
+                    # Ver opciones
+                    options = sel.find_elements(By.TAG_NAME, "option")
+                    if len(options) > 0 and len(options) <= 10:
+                        logger.info(f"    Opciones:")
+                        for opt in options[:5]:
+                            logger.info(f"      - {opt.text}")
+            except:
+                pass
+        
+        # Buscar botones visibles
+        botones = self.driver.find_elements(By.TAG_NAME, "button")
+        logger.info(f"\nBotones encontrados: {len(botones)}")
+        
+        for btn in botones:
+            try:
+                if btn.is_displayed():
+                    texto = btn.text.strip()
+                    btn_type = btn.get_attribute("type")
+                    if texto:
+                        logger.info(f"  ✓ '{texto}' (type={btn_type})")
+            except:
+                pass
+        
+        # Guardar campos encontrados
+        if campos_visibles:
+            json_path = os.path.join(self.output_folder, 'campos_formulario_busqueda.json')
+            with open(json_path, 'w', encoding='utf-8') as f:
+                json.dump(campos_visibles, f, indent=2, ensure_ascii=False)
+            logger.info(f"\n✓ Campos del formulario guardados: {json_path}")
+    
+    def _rellenar_formulario(self):
+        """Rellena CPV, fechas y estado en el formulario de búsqueda"""
+        # ===================================================================
+        # PASO 3: LLENAR EL FORMULARIO
+        # ===================================================================
+        logger.info("\n" + "="*80)
+        logger.info("LLENANDO FORMULARIO DE BÚSQUEDA")
+        logger.info("="*80)
+        
+        # Obtener fechas (usar las proporcionadas o las de ayer por defecto)
+        from datetime import datetime, timedelta
+        from selenium.webdriver.support.ui import Select
+        ayer = datetime.now() - timedelta(days=1)
+        
+        # Si no se proporcionan fechas, usar ayer
+        if self.fecha_desde:
+            fecha_desde = self.fecha_desde
+        else:
+            fecha_desde = ayer.strftime("%d-%m-%Y")
+        
+        if self.fecha_hasta:
+            fecha_hasta = self.fecha_hasta
+        else:
+            fecha_hasta = ayer.strftime("%d-%m-%Y")
+        
+        self.fechas_busqueda = (fecha_desde, fecha_hasta)
+        logger.info(f"\nBuscando licitaciones publicadas entre: {fecha_desde} y {fecha_hasta}")
+        if self.cpv_codes:
+            logger.info(f"Filtros: Estado=Publicada, CPV={', '.join(self.cpv_codes)}")
+        else:
+            logger.info("Filtros: Estado=Publicada (sin filtro CPV)")
+        
+        # PRIMERO: Agregar los códigos CPV (solo si se proporcionaron)
+        if self.cpv_codes:
+            logger.info("\n--- Agregando códigos CPV ---")
+            for idx, cpv_code in enumerate(self.cpv_codes, 1):
+                logger.info(f"\nAgregando CPV {cpv_code} ({idx}/{len(self.cpv_codes)})...")
+                # Si se agotan los reintentos se aborta: buscar sin ese CPV daría resultados incorrectos
+                self.reintentos.ejecutar(
+                    lambda: self._agregar_cpv(cpv_code),
+                    f"Agregar CPV {cpv_code}",
+                    excepciones=(WebDriverException,)
+                )
+            
+            logger.info(f"✓ Todos los CPV agregados correctamente ({len(self.cpv_codes)} códigos)")
+        else:
+            logger.info("\n⚠ No se especificaron códigos CPV - buscando todas las licitaciones")
+        
+        # SEGUNDO: Llenar el resto de campos del formulario
+        # Llenar campo de fecha desde (fecha publicación desde)
+        try:
+            campo_fecha_desde = self.driver.find_element(By.ID, "viewns_Z7_AVEQAI930OBRD02JPMTPG21004_:form1:textMinFecAnuncioMAQ2")
+            campo_fecha_desde.clear()
+            campo_fecha_desde.send_keys(fecha_desde)
+            logger.info(f"✓ Fecha desde: {fecha_desde}")
+        except Exception as e:
+            logger.error(f"Error al llenar fecha desde: {e}")
+        
+        # Llenar campo de fecha hasta (fecha publicación hasta)
+        try:
+            campo_fecha_hasta = self.driver.find_element(By.ID, "viewns_Z7_AVEQAI930OBRD02JPMTPG21004_:form1:textMaxFecAnuncioMAQ")
+            campo_fecha_hasta.clear()
+            campo_fecha_hasta.send_keys(fecha_hasta)
+            logger.info(f"✓ Fecha hasta: {fecha_hasta}")
+        except Exception as e:
+            logger.error(f"Error al llenar fecha hasta: {e}")
+        
+        # Seleccionar Estado: Publicada
+        try:
+            select_estado = Select(self.driver.find_element(By.ID, "viewns_Z7_AVEQAI930OBRD02JPMTPG21004_:form1:estadoLici"))
+            select_estado.select_by_value("PUB")
+            logger.info("✓ Estado: Publicada")
+        except Exception as e:
+            logger.error(f"Error al seleccionar estado: {e}")
+        
+        # Captura antes de buscar
+        screenshot_path = os.path.join(self.output_folder, "screenshot_antes_busqueda.png")
+        self.driver.save_screenshot(screenshot_path)
+        logger.info(f"✓ Captura guardada: {screenshot_path}")
+    
+    def _agregar_cpv(self, cpv_code):
+        """Escribe un código CPV y pulsa 'Add'"""
+        campo_cpv = self.driver.find_element(By.ID, "viewns_Z7_AVEQAI930OBRD02JPMTPG21004_:form1:cpvMultiple:codigoCpv")
+        campo_cpv.clear()
+        campo_cpv.send_keys(cpv_code)
+        
+        # Click en botón "Add"
+        boton_add_cpv = self.driver.find_element(By.ID, "viewns_Z7_AVEQAI930OBRD02JPMTPG21004_:form1:cpvMultiplebuttonAnyadirMultiple")
+        gobernador.esperar_turno("cpv")
+        boton_add_cpv.click()
+        logger.info(f"✓ Click en 'Add' para CPV {cpv_code}")
+        
+        # Esperar a que recargue la página
+        time.sleep(3)
+        logger.info(f"✓ CPV {cpv_code} agregado")
+    
+    def _buscar(self):
+        """Lanza la búsqueda con el formulario ya relleno (con reintentos)"""
+        self.reintentos.ejecutar(
+            self._pulsar_buscar,
+            "Búsqueda",
+            excepciones=(WebDriverException,),
+            circuito=circuito_portal
+        )
+    
+    def _pulsar_buscar(self):
+        boton_buscar = self.driver.find_element(By.ID, "viewns_Z7_AVEQAI930OBRD02JPMTPG21004_:form1:button1")
+        logger.info("\nRealizando búsqueda...")
+        gobernador.esperar_turno("búsqueda")
+        boton_buscar.click()
+        
+        # Esperar resultados
+        time.sleep(5)
+    
+    def _guardar_artefactos_pagina(self, pagina_actual):
+        """Guarda captura y HTML de la página de resultados actual"""
+        # Captura de la página actual
+        screenshot_path = os.path.join(self.output_folder, f'screenshot_resultados_pagina_{pagina_actual}.png')
+        self.driver.save_screenshot(screenshot_path)
+        logger.info(f"✓ Captura guardada: {screenshot_path}")
+        
+        # Guardar HTML de la página actual
+        html_path = os.path.join(self.output_folder, f'resultados_pagina_{pagina_actual}.html')
+        with open(html_path, 'w', encoding='utf-8') as f:
+            f.write(self.driver.page_source)
+        logger.info(f"✓ HTML guardado: {html_path}")
+    
+    def _extraer_filas(self):
+        """Extrae las licitaciones de las tablas de la página de resultados actual"""
+        # Buscar tabla o lista de resultados
+        tablas = self.driver.find_elements(By.TAG_NAME, "table")
+        logger.info(f"Tablas encontradas: {len(tablas)}")
+        
+        # Buscar filas en todas las tablas
+        licitaciones_pagina = []
+        for idx, tabla in enumerate(tablas):
+            filas = tabla.find_elements(By.TAG_NAME, "tr")
+            
+            # Si la tabla tiene filas, intentar extraer datos
+            if len(filas) > 1:  # Más de 1 fila (encabezado + datos)
+                for fila_idx, fila in enumerate(filas[1:], 1):  # Saltar encabezado
+                    celdas = fila.find_elements(By.TAG_NAME, "td")
                     
-                    while True:
-                        logger.info(f"\n--- Procesando página {pagina_actual} ---")
-                        
-                        # Captura de la página actual
-                        screenshot_path = os.path.join(self.output_folder, f'screenshot_resultados_pagina_{pagina_actual}.png')
-                        self.driver.save_screenshot(screenshot_path)
-                        logger.info(f"✓ Captura guardada: {screenshot_path}")
-                        
-                        # Guardar HTML de la página actual
-                        html_path = os.path.join(self.output_folder, f'resultados_pagina_{pagina_actual}.html')
-                        with open(html_path, 'w', encoding='utf-8') as f:
-                            f.write(self.driver.page_source)
-                        logger.info(f"✓ HTML guardado: {html_path}")
-                        
-                        # Buscar tabla o lista de resultados
-                        tablas = self.driver.find_elements(By.TAG_NAME, "table")
-                        logger.info(f"Tablas encontradas: {len(tablas)}")
-                        
-                        # Buscar filas en todas las tablas
-                        licitaciones_pagina = []
-                        for idx, tabla in enumerate(tablas):
-                            filas = tabla.find_elements(By.TAG_NAME, "tr")
-                            
-                            # Si la tabla tiene filas, intentar extraer datos
-                            if len(filas) > 1:  # Más de 1 fila (encabezado + datos)
-                                for fila_idx, fila in enumerate(filas[1:], 1):  # Saltar encabezado
-                                    celdas = fila.find_elements(By.TAG_NAME, "td")
-                                    
-                                    # Verificar que tenga 6 columnas (formato esperado)
-                                    if len(celdas) == 6:
-                                        try:
-                                            # Extraer datos estructurados
-                                            expediente_celda = celdas[0].text.strip()
-                                            tipo_contrato = celdas[1].text.strip()
-                                            estado = celdas[2].text.strip()
-                                            importe = celdas[3].text.strip()
-                                            fecha = celdas[4].text.strip()
-                                            organismo = celdas[5].text.strip()
-                                            
-                                            # Separar expediente y descripción
-                                            lineas_exp = expediente_celda.split('\n', 1)
-                                            expediente = lineas_exp[0] if lineas_exp else ""
-                                            descripcion = lineas_exp[1] if len(lineas_exp) > 1 else ""
-                                            
-                                            # Buscar el enlace del expediente (el que termina en %3D%3D)
-                                            try:
-                                                # Buscar el enlace con target="_blank" que es el correcto
-                                                enlaces = celdas[0].find_elements(By.CSS_SELECTOR, "a[target='_blank']")
-                                                if enlaces:
-                                                    enlace_detalle = enlaces[0].get_attribute("href")
-                                                else:
-                                                    # Fallback: buscar cualquier enlace con href
-                                                    enlace_elem = celdas[0].find_element(By.TAG_NAME, "a")
-                                                    enlace_detalle = enlace_elem.get_attribute("href") if enlace_elem.get_attribute("href") else ""
-                                            except:
-                                                enlace_detalle = ""
-                                            
-                                            # Separar tipo y subtipo
-                                            lineas_tipo = tipo_contrato.split('\n', 1)
-                                            tipo = lineas_tipo[0] if lineas_tipo else ""
-                                            subtipo = lineas_tipo[1] if len(lineas_tipo) > 1 else ""
-                                            
-                                            # Solo guardar si tiene datos válidos (no es la fila de paginación)
-                                            if expediente and not expediente.startswith("Página"):
-                                                licitacion = {
-                                                    'expediente': expediente,
-                                                    'descripcion': descripcion,
-                                                    'tipo': tipo,
-                                                    'subtipo': subtipo,
-                                                    'estado': estado,
-                                                    'importe': importe,
-                                                    'fecha': fecha,
-                                                    'organismo': organismo,
-                                                    'enlace': enlace_detalle
-                                                }
-                                                licitaciones_pagina.append(licitacion)
-                                        except Exception as e:
-                                            logger.error(f"Error al procesar fila {fila_idx} de tabla {idx+1}: {e}")
-                        
-                        # Agregar licitaciones de esta página al total
-                        todas_licitaciones.extend(licitaciones_pagina)
-                        logger.info(f"✓ Licitaciones en página {pagina_actual}: {len(licitaciones_pagina)}")
-                        logger.info(f"✓ Total acumulado: {len(todas_licitaciones)}")
-                        
-                        # Buscar el botón "Next >>" para ir a la siguiente página
-                        # El botón es un input type="submit" con id específico
+                    # Verificar que tenga 6 columnas (formato esperado)
+                    if len(celdas) == 6:
                         try:
-                            logger.info(f"\nBuscando botón 'Next >>' (input type=submit)...")
-                            boton_next = self.driver.find_element(By.ID, "viewns_Z7_AVEQAI930OBRD02JPMTPG21004_:form1:footerSiguiente")
+                            # Extraer datos estructurados
+                            textos = [celda.text for celda in celdas]
+                            
+                            # Buscar el enlace del expediente (el que termina en %3D%3D)
+                            try:
+                                # Buscar el enlace con target="_blank" que es el correcto
+                                enlaces = celdas[0].find_elements(By.CSS_SELECTOR, "a[target='_blank']")
+                                if enlaces:
+                                    enlace_detalle = enlaces[0].get_attribute("href")
+                                else:
+                                    # Fallback: buscar cualquier enlace con href
+                                    enlace_elem = celdas[0].find_element(By.TAG_NAME, "a")
+                                    enlace_detalle = enlace_elem.get_attribute("href") if enlace_elem.get_attribute("href") else ""
+                            except:
+                                enlace_detalle = ""
                             
-                            if boton_next and boton_next.is_displayed() and boton_next.is_enabled():
-                                logger.info(f"✓ Botón 'Next >>' encontrado y disponible")
-                                logger.info(f"→ Haciendo clic para ir a página {pagina_actual + 1}...")
-                                
-                                # Scroll al botón
-                                self.driver.execute_script("arguments[0].scrollIntoView(true);", boton_next)
-                                time.sleep(0.5)
-                                
-                                boton_next.click()
-                                time.sleep(4)  # Esperar a que cargue la siguiente página
-                                pagina_actual += 1
-                            else:
-                                logger.info("\n✓ Botón 'Next' no disponible. Última página alcanzada.")
-                                break
-                                
-                        except NoSuchElementException:
-                            logger.info("\n✓ Botón 'Next' no encontrado. Última página alcanzada.")
-                            break
+                            # Solo guardar si tiene datos válidos (no es la fila de paginación)
+                            licitacion = licitacion_desde_celdas(textos, enlace_detalle)
+                            if licitacion:
+                                licitaciones_pagina.append(licitacion)
+                        except StaleElementReferenceException:
+                            # La página cambió durante la lectura: se reintenta la página entera
+                            raise
                         except Exception as e:
-                            logger.warning(f"Error al buscar/hacer clic en botón 'Next': {e}")
-                            logger.info("✓ Asumiendo que es la última página.")
-                            break
-                    
-                    logger.info(f"\n✓ TOTAL de licitaciones extraídas: {len(todas_licitaciones)} (de {pagina_actual} página(s))")
-                    
-                    # Guardar resultados
-                    if todas_licitaciones:
-                        # Guardar JSON
-                        json_path = os.path.join(self.output_folder, 'licitaciones_extraidas.json')
-                        with open(json_path, 'w', encoding='utf-8') as f:
-                            json.dump(todas_licitaciones, f, ensure_ascii=False, indent=2)
-                        logger.info(f"✓ Resultados guardados: {json_path}")
-                        
-                        # Guardar CSV
-                        import pandas as pd
-                        df = pd.DataFrame(todas_licitaciones)
-                        csv_filename = os.path.join(self.output_folder, f'licitaciones_{hoy.strftime("%Y%m%d")}.csv')
-                        df.to_csv(csv_filename, index=False, encoding='utf-8-sig')
-                        logger.info(f"✓ Resultados guardados: {csv_filename}")
-                        
-                        # Mostrar primeras 5 licitaciones
-                        logger.info("\nPrimeras licitaciones encontradas:")
-                        for i, lic in enumerate(todas_licitaciones[:5], 1):
-                            logger.info(f"\n  Licitación {i}:")
-                            logger.info(f"    Expediente: {lic['expediente']}")
-                            logger.info(f"    Descripción: {lic['descripcion'][:80]}...")
-                            logger.info(f"    Tipo: {lic['tipo']} - {lic['subtipo']}")
-                            logger.info(f"    Estado: {lic['estado']}")
-                            logger.info(f"    Importe: {lic['importe']}")
-                            logger.info(f"    Fecha: {lic['fecha']}")
-                            logger.info(f"    Organismo: {lic['organismo'][:60]}...")
-                    else:
-                        logger.info("⚠ No se encontraron licitaciones en las tablas")
-                        
-                except Exception as e:
-                    logger.error(f"Error al buscar o extraer resultados: {e}")
-                    import traceback
-                    traceback.print_exc()
-                
+                            logger.error(f"Error al procesar fila {fila_idx} de tabla {idx+1}: {e}")
+        
+        return licitaciones_pagina
+    
+    def _extraer_pagina(self, pagina_actual):
+        """Extrae las filas de la página actual, repitiendo la página entera si falla"""
+        return self.reintentos.ejecutar(
+            self._extraer_filas,
+            f"Extracción de la página {pagina_actual}",
+            excepciones=(WebDriverException,)
+        )
+    
+    def _firma_pagina(self):
+        """Primera celda de la primera fila de resultados: identifica la página mostrada"""
+        return self.driver.execute_script(
+            "for (const tr of document.querySelectorAll('table tr')) {"
+            "  const celdas = tr.querySelectorAll(':scope > td');"
+            "  if (celdas.length === 6) return celdas[0].innerText;"
+            "}"
+            "return null;"
+        )
+    
+    def _avanzar_pagina(self, pagina_actual):
+        """
+        Avanza a la página siguiente con reintentos
+        
+        Antes de repetir el clic se comprueba si la página ya cambió en el
+        intento fallido, para no saltarse una página con un doble avance.
+        
+        Returns:
+            bool: True si se avanzó, False si es la última página.
+        """
+        try:
+            firma_inicial = self._firma_pagina()
+        except WebDriverException:
+            firma_inicial = None
+        intentos = []
+        
+        def avanzar():
+            if intentos and self._firma_pagina() != firma_inicial:
+                logger.info("✓ La página ya había avanzado en el intento anterior")
                 return True
-                
-            except NoSuchElementException:
-                logger.error("✗ No se encontró el enlace de 'Bids'")
-                return False
+            intentos.append(1)
+            return self._pulsar_siguiente(pagina_actual)
+        
+        return self.reintentos.ejecutar(
+            avanzar,
+            f"Avance a la página {pagina_actual + 1}",
+            excepciones=(WebDriverException,)
+        )
+    
+    def _pulsar_siguiente(self, pagina_actual):
+        """
+        Pulsa 'Next >>' para ir a la página siguiente
+        
+        Returns:
+            bool: True si se avanzó, False si es la última página.
+            Cualquier otro error se propaga: la paginación queda incompleta
+            y se puede reanudar desde el checkpoint.
+        """
+        # El botón es un input type="submit" con id específico
+        try:
+            logger.info(f"\nBuscando botón 'Next >>' (input type=submit)...")
+            boton_next = self.driver.find_element(By.ID, "viewns_Z7_AVEQAI930OBRD02JPMTPG21004_:form1:footerSiguiente")
+        except NoSuchElementException:
+            logger.info("\n✓ Botón 'Next' no encontrado. Última página alcanzada.")
+            return False
+        
+        if not (boton_next and boton_next.is_displayed() and boton_next.is_enabled()):
+            logger.info("\n✓ Botón 'Next' no disponible. Última página alcanzada.")
+            return False
+        
+        logger.info(f"✓ Botón 'Next >>' encontrado y disponible")
+        logger.info(f"→ Haciendo clic para ir a página {pagina_actual + 1}...")
+        
+        # Scroll al botón
+        self.driver.execute_script("arguments[0].scrollIntoView(true);", boton_next)
+        time.sleep(0.5)
+        
+        gobernador.esperar_turno("paginación")
+        boton_next.click()
+        time.sleep(4)  # Esperar a que cargue la siguiente página
+        return True
+    
+    def _reposicionar(self):
+        """
+        Lleva la búsqueda a la primera página pendiente según el checkpoint
+        
+        Returns:
+            int: Página desde la que continuar la extracción, o None si la
+            página del checkpoint era la última.
+        """
+        if not self.pagina_completada:
+            return 1
+        
+        logger.info(f"\n→ Reanudando: avanzando hasta la página {self.pagina_completada} sin extraer...")
+        for pagina in range(1, self.pagina_completada):
+            self._comprobar_cancelacion()
+            if not self._avanzar_pagina(pagina):
+                raise RuntimeError(f"La búsqueda tiene menos páginas ({pagina}) que el checkpoint ({self.pagina_completada})")
+        
+        # Comprobar que la página coincide con la registrada en el checkpoint
+        claves = [clave_licitacion(lic) for lic in self._extraer_pagina(self.pagina_completada)]
+        if self.ultima_clave and (not claves or claves[-1] != self.ultima_clave):
+            logger.warning("⚠ La última fila de la página reanudada no coincide con el checkpoint "
+                           "(los resultados del portal pueden haber cambiado)")
+        
+        if not self._avanzar_pagina(self.pagina_completada):
+            return None
+        return self.pagina_completada + 1
+    
+    def _paginar(self, pagina_actual):
+        """Extrae página a página, registrando un checkpoint tras cada página completada"""
+        while True:
+            # Antes de cada página: una extracción abandonada se detiene como mucho una página después
+            self._comprobar_cancelacion()
+            logger.info(f"\n--- Procesando página {pagina_actual} ---")
             
-            # Código original para análisis general (se ejecuta si no se encuentra el enlace)
+            self._guardar_artefactos_pagina(pagina_actual)
+            licitaciones_pagina = self._extraer_pagina(pagina_actual)
             
-            # Buscar el enlace de "Búsqueda guiada" o "Nueva búsqueda"
-            logger.info("\nBuscando enlaces de búsqueda...")
-            enlaces = self.driver.find_elements(By.TAG_NAME, "a")
-            enlaces_busqueda = []
+            # Agregar licitaciones de esta página al total
+            for licitacion in licitaciones_pagina:
+                self._actualizar_hash(licitacion)
+            self.licitaciones.extend(licitaciones_pagina)
+            if licitaciones_pagina:
+                self.ultima_clave = clave_licitacion(licitaciones_pagina[-1])
+            self.checkpoint.registrar_pagina(
+                self._consulta(),
+                pagina_actual,
+                licitaciones_pagina,
+                len(self.licitaciones),
+                self.ultima_clave
+            )
+            self.pagina_completada = pagina_actual
             
-            for enlace in enlaces:
-                texto = enlace.text.strip()
-                href = enlace.get_attribute("href")
-                
-                if any(palabra in texto.lower() for palabra in ['búsqueda', 'busqueda', 'guiada', 'nueva']):
-                    logger.info(f"  ✓ '{texto}' -> {href}")
-                    enlaces_busqueda.append((texto, href, enlace))
+            logger.info(f"✓ Licitaciones en página {pagina_actual}: {len(licitaciones_pagina)}")
+            self.metricas_red.registrar_carga(self.driver, f"resultados_{pagina_actual}")
+            self.metricas_red.recoger(self.driver)
+            self._registrar_latencia()
+            logger.info(f"✓ Total acumulado: {len(self.licitaciones)}")
+            if self.progreso is not None:
+                self.progreso.pagina_procesada(pagina_actual, len(self.licitaciones), self._paginas_totales())
             
-            # Intentar hacer click en "Búsqueda guiada" si existe
-            if enlaces_busqueda:
-                logger.info(f"\nIntentando acceder a: {enlaces_busqueda[0][0]}")
+            # Navegador demasiado grande o con demasiadas páginas: nueva sesión en la misma página
+            if self.memoria.pagina_procesada(self.driver):
+                self._reciclar_navegador()
+                pagina_actual = self._reposicionar()
+                if pagina_actual is None:
+                    break
+                continue
+            
+            # Buscar el botón "Next >>" para ir a la siguiente página
+            if not self._avanzar_pagina(pagina_actual):
+                break
+            pagina_actual += 1
+    
+    def _reciclar_navegador(self):
+        """Cierra el navegador y repite formulario y búsqueda con uno nuevo (la paginación sigue desde el checkpoint)"""
+        self.metricas_red.recoger(self.driver)
+        self.driver.quit()
+        self.driver = None
+        self._liberar_perfil_cache()
+        self.memoria.sesion_reciclada()
+        
+        self._setup_driver()
+        self._abrir_formulario()
+        self._rellenar_formulario()
+        self._buscar()
+        logger.info(f"✓ Navegador reciclado ({self.memoria.reciclajes}); volviendo a la página {self.pagina_completada}")
+    
+    def _guardar_resultados(self):
+        """Calcula el hash final y guarda JSON y CSV con las licitaciones acumuladas"""
+        estado = "completa" if self.completo else "INCOMPLETA (reanudable desde el checkpoint)"
+        logger.info(f"\n✓ TOTAL de licitaciones extraídas: {len(self.licitaciones)} (de {self.pagina_completada} página(s), extracción {estado})")
+        self.content_hash = self.hash_contenido.hexdigest()
+        self.ultima_modificacion = time.time()
+        
+        # Guardar JSON siempre, también vacío: el almacén sirve el resultado desde este archivo
+        # y, si falta, lo descarta como fallo de caché (un día sin licitaciones es un resultado válido)
+        json_path = os.path.join(self.output_folder, 'licitaciones_extraidas.json')
+        with open(json_path, 'w', encoding='utf-8') as f:
+            json.dump(self.licitaciones, f, ensure_ascii=False, indent=2)
+        logger.info(f"✓ Resultados guardados: {json_path}")
+
+        if self.licitaciones:
+            # Guardar CSV
+            import pandas as pd
+            df = pd.DataFrame(self.licitaciones)
+            hoy = datetime.now()
+            csv_filename = os.path.join(self.output_folder, f'licitaciones_{hoy.strftime("%Y%m%d")}.csv')
+            df.to_csv(csv_filename, index=False, encoding='utf-8-sig')
+            logger.info(f"✓ Resultados guardados: {csv_filename}")
+
+            # Dataset Parquet particionado por fecha (solo extracciones completas)
+            if PARQUET_EXPORTAR and self.completo:
                 try:
-                    enlaces_busqueda[0][2].click()
-                    logger.info("✓ Click realizado, esperando nueva página...")
-                    time.sleep(5)
-                    
-                    # Tomar otra captura
-                    self.driver.save_screenshot('screenshot_busqueda_guiada.png')
-                    logger.info("✓ Captura guardada: screenshot_busqueda_guiada.png")
-                    
+                    from exportacion import exportar
+                    exportar(self.licitaciones)
                 except Exception as e:
-                    logger.warning(f"No se pudo hacer click: {str(e)}")
-            
-            # Buscar campos del formulario
-            logger.info("\nBuscando campos del formulario...")
-            inputs = self.driver.find_elements(By.TAG_NAME, "input")
-            logger.info(f"Inputs encontrados: {len(inputs)}")
-            
-            campos_importantes = []
-            for inp in inputs[:20]:  # Solo primeros 20 para no saturar
-                input_type = inp.get_attribute("type")
-                name = inp.get_attribute("name")
-                placeholder = inp.get_attribute("placeholder")
-                id_attr = inp.get_attribute("id")
-                
-                # Solo mostrar campos relevantes (no hidden)
-                if input_type not in ['hidden', 'submit']:
-                    logger.info(f"  - type={input_type}, name={name}, placeholder={placeholder}, id={id_attr}")
-                    campos_importantes.append({
-                        'type': input_type,
-                        'name': name,
-                        'placeholder': placeholder,
-                        'id': id_attr
-                    })
+                    logger.warning(f"⚠ No se pudo exportar a Parquet: {e}")
             
-            # Buscar select (desplegables)
-            logger.info("\nBuscando campos select (desplegables)...")
-            selects = self.driver.find_elements(By.TAG_NAME, "select")
-            logger.info(f"Selects encontrados: {len(selects)}")
+            # Mostrar primeras 5 licitaciones
+            logger.info("\nPrimeras licitaciones encontradas:")
+            for i, lic in enumerate(self.licitaciones[:5], 1):
+                logger.info(f"\n  Licitación {i}:")
+                logger.info(f"    Expediente: {lic['expediente']}")
+                logger.info(f"    Descripción: {lic['descripcion'][:80]}...")
+                logger.info(f"    Tipo: {lic['tipo']} - {lic['subtipo']}")
+                logger.info(f"    Estado: {lic['estado']}")
+                logger.info(f"    Importe: {lic['importe']}")
+                logger.info(f"    Fecha: {lic['fecha']}")
+                logger.info(f"    Organismo: {lic['organismo'][:60]}...")
+        else:
+            logger.info("⚠ No se encontraron licitaciones en las tablas")
+    
+    def scrape_licitaciones(self):
+        """Realiza el scraping usando Selenium"""
+        try:
+            if self.completo:
+                # Reanudación de una ejecución que ya había terminado
+                logger.info("✓ El checkpoint indica que la ejecución ya estaba completa")
+                self._guardar_resultados()
+                return True
             
-            for sel in selects[:10]:
-                name = sel.get_attribute("name")
-                id_attr = sel.get_attribute("id")
-                logger.info(f"  - name={name}, id={id_attr}")
+            if not self.driver:
+                self._comprobar_cancelacion()
+                self._fase("navegador")
+                self._setup_driver()
             
-            # Buscar botones
-            logger.info("\nBuscando botones...")
-            botones = self.driver.find_elements(By.TAG_NAME, "button")
-            logger.info(f"Botones encontrados: {len(botones)}")
+            try:
+                self._comprobar_cancelacion()
+                self._fase("formulario")
+                self._abrir_formulario()
+            except NoSuchElementException:
+                logger.error("✗ No se encontró el enlace de 'Bids'")
+                return False
             
-            for btn in botones[:15]:
-                texto = btn.text.strip()
-                btn_type = btn.get_attribute("type")
-                if texto or btn_type == "submit":
-                    logger.info(f"  - '{texto}' (type={btn_type})")
+            self._analizar_formulario()
+            self._rellenar_formulario()
             
-            # Guardar HTML completo
-            with open('pagina_selenium.html', 'w', encoding='utf-8') as f:
-                f.write(self.driver.page_source)
-            logger.info("\n✓ HTML completo guardado: pagina_selenium.html")
+            # Hacer click en el botón de búsqueda y extraer con paginación
+            try:
+                self._comprobar_cancelacion()
+                self._fase("busqueda")
+                self._buscar()
+                
+                # ===================================================================
+                # PASO 4: EXTRAER RESULTADOS CON PAGINACIÓN
+                # ===================================================================
+                logger.info("\n" + "="*80)
+                logger.info("EXTRAYENDO RESULTADOS")
+                logger.info("=" * 80)
+                
+                pagina_inicial = self._reposicionar()
+                if pagina_inicial is not None:
+                    self._paginar(pagina_inicial)
+                self.completo = True
+                self.checkpoint.marcar_completo()
             
-            # Guardar datos de campos encontrados
-            if campos_importantes:
-                with open('campos_encontrados_selenium.json', 'w', encoding='utf-8') as f:
-                    json.dump(campos_importantes, f, indent=2, ensure_ascii=False)
-                logger.info("✓ Campos guardados: campos_encontrados_selenium.json")
+            except (CircuitoAbiertoError, ExtraccionCancelada):
+                raise
             
-            logger.info("\n" + "="*80)
-            logger.info("RESUMEN DEL ANÁLISIS")
-            logger.info("="*80)
-            logger.info(f"Iframes: {len(iframes)}")
-            logger.info(f"Enlaces de búsqueda: {len(enlaces_busqueda)}")
-            logger.info(f"Campos de formulario: {len(campos_importantes)}")
-            logger.info(f"Botones: {len(botones)}")
-            logger.info("\nArchivos generados:")
-            logger.info("  - screenshot_formulario.png")
-            if enlaces_busqueda:
-                logger.info("  - screenshot_busqueda_guiada.png")
-            logger.info("  - pagina_selenium.html")
-            logger.info("  - campos_encontrados_selenium.json")
-            logger.info("\nRevisa estos archivos para entender la estructura.")
+            except Exception as e:
+                logger.error(f"Error al buscar o extraer resultados: {e}")
+                logger.error(f"✗ Paginación interrumpida tras la página {self.pagina_completada}; "
+                             f"reanudable desde {self.output_folder}")
+                import traceback
+                traceback.print_exc()
             
+            self._fase("guardando")
+            self._guardar_resultados()
             return True
-                
+        
+        except CircuitoAbiertoError:
+            raise
+        
+        except ExtraccionCancelada as e:
+            # Sin JSON/CSV para nadie: el checkpoint de las páginas ya hechas permite reanudar
+            logger.warning(f"⚠ Extracción cancelada ({e.motivo}) tras la página {self.pagina_completada}; "
+                           f"reanudable desde {self.output_folder}")
+            raise
+        
         except Exception as e:
             logger.error(f"Error en scrape_licitaciones: {str(e)}")
             import traceback
@@ -570,16 +812,19 @@ class LicitacionesScraperSelenium:
         
         finally:
             if self.driver:
+                self._guardar_metricas_red()
                 logger.info("\nCerrando navegador...")
                 self.driver.quit()
+            self._liberar_perfil_cache()
     
     def close(self):
         """Cierra el navegador"""
         if self.driver:
             self.driver.quit()
+        self._liberar_perfil_cache()
 
 
-def ejecutar_scraping(cpv_codes=None, fecha_desde=None, fecha_hasta=None):
+def ejecutar_scraping(cpv_codes=None, fecha_desde=None, fecha_hasta=None, reanudar_desde=None, progreso=None):
     """
     Función wrapper para ejecutar el scraping desde la API
     
@@ -590,6 +835,11 @@ def ejecutar_scraping(cpv_codes=None, fecha_desde=None, fecha_hasta=None):
                      Si es None, usa la fecha de ayer
         fecha_hasta: Fecha hasta en formato DD-MM-YYYY (opcional)
                      Si es None, usa la fecha de ayer
+        reanudar_desde: Carpeta de una ejecución interrumpida (opcional)
+                        Continúa desde su último checkpoint de paginación
+        progreso: progreso.Progreso que se actualiza con la fase y la página (opcional)
+                  Si se cancela (o vence su plazo), la extracción se detiene
+                  antes de la siguiente página y se cierra el navegador
     
     Returns:
         dict: Diccionario con los resultados del scraping
@@ -600,52 +850,48 @@ def ejecutar_scraping(cpv_codes=None, fecha_desde=None, fecha_hasta=None):
                 'output_folder': str,
                 'fecha_desde': str,
                 'fecha_hasta': str,
-                'error': str (solo si success=False)
+                'content_hash': str (SHA-256 de las filas, en orden),
+                'last_modified': float (epoch de fin de la extracción),
+                'metricas_red': dict (peticiones, bloqueadas, bytes transferidos y ahorro estimado),
+                'completo': bool (False si la paginación se interrumpió; reanudable),
+                'paginas': int (páginas completadas),
+                'memoria': dict (pico de RSS del navegador en MB y reciclajes de sesión),
+                'error': str (solo si success=False),
+                'cancelado': bool (solo si se canceló; con output_folder y paginas para reanudar),
+                'circuito_abierto': bool (solo si el portal se considera caído),
+                'reintentar_en': int (segundos, solo con circuito_abierto)
             }
     """
     logger.info("=" * 80)
     logger.info("EJECUTANDO SCRAPING VIA API")
     logger.info("=" * 80)
     
-    from datetime import timedelta
+    # Con el circuito abierto no se arranca el navegador: el portal está caído
+    if circuito_portal.estado == "abierto":
+        return _resultado_circuito_abierto(circuito_portal.reintentar_en())
     
     try:
         scraper = LicitacionesScraperSelenium(
             headless=True, 
             cpv_codes=cpv_codes,
             fecha_desde=fecha_desde,
-            fecha_hasta=fecha_hasta
+            fecha_hasta=fecha_hasta,
+            reanudar_desde=reanudar_desde,
+            progreso=progreso
         )
         
-        if scraper.scrape_licitaciones():
-            logger.info("✓ Scraping completado exitosamente")
-            
-            # Leer los resultados del archivo JSON generado
-            json_path = os.path.join(scraper.output_folder, 'licitaciones_extraidas.json')
-            licitaciones = []
-            
-            if os.path.exists(json_path):
-                with open(json_path, 'r', encoding='utf-8') as f:
-                    licitaciones = json.load(f)
-            
-            ayer = datetime.now() - timedelta(days=1)
-            return {
-                'success': True,
-                'total_licitaciones': len(licitaciones),
-                'licitaciones': licitaciones,
-                'output_folder': scraper.output_folder,
-                'cpv_codes': cpv_codes,
-                'fecha_desde': fecha_desde if fecha_desde else ayer.strftime("%d-%m-%Y"),
-                'fecha_hasta': fecha_hasta if fecha_hasta else ayer.strftime("%d-%m-%Y")
-            }
-        else:
-            logger.error("✗ Error en el scraping")
-            return {
-                'success': False,
-                'error': 'Error durante el proceso de scraping',
-                'total_licitaciones': 0,
-                'licitaciones': []
-            }
+        # Limitar las sesiones de navegador simultáneas contra el portal (concurrencia adaptativa)
+        scraper._fase("esperando_sesion")
+        with gobernador.sesion(comprobar=scraper._comprobar_cancelacion):
+            completado = scraper.scrape_licitaciones()
+        
+        return _resultado_extraccion(scraper, completado, cpv_codes, fecha_desde, fecha_hasta)
+    
+    except CircuitoAbiertoError as e:
+        return _resultado_circuito_abierto(e.reintentar_en)
+    
+    except ExtraccionCancelada as e:
+        return _resultado_cancelado(scraper, e.motivo)
             
     except Exception as e:
         logger.error(f"Error al ejecutar scraping: {str(e)}")
@@ -659,15 +905,88 @@ def ejecutar_scraping(cpv_codes=None, fecha_desde=None, fecha_hasta=None):
         }
 
 
+def _resultado_extraccion(scraper, completado, cpv_codes, fecha_desde, fecha_hasta):
+    """Dict de resultado de una extracción terminada (común a los backends Selenium y Playwright)"""
+    if not completado:
+        logger.error("✗ Error en el scraping")
+        return {
+            'success': False,
+            'error': 'Error durante el proceso de scraping',
+            'total_licitaciones': 0,
+            'licitaciones': []
+        }
+    
+    logger.info("✓ Scraping completado exitosamente")
+    
+    # Leer los resultados del archivo JSON generado
+    json_path = os.path.join(scraper.output_folder, 'licitaciones_extraidas.json')
+    licitaciones = []
+    
+    if os.path.exists(json_path):
+        with open(json_path, 'r', encoding='utf-8') as f:
+            licitaciones = json.load(f)
+    
+    ayer = datetime.now() - timedelta(days=1)
+    return {
+        'success': True,
+        'total_licitaciones': len(licitaciones),
+        'licitaciones': licitaciones,
+        'output_folder': scraper.output_folder,
+        'cpv_codes': cpv_codes,
+        'fecha_desde': fecha_desde if fecha_desde else ayer.strftime("%d-%m-%Y"),
+        'fecha_hasta': fecha_hasta if fecha_hasta else ayer.strftime("%d-%m-%Y"),
+        'content_hash': scraper.content_hash or scraper.hash_contenido.hexdigest(),
+        'last_modified': scraper.ultima_modificacion or time.time(),
+        'metricas_red': scraper.metricas_red.resumen(),
+        'completo': scraper.completo,
+        'paginas': scraper.pagina_completada,
+        'memoria': scraper.memoria.resumen()
+    }
+
+
+def _resultado_cancelado(scraper, motivo):
+    return {
+        'success': False,
+        'error': f'Extracción cancelada: {motivo}',
+        'cancelado': True,
+        'motivo': motivo,
+        'output_folder': scraper.output_folder,
+        'paginas': scraper.pagina_completada,
+        'total_licitaciones': 0,
+        'licitaciones': []
+    }
+
+
+def _resultado_circuito_abierto(reintentar_en):
+    logger.error(f"✗ Portal no disponible (circuito abierto); reintentar en {reintentar_en:.0f} s")
+    return {
+        'success': False,
+        'error': 'Portal no disponible temporalmente (circuit breaker abierto)',
+        'circuito_abierto': True,
+        'reintentar_en': int(reintentar_en) + 1,
+        'total_licitaciones': 0,
+        'licitaciones': []
+    }
+
+
 def main():
     """Ejecuta el scraper con Selenium"""
     logger.info("=" * 80)
     logger.info("SCRAPER CON SELENIUM - LICITACIONES")
     logger.info("=" * 80)
     
+    import argparse
+    parser = argparse.ArgumentParser(description="Scraper de licitaciones con Selenium")
+    parser.add_argument("--reanudar", metavar="CARPETA",
+                        help="Carpeta de una ejecución interrumpida a reanudar desde su checkpoint")
+    args = parser.parse_args()
+    
+    preparar_directorios()
+    preflight()
+    
     try:
         # Ejemplo: sin códigos CPV
-        scraper = LicitacionesScraperSelenium(headless=True)
+        scraper = LicitacionesScraperSelenium(headless=True, reanudar_desde=args.reanudar)
         
         if scraper.scrape_licitaciones():
             logger.info("✓ Análisis completado")
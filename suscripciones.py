@@ -0,0 +1,422 @@
+"""
+Suscripciones y avisos por webhook
+Registro de perfiles de interés (prefijos CPV, palabras clave, organismos,
+rango de importe) y un comparador que evalúa cada resultado guardado contra
+todos los perfiles en una sola pasada, con índices invertidos por palabra,
+prefijo CPV y organismo. Las coincidencias se encolan en SQLite y un hilo de
+entrega las envía por lotes al webhook de cada suscripción, con reintentos.
+
+Cada licitación se notifica una sola vez por suscripción. Las filas del portal
+no incluyen su CPV: una licitación cumple un prefijo CPV cuando procede de una
+consulta filtrada por un código con ese prefijo; las de consultas sin filtro
+CPV solo pueden coincidir con perfiles que no exijan CPV.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Set
+
+from bloqueos import bloquear_archivo
+from campos import palabras, parsear_importe, plegar
+from checkpoint import clave_licitacion
+from config import (
+    OUTPUT_DIR, SUSCRIPCIONES_DB, WEBHOOK_INTERVALO, WEBHOOK_LOTE, WEBHOOK_MAX_INTENTOS, WEBHOOK_TIMEOUT,
+)
+from logger import setup_logger
+from reintentos import PoliticaReintentos
+
+logger = setup_logger(__name__)
+
+_ESQUEMA = """
+PRAGMA journal_mode = WAL;
+CREATE TABLE IF NOT EXISTS suscripciones (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    nombre TEXT NOT NULL,
+    webhook TEXT NOT NULL,
+    cpv_prefijos TEXT,
+    palabras_clave TEXT,
+    organismos TEXT,
+    importe_min REAL,
+    importe_max REAL,
+    creada REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS entregas (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    suscripcion INTEGER NOT NULL,
+    clave TEXT NOT NULL,
+    licitacion TEXT NOT NULL,
+    estado TEXT NOT NULL,
+    intentos INTEGER NOT NULL DEFAULT 0,
+    disponible_desde REAL NOT NULL,
+    creada REAL NOT NULL,
+    enviada REAL,
+    error TEXT,
+    UNIQUE (suscripcion, clave)
+);
+CREATE INDEX IF NOT EXISTS entregas_pendientes ON entregas (estado, disponible_desde)
+"""
+
+_CAMPOS_LISTA = ("cpv_prefijos", "palabras_clave", "organismos")
+ESPERA_MAX_REINTENTO = 600  # Segundos máximos entre reintentos de un webhook
+
+
+@contextmanager
+def _conectar():
+    """Abre una conexión al registro (una por operación) y confirma al salir"""
+    os.makedirs(os.path.dirname(SUSCRIPCIONES_DB) or ".", exist_ok=True)
+    conexion = sqlite3.connect(SUSCRIPCIONES_DB, timeout=30)
+    conexion.row_factory = sqlite3.Row
+    try:
+        with conexion:
+            conexion.executescript(_ESQUEMA)
+            yield conexion
+    finally:
+        conexion.close()
+
+
+def _prefijo_cpv(codigo: str) -> str:
+    """
+    '48000000' -> '48': los ceros finales de un CPV indican el nivel de la jerarquía
+
+    Se conservan al menos los dos dígitos de la división: '30000000' -> '30'
+    (no '3', que abarcaría también 33, 35...)
+    """
+    codigo = codigo.strip().split("-")[0]
+    return codigo[:max(2, len(codigo.rstrip("0")))]
+
+
+def _a_dict(fila: sqlite3.Row) -> Dict:
+    suscripcion = dict(fila)
+    for campo in _CAMPOS_LISTA:
+        suscripcion[campo] = json.loads(suscripcion[campo]) if suscripcion[campo] else []
+    return suscripcion
+
+
+def crear(nombre: str, webhook: str, cpv_prefijos: Optional[List[str]] = None,
+          palabras_clave: Optional[List[str]] = None, organismos: Optional[List[str]] = None,
+          importe_min: Optional[float] = None, importe_max: Optional[float] = None) -> Dict:
+    """Registra una suscripción; todos los criterios indicados deben cumplirse (cualquier valor de cada lista)"""
+    if not (cpv_prefijos or palabras_clave or organismos or importe_min is not None or importe_max is not None):
+        raise ValueError("La suscripción necesita al menos un criterio")
+    valores = {
+        "cpv_prefijos": sorted({_prefijo_cpv(c) for c in cpv_prefijos or [] if c.strip()}),
+        "palabras_clave": [p.strip() for p in palabras_clave or [] if p.strip()],
+        "organismos": [o.strip() for o in organismos or [] if o.strip()],
+    }
+    with _conectar() as conexion:
+        id_suscripcion = conexion.execute(
+            """
+            INSERT INTO suscripciones
+                (nombre, webhook, cpv_prefijos, palabras_clave, organismos, importe_min, importe_max, creada)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            (nombre, webhook, *(json.dumps(valores[c], ensure_ascii=False) if valores[c] else None for c in _CAMPOS_LISTA),
+             importe_min, importe_max, time.time()),
+        ).lastrowid
+    comparador.invalidar()
+    logger.info(f"✓ Suscripción {id_suscripcion} creada: {nombre} → {webhook}")
+    return obtener(id_suscripcion)
+
+
+def obtener(id_suscripcion: int) -> Optional[Dict]:
+    with _conectar() as conexion:
+        fila = conexion.execute("SELECT * FROM suscripciones WHERE id = ?", (id_suscripcion,)).fetchone()
+    return _a_dict(fila) if fila else None
+
+
+def listar() -> List[Dict]:
+    """Suscripciones con el número de entregas por estado"""
+    with _conectar() as conexion:
+        filas = conexion.execute("SELECT * FROM suscripciones ORDER BY id").fetchall()
+        conteos = conexion.execute(
+            "SELECT suscripcion, estado, COUNT(*) AS n FROM entregas GROUP BY suscripcion, estado"
+        ).fetchall()
+    entregas: Dict[int, Dict[str, int]] = {}
+    for fila in conteos:
+        entregas.setdefault(fila["suscripcion"], {})[fila["estado"]] = fila["n"]
+    return [{**_a_dict(fila), "entregas": entregas.get(fila["id"], {})} for fila in filas]
+
+
+def borrar(id_suscripcion: int) -> bool:
+    with _conectar() as conexion:
+        borradas = conexion.execute("DELETE FROM suscripciones WHERE id = ?", (id_suscripcion,)).rowcount
+        conexion.execute("DELETE FROM entregas WHERE suscripcion = ?", (id_suscripcion,))
+    comparador.invalidar()
+    return borradas > 0
+
+
+class Comparador:
+    """
+    Evalúa licitaciones contra todas las suscripciones con índices invertidos
+
+    Los índices (palabra -> palabras clave que la contienen, prefijo CPV ->
+    suscripciones, organismo -> suscripciones) se reconstruyen solo cuando
+    cambia el registro. Para cada licitación se consultan sus palabras, los
+    prefijos de los CPV de la consulta y su organismo, y solo las suscripciones
+    candidatas se comprueban criterio a criterio.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self.suscripciones: Dict[int, Dict] = {}
+        self.por_palabra: Dict[str, Set] = {}  # palabra -> {(suscripción, índice de la palabra clave)}
+        self.tamano_clave: Dict[tuple, int] = {}  # (suscripción, índice) -> palabras de la palabra clave
+        self.por_cpv: Dict[str, Set[int]] = {}
+        self.por_organismo: Dict[str, Set[int]] = {}
+        self.sin_indice: Set[int] = set()  # Suscripciones solo con rango de importe
+
+    def invalidar(self) -> None:
+        self._version = None
+
+    def _cargar(self) -> None:
+        with _conectar() as conexion:
+            # Cualquier alta o baja cambia el número de filas o el id máximo (AUTOINCREMENT no reutiliza ids)
+            version = tuple(conexion.execute("SELECT COUNT(*), MAX(id) FROM suscripciones").fetchone())
+            if version == self._version:
+                return
+            filas = conexion.execute("SELECT * FROM suscripciones").fetchall()
+
+        self.suscripciones = {fila["id"]: _a_dict(fila) for fila in filas}
+        self.por_palabra, self.tamano_clave, self.por_cpv, self.por_organismo = {}, {}, {}, {}
+        self.sin_indice = set()
+        for id_suscripcion, suscripcion in self.suscripciones.items():
+            for indice, palabra_clave in enumerate(suscripcion["palabras_clave"]):
+                terminos = palabras(palabra_clave)
+                self.tamano_clave[(id_suscripcion, indice)] = len(terminos)
+                for termino in terminos:
+                    self.por_palabra.setdefault(termino, set()).add((id_suscripcion, indice))
+            for prefijo in suscripcion["cpv_prefijos"]:
+                self.por_cpv.setdefault(prefijo, set()).add(id_suscripcion)
+            for organismo in suscripcion["organismos"]:
+                self.por_organismo.setdefault(plegar(organismo), set()).add(id_suscripcion)
+            if not (suscripcion["palabras_clave"] or suscripcion["cpv_prefijos"] or suscripcion["organismos"]):
+                self.sin_indice.add(id_suscripcion)
+        self._version = version
+        logger.info(f"Comparador: {len(self.suscripciones)} suscripción(es), {len(self.por_palabra)} palabras indexadas")
+
+    def _cumple(self, suscripcion: Dict, licitacion: Dict, por_palabras: Set[int], por_cpv: Set[int],
+                por_organismo: Set[int]) -> bool:
+        id_suscripcion = suscripcion["id"]
+        if suscripcion["palabras_clave"] and id_suscripcion not in por_palabras:
+            return False
+        if suscripcion["cpv_prefijos"] and id_suscripcion not in por_cpv:
+            return False
+        if suscripcion["organismos"] and id_suscripcion not in por_organismo:
+            return False
+        if suscripcion["importe_min"] is not None or suscripcion["importe_max"] is not None:
+            importe = parsear_importe(licitacion.get("importe"))
+            if importe is None:
+                return False
+            if suscripcion["importe_min"] is not None and importe < suscripcion["importe_min"]:
+                return False
+            if suscripcion["importe_max"] is not None and importe > suscripcion["importe_max"]:
+                return False
+        return True
+
+    def comparar(self, licitaciones: List[Dict], cpv_codes: Optional[List[str]] = None) -> Dict[int, List[Dict]]:
+        """
+        Suscripciones que cumple cada licitación
+
+        Args:
+            licitaciones: Filas de un resultado
+            cpv_codes: Filtro CPV de la consulta que produjo las filas (None si no tenía)
+
+        Returns:
+            dict suscripción -> licitaciones que la cumplen
+        """
+        with self._lock:
+            self._cargar()
+            if not self.suscripciones:
+                return {}
+
+            # Los CPV son los de la consulta: iguales para todas las filas
+            por_cpv = set()
+            for codigo in cpv_codes or []:
+                codigo = codigo.strip()
+                for longitud in range(1, len(codigo) + 1):
+                    por_cpv |= self.por_cpv.get(codigo[:longitud], set())
+
+            coincidencias: Dict[int, List[Dict]] = {}
+            for licitacion in licitaciones:
+                aciertos: Dict[tuple, int] = {}
+                texto = " ".join(licitacion.get(c) or "" for c in ("expediente", "descripcion", "organismo"))
+                for termino in palabras(texto):
+                    for clave_palabra in self.por_palabra.get(termino, ()):
+                        aciertos[clave_palabra] = aciertos.get(clave_palabra, 0) + 1
+                por_palabras = {clave[0] for clave, n in aciertos.items() if n == self.tamano_clave[clave]}
+                por_organismo = self.por_organismo.get(plegar(licitacion.get("organismo")), set())
+
+                for id_suscripcion in por_palabras | por_cpv | por_organismo | self.sin_indice:
+                    if self._cumple(self.suscripciones[id_suscripcion], licitacion, por_palabras, por_cpv,
+                                    por_organismo):
+                        coincidencias.setdefault(id_suscripcion, []).append(licitacion)
+            return coincidencias
+
+
+comparador = Comparador()
+
+
+def procesar_resultado(licitaciones: List[Dict], cpv_codes: Optional[List[str]] = None) -> int:
+    """
+    Compara un resultado con las suscripciones y encola las coincidencias no notificadas antes
+
+    Returns:
+        número de entregas nuevas
+    """
+    coincidencias = comparador.comparar(licitaciones, cpv_codes)
+    if not coincidencias:
+        return 0
+    ahora = time.time()
+    filas = [
+        (id_suscripcion, clave_licitacion(licitacion), json.dumps(licitacion, ensure_ascii=False), ahora, ahora)
+        for id_suscripcion, lista in coincidencias.items()
+        for licitacion in lista
+    ]
+    with _conectar() as conexion:
+        antes = conexion.total_changes
+        conexion.executemany(
+            "INSERT OR IGNORE INTO entregas (suscripcion, clave, licitacion, estado, disponible_desde, creada) "
+            "VALUES (?, ?, ?, 'pendiente', ?, ?)",
+            filas,
+        )
+        nuevas = conexion.total_changes - antes
+    if nuevas:
+        logger.info(f"✓ {nuevas} coincidencia(s) nuevas para {len(coincidencias)} suscripción(es)")
+        entregador.avisar()
+    return nuevas
+
+
+class Entregador:
+    """
+    Hilo que envía las entregas pendientes a los webhooks, por lotes
+
+    Cada POST lleva hasta WEBHOOK_LOTE licitaciones de una suscripción. Si el
+    webhook falla, el lote se reintenta con espera exponencial hasta
+    WEBHOOK_MAX_INTENTOS. Solo un proceso por máquina entrega (bloqueo de
+    archivo), aunque las coincidencias las encolen varios workers.
+    """
+
+    def __init__(self):
+        self.reintentos = PoliticaReintentos(intentos=WEBHOOK_MAX_INTENTOS, espera_max=ESPERA_MAX_REINTENTO)
+        self.activo = False
+        self._hilo = None
+        self._parar = threading.Event()
+        self._aviso = threading.Event()
+        self._archivo_lock = None
+
+    def iniciar(self) -> bool:
+        """Arranca el hilo de entrega; False si otro proceso ya lo tiene"""
+        os.makedirs(OUTPUT_DIR, exist_ok=True)
+        archivo_lock = open(os.path.join(OUTPUT_DIR, "entregador.lock"), "a+")
+        if not bloquear_archivo(archivo_lock):
+            archivo_lock.close()
+            logger.info("Entregador de webhooks activo en otro proceso")
+            return False
+        self._archivo_lock = archivo_lock
+        self._parar.clear()
+        self._hilo = threading.Thread(target=self._bucle, name="entregador", daemon=True)
+        self._hilo.start()
+        self.activo = True
+        return True
+
+    def detener(self) -> None:
+        self._parar.set()
+        self._aviso.set()
+        if self._hilo is not None:
+            self._hilo.join(timeout=WEBHOOK_TIMEOUT + 5)
+        if self._archivo_lock is not None:
+            self._archivo_lock.close()
+            self._archivo_lock = None
+        self.activo = False
+
+    def avisar(self) -> None:
+        """Adelanta la siguiente ronda de entregas (hay coincidencias nuevas)"""
+        self._aviso.set()
+
+    def _bucle(self) -> None:
+        while not self._parar.is_set():
+            try:
+                while self.entregar_pendientes():
+                    pass
+            except Exception as e:
+                logger.error(f"✗ Error en el entregador de webhooks: {e}")
+            self._aviso.wait(WEBHOOK_INTERVALO)
+            self._aviso.clear()
+
+    def entregar_pendientes(self) -> int:
+        """Envía un lote por suscripción con entregas disponibles; devuelve los lotes enviados con éxito"""
+        ahora = time.time()
+        with _conectar() as conexion:
+            suscripciones = conexion.execute(
+                """
+                SELECT s.id, s.nombre, s.webhook FROM suscripciones s
+                WHERE EXISTS (SELECT 1 FROM entregas e
+                              WHERE e.suscripcion = s.id AND e.estado = 'pendiente' AND e.disponible_desde <= ?)
+                """,
+                (ahora,),
+            ).fetchall()
+
+        enviados = 0
+        for suscripcion in suscripciones:
+            if self._parar.is_set():
+                break
+            with _conectar() as conexion:
+                lote = conexion.execute(
+                    "SELECT id, licitacion, intentos FROM entregas "
+                    "WHERE suscripcion = ? AND estado = 'pendiente' AND disponible_desde <= ? ORDER BY id LIMIT ?",
+                    (suscripcion["id"], ahora, WEBHOOK_LOTE),
+                ).fetchall()
+            if lote and self._enviar_lote(dict(suscripcion), lote):
+                enviados += 1
+        return enviados
+
+    def _enviar_lote(self, suscripcion: Dict, lote: List[sqlite3.Row]) -> bool:
+        import requests
+
+        ids = [fila["id"] for fila in lote]
+        cuerpo = {
+            "suscripcion": suscripcion["id"],
+            "nombre": suscripcion["nombre"],
+            "total": len(lote),
+            "licitaciones": [json.loads(fila["licitacion"]) for fila in lote],
+        }
+        marcadores = ",".join("?" * len(ids))
+        try:
+            respuesta = requests.post(suscripcion["webhook"], json=cuerpo, timeout=WEBHOOK_TIMEOUT)
+            respuesta.raise_for_status()
+        except requests.RequestException as e:
+            intento = max(fila["intentos"] for fila in lote) + 1
+            with _conectar() as conexion:
+                if intento >= WEBHOOK_MAX_INTENTOS:
+                    conexion.execute(
+                        f"UPDATE entregas SET estado = 'error', intentos = ?, error = ? WHERE id IN ({marcadores})",
+                        (intento, str(e), *ids),
+                    )
+                    logger.error(f"✗ Webhook de la suscripción {suscripcion['id']} sin respuesta tras {intento} "
+                                 f"intentos: {len(ids)} entrega(s) descartadas ({e})")
+                else:
+                    espera = self.reintentos.espera(intento)
+                    conexion.execute(
+                        f"UPDATE entregas SET intentos = ?, error = ?, disponible_desde = ? WHERE id IN ({marcadores})",
+                        (intento, str(e), time.time() + espera, *ids),
+                    )
+                    logger.warning(f"⚠ Webhook de la suscripción {suscripcion['id']} falló ({e}); "
+                                   f"reintento {intento}/{WEBHOOK_MAX_INTENTOS} en {espera:.0f} s")
+            return False
+
+        with _conectar() as conexion:
+            conexion.execute(
+                f"UPDATE entregas SET estado = 'enviada', enviada = ?, intentos = intentos + 1, error = NULL "
+                f"WHERE id IN ({marcadores})",
+                (time.time(), *ids),
+            )
+        logger.info(f"✓ {len(ids)} licitación(es) enviadas a la suscripción {suscripcion['id']} ({suscripcion['nombre']})")
+        return True
+
+
+entregador = Entregador()
@@ -83,7 +83,6 @@ def test_licitaciones():
             print(f"  - Success: {data.get('success')}")
             print(f"  - Total licitaciones: {data.get('total_licitaciones')}")
             print(f"  - Total páginas: {data.get('total_paginas')}")
-            print(f"  - Carpeta salida: {data.get('carpeta_salida')}")
             print(f"  - Timestamp: {data.get('timestamp')}")
             
             # Mostrar primeras 3 licitaciones
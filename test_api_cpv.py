@@ -61,7 +61,6 @@ def test_licitaciones_default():
             print(f"  - Códigos CPV: {data.get('codigos_cpv')}")
             print(f"  - Total licitaciones: {data.get('total_licitaciones')}")
             print(f"  - Total páginas: {data.get('total_paginas')}")
-            print(f"  - Carpeta salida: {data.get('carpeta_salida')}")
             return True
         else:
             print(f"✗ Error: {response.status_code}")
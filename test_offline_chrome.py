@@ -6,27 +6,12 @@ sin necesidad de conexión a internet
 from selenium import webdriver
 from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.chrome.service import Service
-import os
-from pathlib import Path
-import glob
+from navegador import buscar_chrome, buscar_driver_en_cache, directorios_cache_wdm
 
 
 def find_chromedriver_in_cache():
-    """Busca ChromeDriver en el caché de webdriver-manager"""
-    cache_base = Path.home() / ".wdm" / "drivers" / "chromedriver"
-    
-    if not cache_base.exists():
-        return None
-    
-    # Buscar chromedriver.exe en todas las subcarpetas
-    pattern = str(cache_base / "**" / "chromedriver.exe")
-    drivers = glob.glob(pattern, recursive=True)
-    
-    if drivers:
-        # Retornar el más reciente
-        return max(drivers, key=os.path.getmtime)
-    
-    return None
+    """Busca ChromeDriver en el caché de webdriver-manager (chromedriver o chromedriver.exe)"""
+    return buscar_driver_en_cache()
 
 
 def setup_chrome_offline():
@@ -37,13 +22,16 @@ def setup_chrome_offline():
     
     if not driver_path:
         print("✗ No se encontró ChromeDriver en caché")
-        print(f"✗ Ruta buscada: {Path.home() / '.wdm' / 'drivers' / 'chromedriver'}")
+        print(f"✗ Rutas buscadas: {', '.join(directorios_cache_wdm())}")
         return None
     
     print(f"✓ ChromeDriver encontrado: {driver_path}")
     
     # Configurar opciones
     chrome_options = Options()
+    chrome = buscar_chrome()
+    if chrome:
+        chrome_options.binary_location = chrome
     chrome_options.add_argument('--headless=new')
     chrome_options.add_argument('--no-sandbox')
     chrome_options.add_argument('--disable-dev-shm-usage')
@@ -0,0 +1,24 @@
+"""Configuración de pytest: los módulos del proyecto están en la raíz del repositorio"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+
+@pytest.fixture
+def almacen_temporal(tmp_path, monkeypatch):
+    """Almacén, índice de búsqueda, suscripciones, instantáneas y resultados compuestos en un directorio temporal"""
+    import almacen
+    import busqueda
+    import instantaneas
+    import suscripciones
+
+    monkeypatch.setattr(almacen, "OUTPUT_DIR", str(tmp_path / "datos"))
+    monkeypatch.setattr(almacen, "ALMACEN_DB", str(tmp_path / "almacen.sqlite3"))
+    monkeypatch.setattr(busqueda, "BUSQUEDA_DB", str(tmp_path / "busqueda.sqlite3"))
+    monkeypatch.setattr(suscripciones, "SUSCRIPCIONES_DB", str(tmp_path / "suscripciones.sqlite3"))
+    monkeypatch.setattr(instantaneas, "INSTANTANEAS_DIR", str(tmp_path / "instantaneas"))
+    return almacen
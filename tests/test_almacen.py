@@ -0,0 +1,104 @@
+"""Almacén de resultados: una carpeta borrada o ilegible es un fallo de caché"""
+
+import json
+import os
+import time
+
+import pytest
+
+
+def _guardar(almacen, carpeta, clave="*|01-03-2026|01-03-2026"):
+    os.makedirs(carpeta)
+    licitaciones = [{"expediente": f"E{i}", "organismo": "Ayuntamiento"} for i in range(3)]
+    with open(os.path.join(carpeta, almacen.ARCHIVO_RESULTADOS), "w", encoding="utf-8") as f:
+        json.dump(licitaciones, f)
+    almacen.guardar_resultado(clave, {
+        "success": True,
+        "total_licitaciones": len(licitaciones),
+        "licitaciones": licitaciones,
+        "output_folder": carpeta,
+        "cpv_codes": None,
+        "fecha_desde": "01-03-2026",
+        "fecha_hasta": "01-03-2026",
+        "content_hash": almacen.hash_filas(licitaciones),
+        "last_modified": time.time(),
+    })
+    return clave
+
+
+def test_resultado_con_carpeta_borrada_no_se_sirve(almacen_temporal, tmp_path):
+    almacen = almacen_temporal
+    carpeta = str(tmp_path / "ejecucion")
+    clave = _guardar(almacen, carpeta)
+    assert almacen.cargar_resultado(almacen.obtener_resultado(clave))["total_licitaciones"] == 3
+
+    os.remove(os.path.join(carpeta, almacen.ARCHIVO_RESULTADOS))
+    assert almacen.obtener_resultado(clave) is None
+    assert almacen.resultados_diarios(["01-03-2026"]) == []
+    assert almacen.consultas_almacenadas() == []
+
+
+def test_resultado_ilegible_se_descarta(almacen_temporal, tmp_path):
+    almacen = almacen_temporal
+    carpeta = str(tmp_path / "ejecucion")
+    clave = _guardar(almacen, carpeta)
+    meta = almacen.obtener_resultado(clave)
+    with open(os.path.join(carpeta, almacen.ARCHIVO_RESULTADOS), "w", encoding="utf-8") as f:
+        f.write("[{")
+
+    with pytest.raises(almacen.ResultadoNoDisponible):
+        almacen.cargar_resultado(meta)
+    assert almacen.obtener_resultado(clave) is None
+
+
+def test_guardar_sin_notificar_no_registra_cambios(almacen_temporal, tmp_path, monkeypatch):
+    almacen = almacen_temporal
+    import suscripciones
+    avisos = []
+    monkeypatch.setattr(suscripciones, "procesar_resultado", lambda *args: avisos.append(args))
+    clave = _guardar(almacen, str(tmp_path / "ejecucion"))
+    avisos.clear()
+
+    meta = almacen.obtener_resultado(clave)
+    resultado = almacen.cargar_resultado(meta)
+    corregidas = [{**licitacion, "descripcion": "corregida"} for licitacion in resultado["licitaciones"]]
+    resultado.update({"licitaciones": corregidas, "content_hash": almacen.hash_filas(corregidas)})
+    almacen.guardar_resultado(clave, resultado, creado=meta["creado"], notificar=False)
+
+    assert avisos == []
+    assert almacen.obtener_cambios(0)["modificadas"] == []
+    # La siguiente ejecución se compara con las filas corregidas, no con las anteriores
+    resultado["licitaciones"] = corregidas[:2]
+    resultado["content_hash"] = almacen.hash_filas(corregidas[:2])
+    almacen.guardar_resultado(clave, resultado)
+    delta = almacen.obtener_cambios(0)
+    assert (len(delta["modificadas"]), len(delta["eliminadas"])) == (0, 1)
+
+
+def test_resultado_sin_filas_se_almacena_y_sirve(almacen_temporal, tmp_path):
+    from scraper_selenium import LicitacionesScraperSelenium
+    almacen = almacen_temporal
+    carpeta = str(tmp_path / "ejecucion_vacia")
+    os.makedirs(carpeta)
+    scraper = LicitacionesScraperSelenium(cpv_codes=["48000000"], fecha_desde="01-03-2026",
+                                          fecha_hasta="01-03-2026", reanudar_desde=carpeta)
+    scraper.completo = True
+    scraper._guardar_resultados()
+
+    clave = almacen.clave_consulta(["48000000"], "01-03-2026", "01-03-2026")
+    almacen.guardar_resultado(clave, {
+        "success": True,
+        "total_licitaciones": 0,
+        "licitaciones": [],
+        "output_folder": carpeta,
+        "cpv_codes": ["48000000"],
+        "fecha_desde": "01-03-2026",
+        "fecha_hasta": "01-03-2026",
+        "content_hash": scraper.content_hash,
+        "last_modified": scraper.ultima_modificacion,
+    })
+    # Un día sin licitaciones es un acierto de caché, no una carpeta incompleta
+    meta = almacen.obtener_resultado(clave)
+    assert meta is not None
+    assert almacen.cargar_resultado(meta)["licitaciones"] == []
+    assert [m["clave"] for m in almacen.resultados_diarios(["01-03-2026"])] == [clave]
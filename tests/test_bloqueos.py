@@ -0,0 +1,12 @@
+"""Bloqueo de archivo: exclusivo mientras el archivo siga abierto"""
+
+from bloqueos import bloquear_archivo
+
+
+def test_segundo_bloqueo_falla_hasta_cerrar(tmp_path):
+    ruta = tmp_path / "proceso.lock"
+    with open(ruta, "a+") as primero, open(ruta, "a+") as segundo:
+        assert bloquear_archivo(primero)
+        assert not bloquear_archivo(segundo)
+    with open(ruta, "a+") as tercero:
+        assert bloquear_archivo(tercero)
@@ -0,0 +1,11 @@
+"""Cola de trabajos: una consulta con un lote activo no se vuelve a encolar"""
+
+import cola
+
+
+def test_encolar_reutiliza_lote_activo(almacen_temporal, tmp_path, monkeypatch):
+    monkeypatch.setattr(cola, "COLA_DB", str(tmp_path / "cola.sqlite3"))
+    primero = cola.encolar(["48000000"], "01-03-2026", "02-03-2026", particionar=True)
+    segundo = cola.encolar(["48000000"], "01-03-2026", "02-03-2026", particionar=True)
+    assert segundo["lote"] == primero["lote"]
+    assert len(segundo["trabajos"]) == 2
@@ -0,0 +1,55 @@
+"""Instantáneas: una reescritura nunca sirve un cuerpo con el ETag de otra versión"""
+
+import gzip
+import json
+import os
+import time
+
+import pytest
+
+
+def _resultado(almacen, n):
+    licitaciones = [{"expediente": f"E{i}", "organismo": "Ayuntamiento"} for i in range(n)]
+    return {
+        "total_licitaciones": n,
+        "licitaciones": licitaciones,
+        "fecha_desde": "01-03-2026",
+        "fecha_hasta": "01-03-2026",
+        "content_hash": almacen.hash_filas(licitaciones),
+        "last_modified": time.time(),
+    }
+
+
+@pytest.fixture
+def instantaneas(almacen_temporal):
+    import instantaneas
+    return instantaneas
+
+
+def test_cuerpo_coincide_con_etag_vigente(almacen_temporal, instantaneas):
+    resultado = _resultado(almacen_temporal, 2)
+    base = instantaneas.materializar(resultado, None)
+    meta = instantaneas.metadatos(base)
+    assert meta["etag_base"] == resultado["content_hash"][:32]
+
+    archivo, codificacion = instantaneas.variante(base, meta, "gzip")
+    assert codificacion == "gzip"
+    with open(archivo, "rb") as f:
+        assert json.loads(gzip.decompress(f.read()))["total_licitaciones"] == 2
+
+
+def test_reescritura_conserva_version_anterior(almacen_temporal, instantaneas):
+    base = instantaneas.materializar(_resultado(almacen_temporal, 1), None)
+    primera = instantaneas.metadatos(base)
+    instantaneas.materializar(_resultado(almacen_temporal, 2), None)
+    segunda = instantaneas.metadatos(base)
+    assert segunda["etag_base"] != primera["etag_base"]
+
+    # Una respuesta que leyó los metadatos antes de la reescritura sigue enviando su versión
+    archivo, _ = instantaneas.variante(base, primera, None)
+    with open(archivo, "rb") as f:
+        assert json.loads(f.read())["total_licitaciones"] == 1
+
+    instantaneas.materializar(_resultado(almacen_temporal, 3), None)
+    assert not os.path.exists(instantaneas.variante(base, primera, None)[0])
+    assert os.path.exists(instantaneas.variante(base, segunda, None)[0])
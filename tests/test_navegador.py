@@ -0,0 +1,86 @@
+"""Métricas de red: cada acierto de caché cuenta una vez por petición"""
+
+import json
+
+import navegador
+
+
+class _DriverFalso:
+    def __init__(self, eventos):
+        self.eventos = eventos
+
+    def get_log(self, tipo):
+        eventos, self.eventos = self.eventos, []
+        return [{"message": json.dumps({"message": {"method": metodo, "params": params}})}
+                for metodo, params in eventos]
+
+
+def test_acierto_notificado_dos_veces_cuenta_una(monkeypatch):
+    monkeypatch.setattr(navegador, "BROWSER_METRICAS", True)
+    cabeceras = {"content-length": "2048"}
+    metricas = navegador.MetricasRed()
+    metricas.recoger(_DriverFalso([
+        ("Network.requestWillBeSent", {"requestId": "1"}),
+        ("Network.requestServedFromCache", {"requestId": "1"}),
+        ("Network.responseReceived", {"requestId": "1", "response": {"fromDiskCache": True, "headers": cabeceras}}),
+        ("Network.requestWillBeSent", {"requestId": "2"}),
+        ("Network.responseReceived", {"requestId": "2", "response": {"headers": {"Content-Length": "500"}}}),
+    ]))
+
+    resumen = metricas.resumen()
+    assert resumen["respuestas_desde_cache"] == 1
+    assert resumen["ratio_aciertos_cache"] == 0.5
+    assert resumen["bytes_desde_cache"] == 2048
+
+
+def test_resolucion_sin_descarga_no_usa_la_red_ni_se_guarda(monkeypatch):
+    import sys
+    import types
+    instalaciones = []
+
+    class _Gestor:
+        def install(self):
+            instalaciones.append(True)
+            return "/descargado/chromedriver"
+
+    monkeypatch.setitem(sys.modules, "webdriver_manager.chrome", types.SimpleNamespace(ChromeDriverManager=_Gestor))
+    monkeypatch.setattr(navegador, "CHROMEDRIVER_PATH", None)
+    monkeypatch.setattr(navegador, "buscar_chrome", lambda: None)
+    monkeypatch.setattr(navegador, "buscar_driver_en_cache", lambda version=None: None)
+    monkeypatch.setattr(navegador, "_version", lambda ejecutable: None)
+    monkeypatch.setattr(navegador.shutil, "which", lambda nombre: None)
+    monkeypatch.setattr(navegador, "_resolucion", None)
+
+    assert navegador.preflight(descargar=False)["driver"] is None
+    assert instalaciones == []
+    # El primer scraping vuelve a resolver, ya con descarga
+    assert navegador.resolver_navegador()["driver"] == "/descargado/chromedriver"
+    assert instalaciones == [True]
+
+
+def test_ahorro_estimado_con_tamanos_de_ejecuciones_previas(monkeypatch, tmp_path):
+    monkeypatch.setattr(navegador, "BROWSER_METRICAS", True)
+    ruta = str(tmp_path / "tamanos_recursos.json")
+    imagen = "https://contrataciondelestado.es/logo.png"
+
+    # Ejecución sin bloqueo: aprende el tamaño de la imagen
+    normal = navegador.MetricasRed(ruta)
+    normal.recoger(_DriverFalso([
+        ("Network.requestWillBeSent", {"requestId": "1", "request": {"url": imagen}}),
+        ("Network.loadingFinished", {"requestId": "1", "encodedDataLength": 4096}),
+    ]))
+    normal.guardar_tamanos()
+
+    ligera = navegador.MetricasRed(ruta)
+    ligera.recoger(_DriverFalso([
+        ("Network.requestWillBeSent", {"requestId": "1", "request": {"url": imagen}}),
+        ("Network.loadingFailed", {"requestId": "1", "type": "Image", "blockedReason": "inspector"}),
+        ("Network.requestWillBeSent", {"requestId": "2", "request": {"url": "https://cdn.example/fuente.woff2"}}),
+        ("Network.loadingFailed", {"requestId": "2", "type": "Font", "blockedReason": "inspector"}),
+    ]))
+
+    resumen = ligera.resumen()
+    assert resumen["peticiones_ahorradas"] == 2
+    assert resumen["bytes_ahorrados_estimados"] == 4096
+    assert resumen["bloqueadas_sin_tamano"] == 1
+    assert resumen["bloqueadas_por_tipo"] == {"Image": 1, "Font": 1}
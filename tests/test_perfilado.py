@@ -0,0 +1,45 @@
+"""Perfilado: una sola extracción perfilada a la vez en el proceso"""
+
+import asyncio
+
+import pytest
+
+from perfilado import PerfilOcupado, PerfilPeticion
+
+
+def test_segundo_perfil_async_se_rechaza():
+    async def extraccion(liberar):
+        await liberar.wait()
+        return {"success": True}
+
+    async def escenario():
+        liberar = asyncio.Event()
+        primero = asyncio.create_task(PerfilPeticion().ejecutar_async(extraccion, liberar))
+        await asyncio.sleep(0)
+        with pytest.raises(PerfilOcupado):
+            await PerfilPeticion().ejecutar_async(extraccion, liberar)
+        liberar.set()
+        assert (await primero)["success"]
+        # Terminado el primero, el bucle admite otro perfil
+        assert (await PerfilPeticion().ejecutar_async(extraccion, liberar))["success"]
+
+    asyncio.run(escenario())
+
+
+def test_perfil_en_hilo_rechaza_otro_simultaneo():
+    import threading
+    dentro, liberar = threading.Event(), threading.Event()
+
+    def extraccion():
+        dentro.set()
+        liberar.wait(5)
+        return {"success": True}
+
+    hilo = threading.Thread(target=PerfilPeticion().ejecutar, args=(extraccion,))
+    hilo.start()
+    assert dentro.wait(5)
+    with pytest.raises(PerfilOcupado):
+        PerfilPeticion().ejecutar(extraccion)
+    liberar.set()
+    hilo.join()
+    assert PerfilPeticion().ejecutar(lambda: 1) == 1
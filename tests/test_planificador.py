@@ -0,0 +1,60 @@
+"""Planificador: un resultado de varios días cubre los días que contiene"""
+
+import json
+import os
+import time
+
+
+def _guardar(almacen, carpeta, cpv, fecha_desde, fecha_hasta, dias):
+    os.makedirs(carpeta)
+    licitaciones = [{"expediente": f"E{dia}-{i}", "organismo": "Ayuntamiento", "fecha": f"{dia:02d}/03/2026"}
+                    for dia in dias for i in range(2)]
+    with open(os.path.join(carpeta, almacen.ARCHIVO_RESULTADOS), "w", encoding="utf-8") as f:
+        json.dump(licitaciones, f)
+    clave = almacen.clave_consulta(cpv, fecha_desde, fecha_hasta)
+    almacen.guardar_resultado(clave, {
+        "success": True,
+        "total_licitaciones": len(licitaciones),
+        "licitaciones": licitaciones,
+        "output_folder": carpeta,
+        "cpv_codes": cpv,
+        "fecha_desde": fecha_desde,
+        "fecha_hasta": fecha_hasta,
+        "content_hash": almacen.hash_filas(licitaciones),
+        "last_modified": time.time(),
+    })
+    return clave
+
+
+def test_rango_sin_cpv_cubre_subrango(almacen_temporal, tmp_path):
+    import planificador
+    clave = _guardar(almacen_temporal, str(tmp_path / "marzo"), None, "01-03-2026", "05-03-2026", range(1, 6))
+
+    plan = planificador.planificar(None, "02-03-2026", "03-03-2026")
+    assert plan["fragmentos"] == []
+    assert [local["consultas"] for local in plan["locales"]] == [[clave], [clave]]
+
+    resultado = planificador.ejecutar_plan(plan)
+    assert [l["expediente"] for l in resultado["licitaciones"]] == ["E2-0", "E2-1", "E3-0", "E3-1"]
+
+
+def test_rango_con_cpv_solo_cubre_sus_cpv(almacen_temporal, tmp_path):
+    import planificador
+    _guardar(almacen_temporal, str(tmp_path / "marzo"), ["48000000"], "01-03-2026", "05-03-2026", range(1, 6))
+
+    plan = planificador.planificar(["48000000", "72000000"], "03-03-2026", "03-03-2026")
+    assert plan["fragmentos"][0]["cpv_codes"] == ["72000000"]
+    assert planificador.planificar(None, "03-03-2026", "03-03-2026")["locales"] == []
+
+
+def test_resultado_compuesto_reutiliza_su_carpeta(almacen_temporal, tmp_path):
+    almacen = almacen_temporal
+    partes = [_guardar(almacen, str(tmp_path / f"dia{dia}"), None, f"0{dia}-03-2026", f"0{dia}-03-2026", [dia])
+              for dia in (1, 2)]
+    clave = almacen.clave_consulta(None, "01-03-2026", "02-03-2026")
+
+    primero = almacen.fusionar_resultados(clave, partes, None, "01-03-2026", "02-03-2026")
+    segundo = almacen.fusionar_resultados(clave, partes, None, "01-03-2026", "02-03-2026")
+    assert primero["output_folder"] == segundo["output_folder"]
+    assert os.listdir(tmp_path / "datos") == [os.path.basename(primero["output_folder"])]
+    assert almacen.cargar_resultado(almacen.obtener_resultado(clave))["total_licitaciones"] == 4
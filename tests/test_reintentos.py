@@ -0,0 +1,118 @@
+"""Política de reintentos y circuit breaker: la operación de prueba nunca queda en curso"""
+
+import asyncio
+import time
+
+import pytest
+
+from reintentos import CircuitBreaker, CircuitoAbiertoError, PoliticaReintentos
+
+
+class Transitorio(Exception):
+    pass
+
+
+class Cancelada(Exception):
+    pass
+
+
+def _circuito_semiabierto():
+    circuito = CircuitBreaker("prueba", umbral_fallos=1, tiempo_apertura=0.05)
+    circuito.registrar_fallo()
+    time.sleep(0.06)
+    assert circuito.estado == "semiabierto"
+    return circuito
+
+
+def _politica():
+    return PoliticaReintentos(intentos=3, espera_base=0.001, espera_max=0.001)
+
+
+def test_prueba_con_fallo_transitorio_se_reintenta_y_cierra_el_circuito():
+    circuito = _circuito_semiabierto()
+    llamadas = []
+
+    def paso():
+        llamadas.append(1)
+        if len(llamadas) == 1:
+            raise Transitorio("timeout")
+        return "ok"
+
+    assert _politica().ejecutar(paso, "prueba", excepciones=(Transitorio,), circuito=circuito) == "ok"
+    assert len(llamadas) == 2
+    assert circuito.estado == "cerrado"
+
+
+def test_prueba_agotada_reabre_el_circuito():
+    circuito = _circuito_semiabierto()
+
+    def paso():
+        raise Transitorio("timeout")
+
+    with pytest.raises(Transitorio):
+        _politica().ejecutar(paso, "prueba", excepciones=(Transitorio,), circuito=circuito)
+    assert circuito.estado == "abierto"
+    time.sleep(0.06)
+    # Pasado el tiempo de apertura se permite una nueva prueba
+    assert circuito.comprobar() is True
+
+
+def test_prueba_con_error_no_transitorio_no_bloquea_el_circuito():
+    circuito = _circuito_semiabierto()
+
+    def paso():
+        raise Cancelada("cliente desconectado")
+
+    with pytest.raises(Cancelada):
+        _politica().ejecutar(paso, "prueba", excepciones=(Transitorio,), circuito=circuito)
+    time.sleep(0.06)
+    assert _politica().ejecutar(lambda: "ok", "prueba", circuito=circuito) == "ok"
+    assert circuito.estado == "cerrado"
+
+
+def test_error_no_transitorio_con_circuito_cerrado_no_cuenta_como_fallo():
+    circuito = CircuitBreaker("prueba", umbral_fallos=1, tiempo_apertura=60)
+
+    def paso():
+        raise Cancelada("plazo agotado")
+
+    with pytest.raises(Cancelada):
+        _politica().ejecutar(paso, "prueba", excepciones=(Transitorio,), circuito=circuito)
+    assert circuito.estado == "cerrado"
+
+
+def test_segunda_operacion_rechazada_mientras_hay_prueba_en_curso():
+    circuito = _circuito_semiabierto()
+    assert circuito.comprobar() is True
+    with pytest.raises(CircuitoAbiertoError):
+        circuito.comprobar()
+
+
+def test_prueba_async_cancelada_no_bloquea_el_circuito():
+    circuito = _circuito_semiabierto()
+
+    async def paso():
+        raise asyncio.CancelledError()
+
+    async def ejecutar():
+        with pytest.raises(asyncio.CancelledError):
+            await _politica().ejecutar_async(paso, "prueba", excepciones=(Transitorio,), circuito=circuito)
+
+    asyncio.run(ejecutar())
+    time.sleep(0.06)
+    assert circuito.comprobar() is True
+
+
+def test_prueba_async_con_fallo_transitorio_cierra_el_circuito():
+    circuito = _circuito_semiabierto()
+    llamadas = []
+
+    async def paso():
+        llamadas.append(1)
+        if len(llamadas) == 1:
+            raise Transitorio("timeout")
+        return "ok"
+
+    resultado = asyncio.run(_politica().ejecutar_async(paso, "prueba", excepciones=(Transitorio,), circuito=circuito))
+    assert resultado == "ok"
+    assert circuito.estado == "cerrado"
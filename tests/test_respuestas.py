@@ -0,0 +1,33 @@
+"""Peticiones condicionales: If-None-Match valida solo la variante que el cliente tiene"""
+
+from starlette.requests import Request
+
+from respuestas import respuesta_no_modificada
+
+
+def _peticion(**cabeceras):
+    return Request({
+        "type": "http",
+        "method": "GET",
+        "path": "/licitaciones",
+        "headers": [(nombre.replace("_", "-").encode(), valor.encode()) for nombre, valor in cabeceras.items()],
+    })
+
+
+def test_etag_de_otra_variante_no_valida():
+    # El cliente guardó la variante gzip y ahora pide sin compresión: bytes distintos, respuesta completa
+    peticion = _peticion(if_none_match='"abc-gzip"', accept_encoding="identity")
+    assert respuesta_no_modificada(peticion, "abc") is None
+
+
+def test_etag_de_la_misma_variante_valida():
+    peticion = _peticion(if_none_match='W/"abc-gzip"', accept_encoding="gzip")
+    respuesta = respuesta_no_modificada(peticion, "abc")
+    assert respuesta.status_code == 304
+    assert respuesta.headers["etag"] == '"abc-gzip"'
+
+
+def test_etag_explicito_de_la_variante_servida():
+    peticion = _peticion(if_none_match='"abc"', accept_encoding="br")
+    # Sin archivo .br la instantánea se serviría sin comprimir: vale el ETag de esa variante
+    assert respuesta_no_modificada(peticion, "abc", etag='"abc"').status_code == 304
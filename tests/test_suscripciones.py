@@ -0,0 +1,35 @@
+"""Comparación de licitaciones con las suscripciones por prefijo CPV"""
+
+import pytest
+
+import suscripciones
+from suscripciones import Comparador, _prefijo_cpv
+
+
+@pytest.fixture
+def registro(tmp_path, monkeypatch):
+    monkeypatch.setattr(suscripciones, "SUSCRIPCIONES_DB", str(tmp_path / "suscripciones.sqlite3"))
+    return suscripciones
+
+
+@pytest.mark.parametrize("codigo, prefijo", [
+    ("48000000", "48"),
+    ("72200000", "722"),
+    ("45233120-6", "4523312"),
+    ("30000000", "30"),
+    ("50000000-5", "50"),
+    ("90000000", "90"),
+])
+def test_prefijo_conserva_la_division(codigo, prefijo):
+    assert _prefijo_cpv(codigo) == prefijo
+
+
+@pytest.mark.parametrize("division", ["30", "50", "60", "70", "80", "90"])
+def test_division_acabada_en_cero_no_coincide_con_otras_divisiones(registro, division):
+    suscripcion = registro.crear("División", "http://localhost/webhook", cpv_prefijos=[f"{division}000000"])
+    comparador = Comparador()
+    licitacion = {"expediente": "E1", "descripcion": "Servicio", "organismo": "Ayuntamiento"}
+
+    otra_division = f"{division[0]}3000000"
+    assert comparador.comparar([licitacion], [otra_division]) == {}
+    assert comparador.comparar([licitacion], [f"{division}100000"]) == {suscripcion["id"]: [licitacion]}
@@ -0,0 +1,172 @@
+"""
+Worker de scraping
+Reclama trabajos de la cola (cola.py), ejecuta el scraper y guarda los
+resultados en el almacén para que la API los sirva. Con --procesos N lanza
+una flota de N procesos en la máquina; se pueden arrancar flotas en varias
+máquinas si comparten COLA_DB y ALMACEN_DB
+"""
+
+import multiprocessing
+import os
+import socket
+import threading
+import time
+import uuid
+from typing import Dict, Optional
+
+import almacen
+import cola
+from config import COLA_LEASE_SECONDS, preparar_directorios
+from logger import setup_logger
+from navegador import preflight
+
+logger = setup_logger(__name__)
+
+ESPERA_COLA_VACIA = 5  # Segundos entre consultas a la cola cuando no hay trabajos
+
+
+class Worker:
+    """Bucle reclamar → scraping → guardar de un proceso worker"""
+
+    def __init__(self, nombre: Optional[str] = None):
+        self.nombre = nombre or f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:4]}"
+        self._parar = threading.Event()
+
+    def ejecutar(self, max_trabajos: Optional[int] = None) -> None:
+        """Procesa trabajos hasta detener() o hasta completar max_trabajos"""
+        cola.registrar_worker(self.nombre)
+        logger.info(f"✓ Worker {self.nombre} esperando trabajos")
+        procesados = 0
+        while not self._parar.is_set():
+            trabajo = cola.reclamar(self.nombre)
+            if trabajo is None:
+                cola.latido_worker(self.nombre)
+                self._parar.wait(ESPERA_COLA_VACIA)
+                continue
+
+            self.procesar(trabajo)
+            procesados += 1
+            if max_trabajos and procesados >= max_trabajos:
+                break
+
+    def detener(self) -> None:
+        self._parar.set()
+
+    def procesar(self, trabajo: Dict) -> None:
+        """Ejecuta un trabajo renovando su lease en segundo plano mientras dura el scraping"""
+        from scraper_selenium import ejecutar_scraping
+
+        logger.info(f"→ Trabajo {trabajo['id']} (lote {trabajo['lote']}): {trabajo['clave']}")
+        inicio = time.time()
+        terminado = threading.Event()
+        renovador = threading.Thread(target=self._renovar_lease, args=(trabajo["id"], terminado), daemon=True)
+        renovador.start()
+
+        ok, total = False, 0
+        try:
+            clave = trabajo["clave"]
+            resultado = ejecutar_scraping(
+                cpv_codes=trabajo["cpv_codes"],
+                fecha_desde=trabajo["fecha_desde"],
+                fecha_hasta=trabajo["fecha_hasta"],
+                reanudar_desde=almacen.obtener_reanudable(clave)
+            )
+            if resultado.get("circuito_abierto"):
+                cola.fallar(trabajo["id"], self.nombre, resultado["error"], espera=resultado["reintentar_en"])
+            elif not resultado["success"]:
+                cola.fallar(trabajo["id"], self.nombre, resultado.get("error", "Error en el scraping"))
+            elif not resultado.get("completo", True):
+                # Se reanuda desde el checkpoint en el siguiente intento (de este u otro worker)
+                almacen.registrar_reanudable(clave, resultado)
+                cola.fallar(trabajo["id"], self.nombre, "Paginación incompleta", espera=0)
+            else:
+                total = resultado["total_licitaciones"]
+                almacen.guardar_resultado(clave, resultado)
+                almacen.borrar_reanudable(clave)
+                cola.completar(trabajo["id"], self.nombre, total)
+                ok = True
+                self._componer_lote(trabajo["lote"])
+        except Exception as e:
+            logger.error(f"✗ Error en el trabajo {trabajo['id']}: {e}")
+            cola.fallar(trabajo["id"], self.nombre, str(e))
+        finally:
+            terminado.set()
+            renovador.join()
+            duracion = time.time() - inicio
+            cola.contabilizar_trabajo(self.nombre, ok, total, duracion)
+            logger.info(f"{'✓' if ok else '✗'} Trabajo {trabajo['id']} terminado en {duracion:.0f} s")
+
+    def _renovar_lease(self, trabajo_id: int, terminado: threading.Event) -> None:
+        while not terminado.wait(COLA_LEASE_SECONDS / 3):
+            if not cola.renovar(trabajo_id, self.nombre):
+                logger.warning(f"⚠ Lease del trabajo {trabajo_id} perdido (reasignado a otro worker)")
+                return
+            cola.latido_worker(self.nombre, trabajo_id)
+
+    def _componer_lote(self, lote: str) -> None:
+        """Con todas las partes del lote completadas, almacena el resultado de la consulta completa"""
+        estado = cola.estado_lote(lote)
+        if estado["estado"] != "completado" or len(estado["trabajos"]) == 1:
+            return
+        almacen.fusionar_resultados(
+            estado["consulta"],
+            [trabajo["clave"] for trabajo in estado["trabajos"]],
+            estado["cpv_codes"],
+            estado["fecha_desde"],
+            estado["fecha_hasta"]
+        )
+
+
+def _proceso_worker(max_trabajos: Optional[int] = None) -> None:
+    preparar_directorios()
+    preflight()
+    worker = Worker()
+    try:
+        worker.ejecutar(max_trabajos)
+    except KeyboardInterrupt:
+        worker.detener()
+
+
+def main():
+    """Arranca uno o varios workers (reinicia los procesos que mueran)"""
+    import argparse
+    parser = argparse.ArgumentParser(description="Worker de scraping de licitaciones")
+    parser.add_argument("--procesos", type=int, default=1, help="Número de procesos worker en esta máquina")
+    parser.add_argument("--max-trabajos", type=int, help="Termina cada worker tras procesar este número de trabajos")
+    parser.add_argument("--estadisticas", action="store_true", help="Muestra el estado de la cola y los workers")
+    args = parser.parse_args()
+
+    if args.estadisticas:
+        import json
+        print(json.dumps(cola.estadisticas(), ensure_ascii=False, indent=2))
+        return
+
+    if args.procesos == 1:
+        _proceso_worker(args.max_trabajos)
+        return
+
+    procesos = {}
+    try:
+        while True:
+            for indice in range(args.procesos):
+                proceso = procesos.get(indice)
+                if proceso is not None and proceso.is_alive():
+                    continue
+                if proceso is not None:
+                    if args.max_trabajos and proceso.exitcode == 0:
+                        continue
+                    logger.warning(f"⚠ Worker {indice} (pid {proceso.pid}) terminó con código {proceso.exitcode}; reiniciando")
+                procesos[indice] = multiprocessing.Process(target=_proceso_worker, args=(args.max_trabajos,),
+                                                           name=f"worker-{indice}")
+                procesos[indice].start()
+            if args.max_trabajos and all(not p.is_alive() and p.exitcode == 0 for p in procesos.values()):
+                break
+            time.sleep(ESPERA_COLA_VACIA)
+    except KeyboardInterrupt:
+        logger.info("Deteniendo workers...")
+        for proceso in procesos.values():
+            proceso.join(timeout=30)
+
+
+if __name__ == "__main__":
+    main()